@@ -2,6 +2,8 @@ import os
 
 from dotenv import load_dotenv, find_dotenv
 
+from main.roles import is_doctor, is_nurse
+
 
 load_dotenv(find_dotenv())
 
@@ -10,6 +12,8 @@ def get_user_group(request):
     """
     Check if logged belongs to nurses and physicians group.
 
+    Roles are resolved once per request and shared with views.
+
     Returns
     ----------
     dict
@@ -17,10 +21,8 @@ def get_user_group(request):
     """
 
     user = request.user
-    is_nurse = user.groups.filter(name__iexact="nurses").exists()
-    is_doctor = user.groups.filter(name__iexact="physicians").exists()
     data = {
-        "is_nurse": is_nurse,
-        "is_doctor": is_doctor
+        "is_nurse": is_nurse(user),
+        "is_doctor": is_doctor(user)
     }
     return data
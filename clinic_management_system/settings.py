@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 import sys
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv, find_dotenv
 import dj_database_url
 
@@ -103,6 +104,27 @@ elif len(sys.argv) > 0 and sys.argv[1] != "collectstatic":
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+LOCAL_MEMORY_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get("CACHE_BACKEND", LOCAL_MEMORY_CACHE),
+        'LOCATION': os.environ.get("CACHE_LOCATION", "clinic-management"),
+    }
+}
+
+# Free appointment times are invalidated in the cache when they change, a
+# per process cache would keep serving stale ones from other processes.
+if not DEVELOPMENT and CACHES['default']['BACKEND'] == LOCAL_MEMORY_CACHE:
+    raise ImproperlyConfigured(
+        "Set CACHE_BACKEND to a cache shared between processes, "
+        "local memory cache is only allowed with DEVELOPMENT=True."
+    )
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -1,9 +1,15 @@
 from datetime import timedelta
 
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 
-from .models import Schedule
-from .forms import ScheduleModelForm
+from .models import Absence, Break, FeedChange, Schedule
+from .forms import ScheduleModelForm, ShiftTemplateForm
+from .ical import reset_feed_token
+from .shifts import expand_shifts, preview_shifts, save_shifts
 
 
 class ScheduleAdmin(admin.ModelAdmin):
@@ -12,6 +18,21 @@ class ScheduleAdmin(admin.ModelAdmin):
     """
 
     list_display = ("date", "start", "end", "employee")
+    change_list_template = "admin/main/schedule/change_list.html"
+
+    def get_urls(self):
+        """
+        Add a shift template page to generate many shifts at once.
+        """
+
+        return [
+            path(
+                "generate/",
+                self.admin_site.admin_view(self.generate_view),
+                name="main_schedule_generate"
+            ),
+            *super().get_urls()
+        ]
 
     def get_form(self, request, obj=None, **kwargs):
         """
@@ -23,21 +44,104 @@ class ScheduleAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         """
-        Save multiple objects if a date range was selected. One otherwise.
+        Save the object. If a date range was selected, save the same shift
+        on the following days of the range with one bulk upsert.
         """
 
-        date_from = form.cleaned_data["date"]
+        super().save_model(request, obj, form, change)
         date_to = form.cleaned_data["date_to"]
+        if date_to and obj.date < date_to:
+            save_shifts(expand_shifts(
+                [obj.employee_id],
+                obj.date + timedelta(days=1),
+                date_to,
+                range(7),
+                obj.start,
+                obj.end
+            ))
+
+    def generate_view(self, request):
+        """
+        Expand a shift template into shifts, preview and save them.
+        """
+
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = ShiftTemplateForm(request.POST or None)
+        preview = None
+        if request.method == "POST" and form.is_valid():
+            shifts = expand_shifts(**form.get_shift())
+            if "_save" in request.POST:
+                saved = save_shifts(shifts)
+                self.message_user(
+                    request, f"{saved} shifts saved.", messages.SUCCESS
+                )
+                return HttpResponseRedirect(
+                    reverse("admin:main_schedule_changelist")
+                )
+            preview = preview_shifts(shifts)
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Generate shifts",
+            "form": form,
+            "preview": preview,
+        }
+        return TemplateResponse(
+            request, "admin/main/schedule/generate.html", context
+        )
+
+
+class BreakAdmin(admin.ModelAdmin):
+    """
+    Display and manipulate Break model from admin page.
+    """
+
+    list_display = ("employee", "start", "end", "date", "weekday")
+    list_filter = ("weekday",)
+
+
+class AbsenceAdmin(admin.ModelAdmin):
+    """
+    Display and manipulate Absence model from admin page.
+    """
+
+    list_display = ("employee", "date_from", "date_to", "reason")
+
+
+class FeedChangeAdmin(admin.ModelAdmin):
+    """
+    Display doctor calendar feeds and revoke their urls from admin page.
+    """
+
+    list_display = ("doctor", "changed")
+    fields = ("doctor", "changed")
+    readonly_fields = ("doctor", "changed")
+    actions = ("reset_tokens",)
+
+    def has_add_permission(self, request):
+        """
+        Feeds are created with the first feed url of a doctor.
+        """
+
+        return False
+
+    @admin.action(description="Reset feed urls of selected doctors")
+    def reset_tokens(self, request, queryset):
+        """
+        Give selected feeds new secrets, doctors get new urls on the main page.
+        """
 
-        if date_to and (date_from < date_to):
-            delta = date_to - date_from
-            for _ in range(delta.days + 1):
-                super().save_model(request, obj, form, change)
-                date_from += timedelta(days=1)
-                obj.id += 1
-                obj.date = date_from
-        else:
-            super().save_model(request, obj, form, change)
+        doctor_ids = list(queryset.values_list("doctor_id", flat=True))
+        for doctor_id in doctor_ids:
+            reset_feed_token(doctor_id)
+        self.message_user(
+            request, f"{len(doctor_ids)} feed urls reset.", messages.SUCCESS
+        )
 
 
 admin.site.register(Schedule, ScheduleAdmin)
+admin.site.register(Break, BreakAdmin)
+admin.site.register(Absence, AbsenceAdmin)
+admin.site.register(FeedChange, FeedChangeAdmin)
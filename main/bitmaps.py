@@ -0,0 +1,229 @@
+from datetime import datetime, time, timedelta
+from functools import reduce
+from operator import and_, or_
+
+from .const import APPOINTMENT_TIME
+
+
+# Doctor day slots as integers. Bit i stands for the appointment starting
+# i * APPOINTMENT_TIME minutes after midnight.
+SLOTS_PER_DAY = 24 * 60 // APPOINTMENT_TIME
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+
+def get_slot_index(hour):
+    """
+    Index of the slot starting at or containing given time.
+    """
+
+    return (hour.hour * 60 + hour.minute) // APPOINTMENT_TIME
+
+
+def get_slot_time(index):
+    """
+    Start time of the slot with given index.
+    """
+
+    minutes = index * APPOINTMENT_TIME
+    return time(minutes // 60, minutes % 60)
+
+
+def get_shift_bitmap(start, end):
+    """
+    Slots starting within a shift.
+
+    Parameters
+    ----------
+    start : datetime.time
+        shift start, rounded up to the nearest slot.
+    end : datetime.time
+        shift end, slots starting before it are included.
+
+    Returns
+    ----------
+    int
+        bitmap with shift slots set.
+    """
+
+    first = _get_next_slot_index(start)
+    last = _get_next_slot_index(end)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def get_times_bitmap(hours):
+    """
+    Slots starting at given times. Times off the slot grid are ignored.
+    """
+
+    bitmap = 0
+    for hour in hours:
+        if _is_on_grid(hour):
+            bitmap |= 1 << get_slot_index(hour)
+    return bitmap
+
+
+def get_busy_bitmap(start, duration):
+    """
+    Slots overlapping an appointment, up to the end of the day.
+
+    Parameters
+    ----------
+    start : datetime.time
+        appointment start.
+    duration : int
+        appointment duration in minutes.
+
+    Returns
+    ----------
+    int
+        bitmap with overlapped slots set.
+    """
+
+    start_minutes = start.hour * 60 + start.minute
+    first = start_minutes // APPOINTMENT_TIME
+    end = timedelta(minutes=start_minutes + duration, seconds=start.second)
+    last = -(-end // timedelta(minutes=APPOINTMENT_TIME))
+    last = min(last, SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def get_fitting_bitmap(free, duration):
+    """
+    Free slots starting enough consecutive free slots for a visit.
+
+    Parameters
+    ----------
+    free : int
+        free slots bitmap.
+    duration : int
+        visit duration in minutes.
+
+    Returns
+    ----------
+    int
+        bitmap with slots a visit can start at set.
+    """
+
+    fitting = free
+    for shift in range(1, -(-duration // APPOINTMENT_TIME)):
+        fitting &= free >> shift
+    return fitting
+
+
+def get_free_bitmap(shift, booked):
+    """
+    Slots within a shift not booked yet.
+    """
+
+    return shift & ~booked
+
+
+def get_future_bitmap(day, now):
+    """
+    Slots of a day which have not started before now.
+    """
+
+    if day > now.date():
+        return FULL_DAY
+    if day < now.date():
+        return 0
+    first = _get_next_slot_index(now.time())
+    return FULL_DAY & ~((1 << first) - 1)
+
+
+def intersect(bitmaps):
+    """
+    Slots set in every bitmap, e.g. free for all doctors.
+    """
+
+    return reduce(and_, bitmaps, FULL_DAY)
+
+
+def union(bitmaps):
+    """
+    Slots set in any bitmap, e.g. free for any doctor.
+    """
+
+    return reduce(or_, bitmaps, 0)
+
+
+def is_set_at(bitmap, hour):
+    """
+    Check if the slot starting at given time is set.
+    """
+
+    return _is_on_grid(hour) and bool(bitmap >> get_slot_index(hour) & 1)
+
+
+def get_keys_set_at(bitmaps, hour):
+    """
+    Keys of bitmaps with the slot starting at given time set, e.g. doctors
+    free at a given hour.
+
+    Parameters
+    ----------
+    bitmaps : dict
+        bitmaps by any key.
+    hour : datetime.time
+
+    Returns
+    ----------
+    list
+        keys in bitmaps order.
+    """
+
+    return [key for key, bitmap in bitmaps.items() if is_set_at(bitmap, hour)]
+
+
+def iter_slot_indexes(bitmap):
+    """
+    Yield indexes of set slots in ascending order.
+    """
+
+    while bitmap:
+        lowest = bitmap & -bitmap
+        yield lowest.bit_length() - 1
+        bitmap ^= lowest
+
+
+def iter_slot_times(bitmap):
+    """
+    Yield start times of set slots in ascending order.
+    """
+
+    for index in iter_slot_indexes(bitmap):
+        yield get_slot_time(index)
+
+
+def iter_slot_datetimes(bitmap, day):
+    """
+    Yield naive start datetimes of set slots of a day in ascending order.
+    """
+
+    midnight = datetime.combine(day, time.min)
+    for index in iter_slot_indexes(bitmap):
+        yield midnight + timedelta(minutes=index * APPOINTMENT_TIME)
+
+
+def _get_next_slot_index(hour):
+    """
+    Index of the first slot starting at or after given time.
+    """
+
+    minutes = hour.hour * 60 + hour.minute
+    if hour.second or hour.microsecond:
+        minutes += 1
+    return -(-minutes // APPOINTMENT_TIME)
+
+
+def _is_on_grid(hour):
+    """
+    Check if time is a slot start.
+    """
+
+    return (not hour.second and not hour.microsecond
+            and (hour.hour * 60 + hour.minute) % APPOINTMENT_TIME == 0)
@@ -0,0 +1,370 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.utils import IntegrityError
+from django.utils import timezone
+
+from . import bitmaps
+from .cache import invalidate_free_slots
+from .const import APPOINTMENT_TIME, SLOT_HOLD_TIME
+from .intervals import IntervalIndex
+from .models import Appointment, FreeSlot, Schedule, SlotHold
+from .roles import get_physician_ids
+from .utils import _as_aware, _as_naive
+
+SLOT_TAKEN_MESSAGE = "This appointment time has just been taken! "\
+    "Choose another one."
+SLOT_HELD_MESSAGE = "This appointment time is held by another employee! "\
+    "Choose another one."
+PAST_APPOINTMENT_MESSAGE = "This appointment time has already passed!"
+
+
+class SlotTaken(ValidationError):
+    """
+    Appointment slot was booked by someone else first.
+    """
+
+    def __init__(self, message=SLOT_TAKEN_MESSAGE):
+        super().__init__(message, code="slot_taken")
+
+
+def book_appointment(appointment, held_by=None):
+    """
+    Save a new appointment if every free slot it needs can be reserved.
+
+    Free slots are claimed by deleting their FreeSlot rows in the booking
+    transaction. Concurrent bookings of the same slot can't both delete it,
+    so the one coming second fails fast instead of hitting unique
+    constraints. Where supported, rows locked by other bookings are skipped
+    rather than waited for.
+
+    Parameters
+    ----------
+    appointment : Appointment
+        unsaved appointment.
+    held_by : User
+        employee booking the appointment. Their slot holds don't block the
+        booking and are released after it.
+
+    Returns
+    ----------
+    Appointment
+        saved appointment.
+
+    Raises
+    ----------
+    SlotTaken
+        if any of appointment slots is not free or held by someone else.
+    ValidationError
+        if appointment time has passed or appointment is invalid otherwise.
+    """
+
+    duration = appointment.get_duration()
+    start = _as_aware(appointment.datetime)
+    end = start + timedelta(minutes=duration)
+    if start <= timezone.now():
+        raise ValidationError(PAST_APPOINTMENT_MESSAGE, code="past")
+    try:
+        with transaction.atomic():
+            claimed = _claim_free_slots(
+                appointment.doctor_id, appointment.datetime, duration
+            )
+            if claimed < _count_needed_slots(appointment.datetime, duration):
+                raise SlotTaken()
+            if _get_active_holds([appointment.doctor_id], start, end).exclude(
+                    held_by=held_by).exists():
+                raise SlotTaken(SLOT_HELD_MESSAGE)
+            appointment.save()
+            if held_by is not None:
+                SlotHold.objects.filter(
+                    doctor_id=appointment.doctor_id, held_by=held_by
+                ).delete()
+    except IntegrityError:
+        raise SlotTaken()
+    return appointment
+
+
+def book_appointments(appointments, held_by=None, allow_past=False):
+    """
+    Save many new appointments, e.g. a series of follow-up visits, in one
+    transaction.
+
+    The whole batch is validated against appointment times, physicians,
+    schedules, free slots, slot holds and patients appointments with a fixed
+    number of queries and inserted with bulk_create. Appointments that can't
+    be booked are skipped and reported.
+
+    Parameters
+    ----------
+    appointments : iterable
+        unsaved Appointment objects.
+    held_by : User
+        employee booking the appointments. Their slot holds don't block the
+        booking and are released after it.
+    allow_past : bool
+        book appointments whose time has passed, e.g. imported history.
+
+    Returns
+    ----------
+    list
+        a dict per appointment, in given order, with datetime, appointment
+        (None if not booked) and error (None if booked) keys.
+
+    Raises
+    ----------
+    SlotTaken
+        if free slots were claimed by a concurrent booking meanwhile. No
+        appointments are booked then.
+    """
+
+    appointments = list(appointments)
+    report = []
+    if not appointments:
+        return report
+    for appointment in appointments:
+        appointment.datetime = _as_aware(appointment.datetime)
+        appointment.duration = appointment.get_duration()
+    doctor_ids = {appointment.doctor_id for appointment in appointments}
+    start = min(appointment.datetime for appointment in appointments)
+    end = max(appointment.get_end() for appointment in appointments)
+
+    physician_ids = get_physician_ids(doctor_ids)
+    on_duty = set(Schedule.objects.filter(
+        employee__in=doctor_ids,
+        date__in={_as_naive(a.datetime).date() for a in appointments}
+    ).values_list("employee_id", "date"))
+    patient_ids = {appointment.patient_id for appointment in appointments}
+    patient_intervals = {}
+    for patient_id, other_start, duration in Appointment.objects.filter(
+            patient__in=patient_ids,
+            datetime__gt=start - timedelta(days=1),
+            datetime__lt=end
+    ).values_list("patient_id", "datetime", "duration"):
+        patient_intervals.setdefault(patient_id, []).append(
+            (other_start, other_start + timedelta(minutes=duration))
+        )
+    patient_indexes = {
+        patient_id: IntervalIndex(intervals)
+        for patient_id, intervals in patient_intervals.items()
+    }
+
+    with transaction.atomic():
+        free_slots = FreeSlot.objects.filter(
+            Q(doctor__in=doctor_ids)
+            & Q(datetime__gt=start - timedelta(minutes=APPOINTMENT_TIME))
+            & Q(datetime__lt=end)
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            free_slots = free_slots.select_for_update(skip_locked=True)
+        free_slots = {
+            (doctor_id, slot_datetime): pk
+            for pk, doctor_id, slot_datetime in free_slots.values_list(
+                "pk", "doctor_id", "datetime")
+        }
+        hold_intervals = {}
+        for hold in _get_active_holds(doctor_ids, start, end).exclude(
+                held_by=held_by):
+            hold_intervals.setdefault(hold.doctor_id, []).append(
+                (hold.datetime, hold.end)
+            )
+        hold_indexes = {
+            doctor_id: IntervalIndex(intervals)
+            for doctor_id, intervals in hold_intervals.items()
+        }
+
+        now = timezone.now()
+        claimed = []
+        booked = []
+        for appointment in appointments:
+            doctor_id = appointment.doctor_id
+            day = _as_naive(appointment.datetime).date()
+            slot_keys = [
+                (doctor_id, _as_aware(slot_datetime))
+                for slot_datetime in bitmaps.iter_slot_datetimes(
+                    bitmaps.get_busy_bitmap(
+                        _as_naive(appointment.datetime).time(),
+                        appointment.duration
+                    ),
+                    day
+                )
+            ]
+            interval = (appointment.datetime, appointment.get_end())
+            patient_index = patient_indexes.setdefault(
+                appointment.patient_id, IntervalIndex()
+            )
+
+            error = None
+            if not allow_past and appointment.datetime <= now:
+                error = PAST_APPOINTMENT_MESSAGE
+            elif doctor_id not in physician_ids:
+                error = "User is not a physician!"
+            elif (doctor_id, day) not in on_duty:
+                error = "Doctor not on schedule!"
+            elif not all(key in free_slots for key in slot_keys):
+                error = SLOT_TAKEN_MESSAGE
+            elif doctor_id in hold_indexes and \
+                    hold_indexes[doctor_id].overlaps(*interval):
+                error = SLOT_HELD_MESSAGE
+            elif patient_index.overlaps(*interval):
+                error = "Patient already has an appointment at this time!"
+            else:
+                claimed.extend(free_slots.pop(key) for key in slot_keys)
+                patient_index.add(*interval)
+                booked.append(appointment)
+            report.append({
+                "datetime": appointment.datetime,
+                "appointment": None if error else appointment,
+                "error": error
+            })
+
+        deleted, _ = FreeSlot.objects.filter(pk__in=claimed).delete()
+        if deleted < len(claimed):
+            raise SlotTaken()
+        Appointment.objects.bulk_create(booked)
+        if held_by is not None:
+            SlotHold.objects.filter(
+                doctor__in=doctor_ids, held_by=held_by
+            ).delete()
+
+    for doctor_id, day in {(a.doctor_id, _as_naive(a.datetime).date())
+                           for a in booked}:
+        invalidate_free_slots(doctor_id, day)
+    return report
+
+
+def get_series_datetimes(start, count, interval):
+    """
+    Datetimes of a series of recurring appointments.
+
+    Parameters
+    ----------
+    start : datetime.datetime
+        first appointment.
+    count : int
+        number of appointments.
+    interval : datetime.timedelta
+        time between appointments.
+
+    Returns
+    ----------
+    list
+    """
+
+    return [start + interval * i for i in range(count)]
+
+
+def hold_slot(doctor_id, appointment_datetime, duration, held_by,
+              seconds=SLOT_HOLD_TIME):
+    """
+    Keep free slots of an appointment from being held or booked by other
+    employees for a while.
+
+    An employee holds one appointment time per doctor at most, holding
+    another one releases the previous.
+
+    Parameters
+    ----------
+    doctor_id : int
+    appointment_datetime : datetime.datetime
+        appointment start.
+    duration : int
+        appointment duration in minutes.
+    held_by : User
+        employee holding the slots.
+    seconds : int
+        how long the slots are held.
+
+    Returns
+    ----------
+    SlotHold
+
+    Raises
+    ----------
+    SlotTaken
+        if any of the slots is not free or held by someone else.
+    ValidationError
+        if appointment time has passed.
+    """
+
+    start = _as_aware(appointment_datetime)
+    end = start + timedelta(minutes=duration)
+    now = timezone.now()
+    if start <= now:
+        raise ValidationError(PAST_APPOINTMENT_MESSAGE, code="past")
+    try:
+        with transaction.atomic():
+            SlotHold.objects.filter(expires__lte=now).delete()
+            SlotHold.objects.filter(
+                doctor_id=doctor_id, held_by=held_by
+            ).delete()
+            free_slots = _get_free_slots(
+                doctor_id, appointment_datetime, duration
+            ).select_for_update()
+            if (len(free_slots)
+                    < _count_needed_slots(appointment_datetime, duration)):
+                raise SlotTaken()
+            if _get_active_holds([doctor_id], start, end).exists():
+                raise SlotTaken(SLOT_HELD_MESSAGE)
+            return SlotHold.objects.create(
+                doctor_id=doctor_id,
+                datetime=start,
+                end=end,
+                expires=now + timedelta(seconds=seconds),
+                held_by=held_by
+            )
+    except IntegrityError:
+        raise SlotTaken(SLOT_HELD_MESSAGE)
+
+
+def _claim_free_slots(doctor_id, appointment_datetime, duration):
+    """
+    Delete free slots overlapping an appointment and return their number.
+    """
+
+    slots = _get_free_slots(doctor_id, appointment_datetime, duration)
+    if connection.features.has_select_for_update_skip_locked:
+        slots = FreeSlot.objects.filter(pk__in=list(
+            slots.select_for_update(skip_locked=True).values_list(
+                "pk", flat=True)
+        ))
+    deleted, _ = slots.delete()
+    return deleted
+
+
+def _get_free_slots(doctor_id, appointment_datetime, duration):
+    """
+    Free slots overlapping an appointment.
+    """
+
+    start = _as_aware(appointment_datetime)
+    return FreeSlot.objects.filter(
+        Q(doctor_id=doctor_id)
+        & Q(datetime__gt=start - timedelta(minutes=APPOINTMENT_TIME))
+        & Q(datetime__lt=start + timedelta(minutes=duration))
+    )
+
+
+def _get_active_holds(doctor_ids, start, end):
+    """
+    Not expired holds of doctors overlapping given aware datetimes.
+    """
+
+    return SlotHold.objects.filter(
+        Q(doctor__in=doctor_ids)
+        & Q(datetime__lt=end)
+        & Q(end__gt=start)
+        & Q(expires__gt=timezone.now())
+    )
+
+
+def _count_needed_slots(appointment_datetime, duration):
+    """
+    Number of slots an appointment overlaps.
+    """
+
+    busy = bitmaps.get_busy_bitmap(
+        _as_naive(appointment_datetime).time(), duration
+    )
+    return bin(busy).count("1")
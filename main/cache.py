@@ -0,0 +1,161 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .const import (FREE_SLOTS_CACHE_TIMEOUT, FREE_SLOTS_LOCK_TIMEOUT,
+                    FREE_SLOTS_LOCK_WAIT)
+
+
+KEY_PREFIX = "free-slot-bitmaps"
+HITS_KEY = f"{KEY_PREFIX}:hits"
+MISSES_KEY = f"{KEY_PREFIX}:misses"
+POLL_INTERVAL = 0.05
+
+
+def get_free_slots_key(doctor_id, day):
+    """
+    Cache key of a doctor free slots on a given day.
+    """
+
+    return f"{KEY_PREFIX}:{doctor_id}:{day.isoformat()}"
+
+
+def get_or_compute_free_slots(keys, compute):
+    """
+    Get cached free slots of doctor days, computing missing ones.
+
+    A missing day is computed by the first caller only. Concurrent callers
+    wait for its result instead of computing it again, up to
+    FREE_SLOTS_LOCK_WAIT seconds.
+
+    Parameters
+    ----------
+    keys : iterable
+        (doctor_id, datetime.date) tuples.
+    compute : callable
+        takes a list of (doctor_id, datetime.date) tuples and returns a dict
+        with free slots bitmaps for them.
+
+    Returns
+    ----------
+    dict
+        (doctor_id, datetime.date) keys, free slots bitmap values.
+    """
+
+    cache_keys = {get_free_slots_key(*key): key for key in set(keys)}
+    cached = cache.get_many(cache_keys)
+    result = {cache_keys[cache_key]: value for cache_key, value in cached.items()}
+    missing = [key for cache_key, key in cache_keys.items()
+               if cache_key not in cached]
+    _count(HITS_KEY, len(result))
+    _count(MISSES_KEY, len(missing))
+    if not missing:
+        return result
+
+    locked = [key for key in missing if _lock(key)]
+    locked_keys = set(locked)
+    waiting = [key for key in missing if key not in locked_keys]
+    if locked:
+        try:
+            result.update(_compute_and_store(locked, compute))
+        finally:
+            cache.delete_many([_get_lock_key(key) for key in locked])
+    if waiting:
+        result.update(_wait_for(waiting, compute))
+    return result
+
+
+def invalidate_free_slots(doctor_id, day):
+    """
+    Drop a doctor day from the cache now and once the transaction commits.
+    """
+
+    if doctor_id is None or day is None:
+        return
+    cache_key = get_free_slots_key(doctor_id, day)
+    cache.delete(cache_key)
+    transaction.on_commit(lambda: cache.delete(cache_key))
+
+
+def get_cache_stats():
+    """
+    Return free slots cache hit and miss counters.
+    """
+
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        "hits": counters.get(HITS_KEY, 0),
+        "misses": counters.get(MISSES_KEY, 0)
+    }
+
+
+def reset_cache_stats():
+    """
+    Set free slots cache hit and miss counters to zero.
+    """
+
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def _compute_and_store(keys, compute):
+    """
+    Compute free slots of doctor days and store them in the cache.
+    """
+
+    computed = compute(keys)
+    values = {key: computed.get(key, 0) for key in keys}
+    cache.set_many(
+        {get_free_slots_key(*key): value for key, value in values.items()},
+        FREE_SLOTS_CACHE_TIMEOUT
+    )
+    return values
+
+
+def _wait_for(keys, compute):
+    """
+    Wait for doctor days computed by another caller. Compute those that did
+    not show up in time.
+    """
+
+    result = {}
+    deadline = time.monotonic() + FREE_SLOTS_LOCK_WAIT
+    while keys and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        cache_keys = {get_free_slots_key(*key): key for key in keys}
+        for cache_key, value in cache.get_many(cache_keys).items():
+            result[cache_keys[cache_key]] = value
+        keys = [key for key in keys if key not in result]
+    if keys:
+        result.update(compute(keys))
+    return result
+
+
+def _lock(key):
+    """
+    Acquire a lock on computing a doctor day. Return True on success.
+    """
+
+    return cache.add(_get_lock_key(key), True, FREE_SLOTS_LOCK_TIMEOUT)
+
+
+def _get_lock_key(key):
+    """
+    Cache key of a doctor day computation lock.
+    """
+
+    return f"{get_free_slots_key(*key)}:lock"
+
+
+def _count(counter_key, amount):
+    """
+    Increase a cache counter.
+    """
+
+    if not amount:
+        return
+    cache.add(counter_key, 0, timeout=None)
+    try:
+        cache.incr(counter_key, amount)
+    except ValueError:
+        cache.set(counter_key, amount, timeout=None)
@@ -1 +1,57 @@
-APPOINTMENT_TIME = 30       # Minutes.
\ No newline at end of file
+APPOINTMENT_TIME = 30       # Minutes.
+EARLIEST_SLOTS_LIMIT = 10   # Slots listed by first available search.
+DASHBOARD_PAGE_SIZE = 25    # Appointments listed on nurse main page.
+WORKLIST_SIZE = 10          # Appointments prefetched for doctor queue.
+WORKLIST_OVERDUE_LIMIT = 20  # Unclosed past appointments listed.
+NO_SHOW_GRACE_HOURS = 24    # Time to close an appointment before a sweep.
+NO_SHOW_BATCH_SIZE = 500    # Appointments closed per sweep transaction.
+PATIENT_SEARCH_PAGE_SIZE = 20  # Patients listed on search results page.
+PATIENT_SEARCH_LIMIT = 200  # Most relevant search results listed.
+PATIENT_TYPEAHEAD_LIMIT = 10  # Patients suggested while typing.
+PATIENT_TYPEAHEAD_SCAN = 5000  # Index entries checked per suggestion.
+PATIENT_TYPEAHEAD_SIZE = 200000  # Patients kept in memory per process.
+PATIENT_TYPEAHEAD_TIMEOUT = 10 * 60  # Seconds before index is rebuilt.
+PATIENT_IMPORT_BATCH_SIZE = 1000  # Patients inserted at once on import.
+PATIENT_IMPORT_MAX_ERRORS = 100  # Invalid rows listed in import report.
+EXPORT_CHUNK_SIZE = 2000     # Rows read and written at once on export.
+FHIR_BATCH_SIZE = 500       # FHIR resources saved at once on import.
+FHIR_PAGE_SIZE = 500        # FHIR resources requested per server page.
+FHIR_TIMEOUT = 30           # Seconds to wait for a FHIR server.
+TREATMENT_HISTORY_PAGE_SIZE = 20  # Appointments loaded at once per patient.
+FREE_SLOTS_CACHE_TIMEOUT = 60 * 60  # Seconds.
+FREE_SLOTS_LOCK_TIMEOUT = 10        # Seconds.
+FREE_SLOTS_LOCK_WAIT = 2            # Seconds.
+FREE_SLOT_BATCH_SIZE = 1000  # FreeSlot rows inserted at once.
+FREE_SLOT_REBUILD_BATCH_SIZE = 500  # Schedules rebuilt per transaction.
+BOOKING_DAYS = 7            # Days appointments can be booked, from today.
+SLOT_HOLD_TIME = 120        # Seconds a slot is held by default.
+SLOT_HOLD_MAX_TIME = 600    # Seconds.
+SERIES_MAX_APPOINTMENTS = 52
+SHIFT_TEMPLATE_MAX_DAYS = 366  # Days a shift template is expanded over.
+SHIFT_PREVIEW_ROWS = 50     # Shifts listed in shift template preview.
+SHIFT_IMPORT_BATCH_SIZE = 500  # iCalendar events saved at once on import.
+ICAL_FEED_PAST_DAYS = 30    # Days of past appointments in calendar feeds.
+
+DEFAULT_VISIT_TYPE = "consultation"
+VISIT_TYPE_CHOICES = [
+    ("consultation", "Consultation"),
+    ("follow_up", "Follow-up"),
+    ("examination", "Examination"),
+    ("procedure", "Procedure"),
+]
+VISIT_DURATIONS = {         # Minutes.
+    "consultation": 30,
+    "follow_up": 30,
+    "examination": 60,
+    "procedure": 90,
+}
+
+WEEKDAY_CHOICES = [
+    (0, "Monday"),
+    (1, "Tuesday"),
+    (2, "Wednesday"),
+    (3, "Thursday"),
+    (4, "Friday"),
+    (5, "Saturday"),
+    (6, "Sunday"),
+]
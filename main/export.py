@@ -0,0 +1,202 @@
+import csv
+import json
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .const import EXPORT_CHUNK_SIZE
+from .models import Appointment, Deletion
+from patients.models import Patient
+
+
+# Exported columns by dataset, related fields are joined in the same query.
+DATASETS = {
+    "patients": (
+        Patient,
+        (
+            "id", "first_name", "last_name", "date_of_birth", "personal_id",
+            "email", "phone", "address__street", "address__number",
+            "address__apartment", "address__zip_code", "address__city",
+            "address__country", "modified", "address__modified",
+        ),
+        ("modified", "address__modified"),
+    ),
+    "appointments": (
+        Appointment,
+        (
+            "id", "datetime", "duration", "visit_type", "purpose",
+            "examination", "diagnosis", "advice", "prescription",
+            "took_place", "doctor_id", "doctor__username",
+            "doctor__first_name", "doctor__last_name", "patient_id",
+            "patient__personal_id", "patient__first_name", "patient__last_name",
+            "modified", "patient__modified",
+        ),
+        # renamed doctors mark their appointments modified, see main.signals
+        ("modified", "patient__modified"),
+    ),
+}
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "columnar": "application/x-ndjson",
+}
+
+
+def parse_since(value):
+    """
+    Aware datetime of an ISO date or datetime string, None if invalid.
+    """
+
+    try:
+        since = parse_datetime(value) or parse_datetime(f"{value}T00:00")
+    except ValueError:
+        return None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def get_export_rows(dataset, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Read rows of a dataset in chunks, without loading the whole table.
+
+    Parameters
+    ----------
+    dataset : str
+        "patients" or "appointments".
+    since : datetime.datetime
+        only rows changed at or after since if given.
+    chunk_size : int
+        rows fetched from the database at once.
+
+    Returns
+    ----------
+    tuple
+        column names and an iterator of row tuples ordered by ID.
+    """
+
+    model, columns, modified = DATASETS[dataset]
+    rows = model.objects.order_by("id")
+    if since is not None:
+        changed = Q()
+        for field in modified:
+            changed |= Q(**{f"{field}__gte": since})
+        rows = rows.filter(changed)
+    return columns, rows.values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def get_deleted_rows(dataset, since, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Read IDs of dataset records deleted at or after since in chunks.
+
+    Returns
+    ----------
+    iterator
+        (id, deleted datetime) tuples in deletion order.
+    """
+
+    return Deletion.objects.filter(
+        dataset=dataset, deleted__gte=since
+    ).order_by("deleted", "id").values_list(
+        "record_id", "deleted").iterator(chunk_size=chunk_size)
+
+
+def export(dataset, format, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Stream a dataset as text.
+
+    Rows get a deleted column, empty for existing records. Exports since a
+    date end with a row per record deleted since then, with the ID and
+    deletion time only.
+
+    Parameters
+    ----------
+    dataset : str
+        "patients" or "appointments".
+    format : str
+        "csv", "ndjson" with an object per row or "columnar" with an object
+        of column value lists per chunk of rows.
+    since : datetime.datetime
+        only rows changed at or after since if given.
+    chunk_size : int
+
+    Yields
+    ----------
+    str
+        chunks of output, a line or a number of lines each.
+    """
+
+    columns, rows = get_export_rows(dataset, since, chunk_size)
+    columns += ("deleted",)
+    rows = (row + (None,) for row in rows)
+    if since is not None:
+        padding = (None,) * (len(columns) - 2)
+        rows = chain(rows, (
+            (record_id, *padding, deleted)
+            for record_id, deleted in get_deleted_rows(
+                dataset, since, chunk_size)
+        ))
+    if format == "csv":
+        yield from _write_csv(columns, rows)
+    elif format == "ndjson":
+        for row in rows:
+            yield _dumps(dict(zip(columns, row))) + "\n"
+    else:
+        yield from _write_columnar(columns, rows, chunk_size)
+
+
+class _Echo:
+    """
+    File-like object returning what is written, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _write_csv(columns, rows):
+    """
+    CSV lines with a header.
+    """
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _write_columnar(columns, rows, chunk_size):
+    """
+    A JSON line per chunk of rows with a list of values per column.
+    """
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield _dumps_chunk(columns, chunk)
+            chunk = []
+    if chunk:
+        yield _dumps_chunk(columns, chunk)
+
+
+def _dumps_chunk(columns, chunk):
+    """
+    JSON line of a chunk of rows stored by column.
+    """
+
+    return _dumps({
+        "rows": len(chunk),
+        "columns": dict(zip(columns, map(list, zip(*chunk))))
+    }) + "\n"
+
+
+def _dumps(value):
+    """
+    JSON with dates and datetimes in ISO format.
+    """
+
+    return json.dumps(value, cls=DjangoJSONEncoder)
@@ -0,0 +1,815 @@
+import io
+import json
+import os
+from datetime import timedelta
+from urllib.parse import urlencode, urlparse
+from urllib.request import Request, url2pathname, urlopen
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .booking import book_appointments
+from .const import (DEFAULT_VISIT_TYPE, EXPORT_CHUNK_SIZE, FHIR_BATCH_SIZE,
+                    FHIR_PAGE_SIZE, FHIR_TIMEOUT, PATIENT_IMPORT_MAX_ERRORS,
+                    VISIT_DURATIONS)
+from .export import get_export_rows
+from .models import Appointment
+from patients.forms import AddressForm, PatientForm
+from patients.importer import RowValidator
+from patients.models import Address, Patient
+from patients.typeahead import reset_index
+
+
+# Identifier systems of clinic records in FHIR resources.
+PATIENT_SYSTEM = "urn:clinic:personal-id"
+PRACTITIONER_SYSTEM = "urn:clinic:username"
+APPOINTMENT_SYSTEM = "urn:clinic:appointment"
+VISIT_TYPE_SYSTEM = "urn:clinic:visit-type"
+
+# Export dataset of each resource type, in import order so appointments
+# can refer to patients of the same bundle.
+RESOURCE_TYPES = {"Patient": "patients", "Appointment": "appointments"}
+FORMATS = {
+    "bundle": "application/fhir+json",
+    "ndjson": "application/fhir+ndjson",
+}
+# Appointment status by took_place value and the other way round.
+STATUSES = {None: "booked", True: "fulfilled", False: "noshow"}
+TOOK_PLACE = {status: took_place for took_place, status in STATUSES.items()}
+
+
+def patient_to_resource(row):
+    """
+    FHIR Patient resource of a patients export row.
+
+    Address lines are street, house number and apartment if any.
+    """
+
+    resource = {
+        "resourceType": "Patient",
+        "id": str(row["id"]),
+        "meta": {"lastUpdated": max(
+            value for value in (row["modified"], row["address__modified"])
+            if value is not None
+        )},
+        "identifier": [{"system": PATIENT_SYSTEM, "value": row["personal_id"]}],
+        "name": [{"family": row["last_name"], "given": [row["first_name"]]}],
+        "telecom": [
+            {"system": "phone", "value": row["phone"]},
+            {"system": "email", "value": row["email"]},
+        ],
+        "birthDate": row["date_of_birth"],
+    }
+    if row["address__street"] is not None:
+        lines = [row["address__street"], row["address__number"]]
+        if row["address__apartment"]:
+            lines.append(row["address__apartment"])
+        resource["address"] = [{
+            "line": lines,
+            "postalCode": row["address__zip_code"],
+            "city": row["address__city"],
+            "country": row["address__country"],
+        }]
+    return resource
+
+
+def appointment_to_resource(row):
+    """
+    FHIR Appointment resource of an appointments export row.
+
+    Visit notes are left out, they belong to Encounter resources.
+    """
+
+    return {
+        "resourceType": "Appointment",
+        "id": str(row["id"]),
+        "meta": {"lastUpdated": row["modified"]},
+        "identifier": [{"system": APPOINTMENT_SYSTEM, "value": str(row["id"])}],
+        "status": STATUSES[row["took_place"]],
+        "appointmentType": {"coding": [
+            {"system": VISIT_TYPE_SYSTEM, "code": row["visit_type"]}
+        ]},
+        "description": row["purpose"],
+        "start": row["datetime"],
+        "end": row["datetime"] + timedelta(minutes=row["duration"]),
+        "minutesDuration": row["duration"],
+        "participant": [
+            {
+                "actor": {
+                    "reference": f"Patient/{row['patient_id']}",
+                    "identifier": {
+                        "system": PATIENT_SYSTEM,
+                        "value": row["patient__personal_id"]
+                    },
+                    "display": f"{row['patient__first_name']} "
+                               f"{row['patient__last_name']}",
+                },
+                "status": "accepted",
+            },
+            {
+                "actor": {
+                    "reference": f"Practitioner/{row['doctor_id']}",
+                    "identifier": {
+                        "system": PRACTITIONER_SYSTEM,
+                        "value": row["doctor__username"]
+                    },
+                    "display": f"{row['doctor__first_name']} "
+                               f"{row['doctor__last_name']}",
+                },
+                "status": "accepted",
+            },
+        ],
+    }
+
+
+def iter_resources(resource_types, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield FHIR resources of given types read from the database in chunks.
+
+    Parameters
+    ----------
+    resource_types : iterable
+        "Patient" and/or "Appointment".
+    since : datetime.datetime
+        only records changed at or after since if given.
+    chunk_size : int
+        rows fetched from the database at once.
+    """
+
+    to_resource = {
+        "Patient": patient_to_resource,
+        "Appointment": appointment_to_resource
+    }
+    for resource_type, dataset in RESOURCE_TYPES.items():
+        if resource_type not in resource_types:
+            continue
+        columns, rows = get_export_rows(dataset, since, chunk_size)
+        for row in rows:
+            yield to_resource[resource_type](dict(zip(columns, row)))
+
+
+def serialize(resource_types, format="bundle", since=None,
+              bundle_type="collection", base_url=None,
+              chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Stream FHIR resources as text without holding them all in memory.
+
+    Parameters
+    ----------
+    resource_types : iterable
+        "Patient" and/or "Appointment".
+    format : str
+        "bundle" for a Bundle resource or "ndjson" for a resource per line.
+    since : datetime.datetime
+        only records changed at or after since if given.
+    bundle_type : str
+        "collection", "searchset" or "batch". Batch entries are conditional
+        updates by identifier, so a FHIR server can apply them repeatedly.
+    base_url : str
+        FHIR base url of entry fullUrls, none if not given.
+    chunk_size : int
+
+    Yields
+    ----------
+    str
+        chunks of output, a resource or a line each.
+    """
+
+    resources = iter_resources(resource_types, since, chunk_size)
+    if format == "ndjson":
+        for resource in resources:
+            yield _dumps(resource) + "\n"
+        return
+
+    header = _dumps({
+        "resourceType": "Bundle",
+        "type": bundle_type,
+        "timestamp": timezone.now(),
+    })
+    yield header[:-1] + ', "entry": [\n'
+    separator = ""
+    for resource in resources:
+        entry = {}
+        if base_url is not None:
+            entry["fullUrl"] = (
+                f"{base_url}/{resource['resourceType']}/{resource['id']}"
+            )
+        entry["resource"] = resource
+        if bundle_type == "batch":
+            identifier = resource["identifier"][0]
+            entry["request"] = {
+                "method": "PUT",
+                "url": f"{resource['resourceType']}?identifier="
+                       f"{identifier['system']}|{identifier['value']}",
+            }
+        yield separator + _dumps(entry)
+        separator = ",\n"
+    yield "\n]}\n"
+
+
+class _JsonReader:
+    """
+    Read JSON values one at a time from a text stream.
+    """
+
+    def __init__(self, stream, read_size=64 * 1024):
+        self.stream = stream
+        self.read_size = read_size
+        self.buffer = ""
+        self.position = 0
+        self.decoder = json.JSONDecoder()
+
+    def peek(self):
+        """
+        Next non-whitespace character, empty string at the end of stream.
+        """
+
+        while True:
+            while (self.position < len(self.buffer)
+                   and self.buffer[self.position].isspace()):
+                self.position += 1
+            if self.position < len(self.buffer) or not self._read():
+                return self.buffer[self.position:self.position + 1]
+
+    def expect(self, character):
+        """
+        Skip the next character, raise ValueError if it isn't as expected.
+        """
+
+        if self.peek() != character:
+            raise ValueError(
+                f"Expected {character!r} at character {self.position}."
+            )
+        self.position += 1
+
+    def value(self):
+        """
+        Decode the next value, reading more of the stream until it's whole.
+        """
+
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                if not self._read():
+                    raise
+                continue
+            # a number at the end of the buffer may go on in the stream
+            if end < len(self.buffer) or not self._read():
+                self.position = end
+                return value
+
+    def _read(self):
+        """
+        Append the next part of the stream to the unread part of the buffer.
+        """
+
+        data = self.stream.read(self.read_size)
+        if not data:
+            return False
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+        return True
+
+
+def iter_bundle(stream, header=None):
+    """
+    Yield entries of a Bundle one at a time, without loading the whole
+    bundle.
+
+    Parameters
+    ----------
+    stream : file-like object
+        text stream of a Bundle resource.
+    header : dict
+        filled with other Bundle elements, e.g. paging links, if given.
+        Elements after entries are there once every entry was yielded.
+
+    Raises
+    ----------
+    ValueError
+        if the stream isn't a JSON object.
+    """
+
+    reader = _JsonReader(stream)
+    header = {} if header is None else header
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "entry":
+            reader.expect("[")
+            while reader.peek() != "]":
+                yield reader.value()
+                if reader.peek() == ",":
+                    reader.position += 1
+            reader.position += 1
+        else:
+            header[key] = reader.value()
+        if reader.peek() != ",":
+            reader.expect("}")
+            return
+        reader.position += 1
+
+
+def read_resources(stream, format="bundle", header=None):
+    """
+    Yield resources of a FHIR Bundle or NDJSON text stream one at a time.
+
+    Parameters
+    ----------
+    stream : file-like object
+    format : str
+        "bundle" or "ndjson".
+    header : dict
+        filled with other elements of a Bundle, see iter_bundle.
+
+    Yields
+    ----------
+    dict
+        resource, None for an entry or line that isn't a JSON object.
+    """
+
+    if format == "ndjson":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+        return
+    for entry in iter_bundle(stream, header):
+        yield entry.get("resource") if isinstance(entry, dict) else None
+
+
+def patient_from_resource(resource):
+    """
+    Patient and address fields of a FHIR Patient resource, as a row for
+    patients.importer.RowValidator.
+    """
+
+    name = _first(resource.get("name"))
+    row = {
+        "first_name": " ".join(name.get("given") or ()),
+        "last_name": name.get("family"),
+        "date_of_birth": resource.get("birthDate"),
+        "personal_id": _get_identifier(resource, PATIENT_SYSTEM),
+    }
+    for telecom in resource.get("telecom") or ():
+        if telecom.get("system") in ("phone", "email"):
+            row.setdefault(telecom["system"], telecom.get("value"))
+    address = _first(resource.get("address"))
+    row.update(zip(("street", "number", "apartment"), address.get("line") or ()))
+    row.update(
+        zip_code=address.get("postalCode"),
+        city=address.get("city"),
+        country=address.get("country")
+    )
+    return row
+
+
+def appointment_from_resource(resource):
+    """
+    Appointment fields of a FHIR Appointment resource.
+
+    Patient and doctor are given by personal_id and username from the
+    participant identifiers.
+
+    Raises
+    ----------
+    ValidationError
+        with errors by element name.
+    """
+
+    errors = {}
+    start = resource.get("start")
+    try:
+        start = parse_datetime(start) if isinstance(start, str) else None
+    except ValueError:
+        start = None
+    if start is None or timezone.is_naive(start):
+        errors["start"] = ["Enter a valid instant with a time zone."]
+
+    status = resource.get("status")
+    if status not in TOOK_PLACE:
+        errors["status"] = [f"Status must be one of {', '.join(TOOK_PLACE)}."]
+
+    visit_type = DEFAULT_VISIT_TYPE
+    coding = _first((resource.get("appointmentType") or {}).get("coding"))
+    if coding.get("system") == VISIT_TYPE_SYSTEM:
+        visit_type = coding.get("code")
+        if visit_type not in VISIT_DURATIONS:
+            errors["appointmentType"] = ["Unknown visit type."]
+
+    duration = resource.get("minutesDuration")
+    if duration is not None and (type(duration) is not int or duration < 1):
+        errors["minutesDuration"] = ["Enter a positive whole number."]
+
+    purpose = resource.get("description")
+    if not isinstance(purpose, str) or not purpose.strip():
+        errors["description"] = ["This field is required."]
+    elif len(purpose) > Appointment._meta.get_field("purpose").max_length:
+        errors["description"] = ["Description is too long."]
+
+    actors = {}
+    for participant in resource.get("participant") or ():
+        identifier = (participant.get("actor") or {}).get("identifier") or {}
+        actors[identifier.get("system")] = identifier.get("value")
+    if not actors.get(PATIENT_SYSTEM):
+        errors["participant"] = ["Patient personal id is required."]
+    elif not actors.get(PRACTITIONER_SYSTEM):
+        errors["participant"] = ["Practitioner username is required."]
+
+    if errors:
+        raise ValidationError(errors)
+    return {
+        "datetime": start,
+        "personal_id": actors[PATIENT_SYSTEM],
+        "username": actors[PRACTITIONER_SYSTEM],
+        "took_place": TOOK_PLACE[status],
+        "visit_type": visit_type,
+        "duration": duration,
+        "purpose": purpose,
+    }
+
+
+def import_resources(resources, batch_size=FHIR_BATCH_SIZE):
+    """
+    Insert or update patients and appointments of FHIR resources in batches.
+
+    Patients are matched by personal id and appointments by doctor and
+    start, only their status and description are updated. New appointments
+    are booked with main.booking.book_appointments rules. Every batch is
+    saved in its own transaction with the same number of queries whatever
+    its size, changed records get a new modified time.
+
+    Parameters
+    ----------
+    resources : iterable
+        resource dicts, see read_resources.
+    batch_size : int
+        resources saved at once.
+
+    Yields
+    ----------
+    dict
+        batch report with resources, created, updated, unchanged,
+        duplicates and invalid counts and errors as (resource number,
+        errors by element) tuples.
+    """
+
+    validator = RowValidator()
+    batch = []
+    for number, resource in enumerate(resources, start=1):
+        batch.append((number, resource))
+        if len(batch) == batch_size:
+            yield _import_batch(batch, validator)
+            batch = []
+    if batch:
+        yield _import_batch(batch, validator)
+
+
+def summarize_import(reports):
+    """
+    Sum up batch reports of import_resources, keeping the first
+    PATIENT_IMPORT_MAX_ERRORS errors.
+    """
+
+    summary = {"resources": 0, "created": 0, "updated": 0, "unchanged": 0,
+               "duplicates": 0, "invalid": 0, "errors": []}
+    for report in reports:
+        for key, value in report.items():
+            if key != "errors":
+                summary[key] += value
+        free = PATIENT_IMPORT_MAX_ERRORS - len(summary["errors"])
+        summary["errors"] += report["errors"][:free]
+    return summary
+
+
+def _import_batch(batch, validator):
+    """
+    Parse a batch of resources and save them in a transaction.
+    """
+
+    report = {"resources": len(batch), "created": 0, "updated": 0,
+              "unchanged": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    patients = {}
+    appointments = []
+    for number, resource in batch:
+        try:
+            resource_type = resource.get("resourceType")
+            if resource_type == "Patient":
+                patient, address = validator.clean(
+                    patient_from_resource(resource))
+                if patient["personal_id"] in patients:
+                    report["duplicates"] += 1
+                patients[patient["personal_id"]] = (patient, address)
+            elif resource_type == "Appointment":
+                appointments.append(
+                    (number, appointment_from_resource(resource)))
+            else:
+                raise ValidationError(
+                    {"resourceType": ["Unsupported resource type."]})
+        except ValidationError as e:
+            _add_error(report, number, e.message_dict)
+        except (AttributeError, TypeError, ValueError):
+            _add_error(report, number, {"resource": ["Invalid resource."]})
+
+    with transaction.atomic():
+        _save_patients(patients, report)
+        _save_appointments(appointments, report)
+    return report
+
+
+def _save_patients(patients, report):
+    """
+    Insert new patients and update changed ones with bulk queries.
+    """
+
+    if not patients:
+        return
+    existing = Patient.objects.select_related("address").in_bulk(
+        patients, field_name="personal_id")
+    now = timezone.now()
+    created = []
+    updated = []
+    new_addresses = []
+    updated_addresses = []
+    for personal_id, (fields, address_fields) in patients.items():
+        patient = existing.get(personal_id)
+        if patient is None:
+            patient = Patient(**fields)
+            created.append(patient)
+        changed = _update(patient, fields)
+        if address_fields and patient.address is None:
+            patient.address = Address(**address_fields)
+            new_addresses.append(patient)
+            changed = True
+        elif address_fields and _update(patient.address, address_fields):
+            patient.address.modified = now
+            updated_addresses.append(patient.address)
+        if patient.pk is None:
+            continue
+        if changed:
+            patient.modified = now
+            updated.append(patient)
+        if changed or patient.address in updated_addresses:
+            report["updated"] += 1
+        else:
+            report["unchanged"] += 1
+
+    Address.objects.bulk_create(patient.address for patient in new_addresses)
+    for patient in new_addresses:
+        patient.address = patient.address
+    Patient.objects.bulk_create(created)
+    Patient.objects.bulk_update(
+        updated, [*PatientForm.Meta.fields, "address", "modified"])
+    Address.objects.bulk_update(
+        updated_addresses, [*AddressForm.Meta.fields, "modified"])
+    report["created"] += len(created)
+    if created or report["updated"]:
+        # bulk queries skip signals the typeahead index relies on
+        transaction.on_commit(reset_index)
+
+
+def _save_appointments(appointments, report):
+    """
+    Update status and description of known appointments and book new ones.
+    """
+
+    if not appointments:
+        return
+    patient_ids = dict(Patient.objects.filter(
+        personal_id__in={fields["personal_id"] for _, fields in appointments}
+    ).values_list("personal_id", "id"))
+    doctor_ids = dict(User.objects.filter(
+        username__in={fields["username"] for _, fields in appointments}
+    ).values_list("username", "id"))
+    existing = {
+        (appointment.doctor_id, appointment.datetime): appointment
+        for appointment in Appointment.objects.filter(
+            doctor__in=doctor_ids.values(),
+            datetime__in={fields["datetime"] for _, fields in appointments}
+        )
+    }
+
+    now = timezone.now()
+    updated = []
+    new = []
+    for number, fields in appointments:
+        patient_id = patient_ids.get(fields["personal_id"])
+        doctor_id = doctor_ids.get(fields["username"])
+        if patient_id is None or doctor_id is None:
+            _add_error(report, number, {"participant": [
+                "Unknown patient." if patient_id is None
+                else "Unknown practitioner."
+            ]})
+            continue
+        appointment = existing.get((doctor_id, fields["datetime"]))
+        if appointment is None:
+            new.append((number, Appointment(
+                datetime=fields["datetime"],
+                patient_id=patient_id,
+                doctor_id=doctor_id,
+                purpose=fields["purpose"],
+                visit_type=fields["visit_type"],
+                duration=fields["duration"],
+                took_place=fields["took_place"]
+            )))
+        elif appointment.patient_id != patient_id:
+            _add_error(report, number, {"start": [
+                "Doctor already has an appointment at this time!"]})
+        elif _update(appointment, {"purpose": fields["purpose"],
+                                   "took_place": fields["took_place"]}):
+            appointment.modified = now
+            updated.append(appointment)
+        else:
+            report["unchanged"] += 1
+
+    Appointment.objects.bulk_update(
+        updated, ["purpose", "took_place", "modified"])
+    report["updated"] += len(updated)
+    # fulfilled and no-show appointments are history kept by the sender
+    booked = book_appointments(
+        (appointment for _, appointment in new), allow_past=True
+    )
+    for (number, _), booking in zip(new, booked):
+        if booking["error"]:
+            _add_error(report, number, {"start": [booking["error"]]})
+        else:
+            report["created"] += 1
+
+
+def _update(instance, fields):
+    """
+    Set changed field values of a model instance, True if any changed.
+    """
+
+    changed = False
+    for name, value in fields.items():
+        if getattr(instance, name) != value:
+            setattr(instance, name, value)
+            changed = True
+    return changed
+
+
+def _add_error(report, number, errors):
+    """
+    Count an invalid resource in a batch report.
+    """
+
+    report["invalid"] += 1
+    report["errors"].append((number, errors))
+
+
+def _first(values):
+    """
+    First element of a list of FHIR elements, empty dict if there's none.
+    """
+
+    if isinstance(values, list) and values and isinstance(values[0], dict):
+        return values[0]
+    return {}
+
+
+def _get_identifier(resource, system):
+    """
+    Value of a resource identifier in given system.
+    """
+
+    for identifier in resource.get("identifier") or ():
+        if identifier.get("system") == system:
+            return identifier.get("value")
+    return None
+
+
+def _dumps(value):
+    """
+    JSON with dates and datetimes in ISO format.
+    """
+
+    return json.dumps(value, cls=DjangoJSONEncoder)
+
+
+class DirectoryEndpoint:
+    """
+    Local stand-in for a FHIR server, e.g. a shared folder or test data.
+
+    Resources are read from <resource type>.ndjson files, a pushed bundle is
+    written to Bundle.json.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self, resource_type, since=None):
+        """
+        Yield resources of a type changed at or after since if given.
+        """
+
+        path = os.path.join(self.path, f"{resource_type}.ndjson")
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as stream:
+            for resource in read_resources(stream, "ndjson"):
+                if since is None or _is_updated_since(resource, since):
+                    yield resource
+
+    def push(self, chunks):
+        """
+        Write a batch Bundle given as text chunks.
+        """
+
+        path = os.path.join(self.path, "Bundle.json")
+        with open(path, "w", encoding="utf-8") as stream:
+            stream.writelines(chunks)
+
+
+class HttpEndpoint:
+    """
+    FHIR server REST API.
+    """
+
+    def __init__(self, url, timeout=FHIR_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def read(self, resource_type, since=None):
+        """
+        Yield resources of a type changed at or after since if given,
+        following searchset pages.
+        """
+
+        query = {"_count": FHIR_PAGE_SIZE}
+        if since is not None:
+            query["_lastUpdated"] = f"ge{since.isoformat()}"
+        url = f"{self.url}/{resource_type}?{urlencode(query)}"
+        while url:
+            header = {}
+            request = Request(url, headers={"Accept": FORMATS["bundle"]})
+            with urlopen(request, timeout=self.timeout) as response:
+                stream = io.TextIOWrapper(response, encoding="utf-8")
+                yield from read_resources(stream, "bundle", header)
+            url = next((
+                link.get("url") for link in header.get("link", ())
+                if link.get("relation") == "next"
+            ), None)
+
+    def push(self, chunks):
+        """
+        POST a batch Bundle given as text chunks, sent as they come.
+        """
+
+        request = Request(
+            self.url,
+            data=(chunk.encode() for chunk in chunks),
+            headers={"Content-Type": FORMATS["bundle"]},
+            method="POST"
+        )
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def get_endpoint(url):
+    """
+    HttpEndpoint for http(s) urls, DirectoryEndpoint for file urls and
+    paths.
+    """
+
+    parsed = urlparse(url)
+    if parsed.scheme in ("http", "https"):
+        return HttpEndpoint(url)
+    if parsed.scheme == "file":
+        return DirectoryEndpoint(url2pathname(parsed.path))
+    return DirectoryEndpoint(url)
+
+
+def pull_resources(endpoint, resource_types=RESOURCE_TYPES, since=None):
+    """
+    Yield resources of given types from an endpoint, patients first.
+    """
+
+    for resource_type in RESOURCE_TYPES:
+        if resource_type in resource_types:
+            yield from endpoint.read(resource_type, since)
+
+
+def _is_updated_since(resource, since):
+    """
+    Check if a resource's meta.lastUpdated is at or after since, resources
+    without one count as updated.
+    """
+
+    try:
+        last_updated = parse_datetime(resource["meta"]["lastUpdated"])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return last_updated is None or last_updated >= since
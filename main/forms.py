@@ -1,12 +1,25 @@
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 
 from django import forms
+from django.contrib.admin.widgets import (AdminDateWidget, AdminTimeWidget,
+                                         FilteredSelectMultiple)
 from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.forms.utils import flatatt
+from django.utils import timezone
+from django.utils.html import format_html
 
+from .booking import PAST_APPOINTMENT_MESSAGE
+from .const import (BOOKING_DAYS, DEFAULT_VISIT_TYPE, SERIES_MAX_APPOINTMENTS,
+                    SHIFT_TEMPLATE_MAX_DAYS, SLOT_HOLD_MAX_TIME,
+                    SLOT_HOLD_TIME, VISIT_TYPE_CHOICES, WEEKDAY_CHOICES)
 from .models import Schedule, Appointment
+from .utils import decode_appointment_cursor
 
 
-AVAILABLE_DATES = [date.today() + timedelta(days=i) for i in range(7)]
+AVAILABLE_DATES = [
+    date.today() + timedelta(days=i) for i in range(BOOKING_DAYS)
+]
 AVAILABLE_DATES = [(d, d) for d in AVAILABLE_DATES]
 
 
@@ -28,6 +41,69 @@ class ScheduleModelForm(forms.ModelForm):
         fields = ("date", "date_to", "start", "end", "employee")
 
 
+class ShiftTemplateForm(forms.Form):
+    """
+    Recurring shift of many employees, e.g. Monday to Friday 08:00-16:00 for
+    a quarter.
+    """
+
+    employees = forms.ModelMultipleChoiceField(
+        queryset=User.objects.filter(is_active=True).order_by(
+            "last_name", "first_name"),
+        widget=FilteredSelectMultiple("employees", False)
+    )
+    date_from = forms.DateField(widget=AdminDateWidget)
+    date_to = forms.DateField(widget=AdminDateWidget)
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=WEEKDAY_CHOICES,
+        coerce=int,
+        initial=[0, 1, 2, 3, 4],
+        widget=forms.CheckboxSelectMultiple
+    )
+    start = forms.TimeField(widget=AdminTimeWidget)
+    end = forms.TimeField(widget=AdminTimeWidget)
+
+    def clean(self):
+        """
+        Check if the shift ends after it starts and the date range is at
+        most SHIFT_TEMPLATE_MAX_DAYS long.
+        """
+
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get("date_from")
+        date_to = cleaned_data.get("date_to")
+        start = cleaned_data.get("start")
+        end = cleaned_data.get("end")
+        if date_from and date_to:
+            if date_to < date_from:
+                raise forms.ValidationError(
+                    "Date to can't be before date from!")
+            if (date_to - date_from).days >= SHIFT_TEMPLATE_MAX_DAYS:
+                raise forms.ValidationError(
+                    f"Shifts can be generated for {SHIFT_TEMPLATE_MAX_DAYS} "
+                    "days at most!"
+                )
+        if start and end and end <= start:
+            raise forms.ValidationError("Shift can't end before it starts!")
+        return cleaned_data
+
+    def get_shift(self):
+        """
+        Keyword arguments of main.shifts.expand_shifts of cleaned data.
+        """
+
+        return {
+            "employee_ids": [
+                employee.pk for employee in self.cleaned_data["employees"]
+            ],
+            **{
+                name: self.cleaned_data[name]
+                for name in ("date_from", "date_to", "weekdays", "start",
+                             "end")
+            }
+        }
+
+
 class ScheduleSearchForm(forms.Form):
     """
     Display doctors available for appointments.
@@ -40,6 +116,11 @@ class ScheduleSearchForm(forms.Form):
     employee = forms.ModelChoiceField(
         queryset=User.objects.none(), required=False
     )
+    visit_type = forms.ChoiceField(
+        choices=VISIT_TYPE_CHOICES,
+        initial=DEFAULT_VISIT_TYPE,
+        required=False
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -63,15 +144,177 @@ class AppointmentConfirmForm(forms.Form):
     purpose = forms.CharField(max_length=200, widget=forms.Textarea)
 
 
+class SlotForm(forms.Form):
+    """
+    Select a doctor appointment time and visit type.
+    """
+
+    doctor = forms.ModelChoiceField(
+        queryset=User.objects.filter(groups__name__iexact="physicians")
+    )
+    date = forms.DateField()
+    hour = forms.TimeField()
+    visit_type = forms.ChoiceField(
+        choices=VISIT_TYPE_CHOICES,
+        initial=DEFAULT_VISIT_TYPE,
+        required=False
+    )
+
+    def clean_visit_type(self):
+        """
+        Use default visit type if none selected.
+        """
+
+        return self.cleaned_data["visit_type"] or DEFAULT_VISIT_TYPE
+
+    def clean(self):
+        """
+        Check if appointment time hasn't passed and is within BOOKING_DAYS
+        days from today.
+        """
+
+        cleaned_data = super().clean()
+        day = cleaned_data.get("date")
+        hour = cleaned_data.get("hour")
+        if day is None or hour is None:
+            return cleaned_data
+        if day >= timezone.localdate() + timedelta(days=BOOKING_DAYS):
+            raise ValidationError(
+                f"Appointments can be booked {BOOKING_DAYS} days ahead at "
+                "most!"
+            )
+        if timezone.make_aware(datetime.combine(day, hour)) <= timezone.now():
+            raise ValidationError(PAST_APPOINTMENT_MESSAGE)
+        return cleaned_data
+
+
+class SlotHoldForm(SlotForm):
+    """
+    Hold an appointment time for a number of seconds.
+    """
+
+    seconds = forms.IntegerField(
+        min_value=1,
+        max_value=SLOT_HOLD_MAX_TIME,
+        required=False
+    )
+
+    def clean_seconds(self):
+        """
+        Use default hold time if none given.
+        """
+
+        return self.cleaned_data["seconds"] or SLOT_HOLD_TIME
+
+
+class AppointmentBookForm(SlotForm):
+    """
+    Book an appointment time for a patient with a single request.
+    """
+
+    personal_id = forms.CharField(max_length=11)
+    purpose = forms.CharField(max_length=200)
+
+
+class AppointmentSeriesForm(AppointmentBookForm):
+    """
+    Book recurring appointments, weekly by default.
+    """
+
+    count = forms.IntegerField(min_value=1, max_value=SERIES_MAX_APPOINTMENTS)
+    interval_days = forms.IntegerField(min_value=1, required=False)
+
+    def clean_interval_days(self):
+        """
+        Repeat appointments every week if no interval given.
+        """
+
+        return self.cleaned_data["interval_days"] or 7
+
+
+class DashboardFilterForm(forms.Form):
+    """
+    Filter and page appointments listed on nurse main page.
+    """
+
+    date = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date"})
+    )
+    specialty = forms.ModelChoiceField(
+        queryset=Group.objects.exclude(name="nurses"),
+        required=False
+    )
+    doctor = forms.ModelChoiceField(
+        queryset=User.objects.filter(groups__name__iexact="physicians"),
+        required=False
+    )
+    after = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean_after(self):
+        """
+        Decode page cursor into (datetime, id) tuple.
+        """
+
+        after = self.cleaned_data["after"]
+        if not after:
+            return None
+        try:
+            return decode_appointment_cursor(after)
+        except ValueError:
+            raise forms.ValidationError("Invalid page.")
+
+
+class ReadOnlyWidget(forms.Widget):
+    """
+    Render a value as text instead of an input.
+    """
+
+    def render(self, name, value, attrs=None, renderer=None):
+        """
+        Value in a span element, empty if value is None.
+        """
+
+        return format_html(
+            "<span{}>{}</span>",
+            flatatt(self.build_attrs(self.attrs, attrs)),
+            "" if value is None else value
+        )
+
+
+class ReadOnlyRelationField(forms.Field):
+    """
+    Display object a form instance is linked to instead of a choice list.
+
+    Always disabled, so the form keeps the object it was initialized with and
+    never queries the related table for choices.
+    """
+
+    widget = ReadOnlyWidget
+
+    def __init__(self, **kwargs):
+        kwargs["disabled"] = True
+        super().__init__(**kwargs)
+
+
 class AppointmentModelForm(forms.ModelForm):
     """
     View scheduled appointment details.
+
+    Doctor and patient are displayed, not chosen. Fetch them with
+    select_related to render the form without extra queries.
     """
 
+    doctor = ReadOnlyRelationField()
+    patient = ReadOnlyRelationField()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields["doctor"].disabled = True
-        self.fields["patient"].disabled = True
+        for name in ("doctor", "patient"):
+            if getattr(self.instance, f"{name}_id") is not None:
+                self.initial[name] = getattr(self.instance, name)
+        self.fields["visit_type"].disabled = True
+        self.fields["duration"].disabled = True
         self.fields["prescription"].required = False
 
     class Meta:
@@ -0,0 +1,596 @@
+import operator
+import secrets
+from datetime import datetime, time, timedelta
+from functools import reduce
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Subquery
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .const import (ICAL_FEED_PAST_DAYS, PATIENT_IMPORT_MAX_ERRORS,
+                    SHIFT_IMPORT_BATCH_SIZE, SHIFT_TEMPLATE_MAX_DAYS,
+                    VISIT_TYPE_CHOICES)
+from .models import Appointment, FeedChange, Schedule
+from .roles import PHYSICIANS
+from .shifts import expand_shifts, save_shifts
+
+
+CONTENT_TYPE = "text/calendar; charset=utf-8"
+FEED_SALT = "main.ical.feed"
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+VISIT_TYPES = dict(VISIT_TYPE_CHOICES)
+
+
+def read_events(stream):
+    """
+    Yield VEVENT components of an iCalendar text stream one at a time.
+
+    Components nested in events (e.g. alarms) are skipped.
+
+    Parameters
+    ----------
+    stream : file-like object
+        text stream.
+
+    Yields
+    ----------
+    dict
+        property values by upper case property name, lists of (parameters
+        dict, value) tuples.
+    """
+
+    event = None
+    nested = 0
+    for line in _unfold(stream):
+        name, params, value = _parse_line(line)
+        if name == "BEGIN":
+            if event is not None:
+                nested += 1
+            elif value.upper() == "VEVENT":
+                event = {}
+        elif name == "END" and event is not None:
+            if nested:
+                nested -= 1
+            else:
+                yield event
+                event = None
+        elif event is not None and not nested:
+            event.setdefault(name, []).append((params, value))
+
+
+def shift_from_event(event):
+    """
+    Shift template of a VEVENT, see main.shifts.expand_shifts.
+
+    The employee is the first attendee, matched by email. Weekly and daily
+    recurrence rules ending on a date (UNTIL) are supported.
+
+    Returns
+    ----------
+    dict
+        email, date_from, date_to, weekdays, start, end and cancelled keys.
+
+    Raises
+    ----------
+    ValidationError
+        with errors by property name.
+    """
+
+    errors = {}
+    start = end = None
+    try:
+        start = _get_datetime(event, "DTSTART")
+        end = _get_datetime(event, "DTEND")
+    except ValidationError as e:
+        errors.update(e.message_dict)
+    if start and end and (end.date() != start.date() or end <= start):
+        errors["DTEND"] = ["Shift must end after it starts on the same day!"]
+
+    email = _get_value(event, "ATTENDEE")
+    if email and email.lower().startswith("mailto:"):
+        email = email[len("mailto:"):]
+    if not email:
+        errors["ATTENDEE"] = ["Employee email is required."]
+
+    date_to = start.date() if start else None
+    weekdays = [start.weekday()] if start else []
+    rule = _get_value(event, "RRULE")
+    if "RDATE" in event or "EXDATE" in event:
+        errors["RRULE"] = ["RDATE and EXDATE aren't supported."]
+    elif rule and start:
+        try:
+            date_to, weekdays = _parse_rule(rule, start)
+        except ValidationError as e:
+            errors["RRULE"] = e.messages
+
+    if errors:
+        raise ValidationError(errors)
+    status = _get_value(event, "STATUS") or ""
+    return {
+        "email": email.strip().lower(),
+        "date_from": start.date(),
+        "date_to": date_to,
+        "weekdays": weekdays,
+        "start": start.time(),
+        "end": end.time(),
+        "cancelled": status.upper() == "CANCELLED",
+    }
+
+
+def import_shifts(events, batch_size=SHIFT_IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    Validate and upsert shifts of iCalendar events in batches.
+
+    Every batch is saved in its own transaction with one query for employees
+    and one bulk upsert (main.shifts.save_shifts), so queries don't grow
+    with the batch. Shifts of cancelled events are deleted.
+
+    Parameters
+    ----------
+    events : iterable
+        VEVENT dicts, see read_events.
+    batch_size : int
+        events saved at once.
+    dry_run : bool
+        validate without saving.
+
+    Yields
+    ----------
+    dict
+        batch report with events, shifts, cancelled and invalid counts and
+        errors as (event number, errors by property) tuples.
+    """
+
+    batch = []
+    for number, event in enumerate(events, start=1):
+        batch.append((number, event))
+        if len(batch) == batch_size:
+            yield _import_batch(batch, dry_run)
+            batch = []
+    if batch:
+        yield _import_batch(batch, dry_run)
+
+
+def _import_batch(batch, dry_run):
+    """
+    Validate a batch of events and save their shifts.
+    """
+
+    report = {"events": len(batch), "shifts": 0, "cancelled": 0,
+              "invalid": 0, "errors": []}
+    templates = []
+    for number, event in batch:
+        try:
+            templates.append((number, shift_from_event(event)))
+        except ValidationError as e:
+            _add_error(report, number, e.message_dict)
+
+    employees = {}
+    for pk, email in User.objects.annotate(lower_email=Lower("email")).filter(
+            lower_email__in={template["email"] for _, template in templates}
+    ).values_list("pk", "lower_email"):
+        employees.setdefault(email, []).append(pk)
+
+    shifts = {}
+    cancelled = set()
+    for number, template in templates:
+        employee_ids = employees.get(template["email"], [])
+        if len(employee_ids) != 1:
+            _add_error(report, number, {"ATTENDEE": [
+                "Several employees with this email." if employee_ids
+                else "Unknown employee."
+            ]})
+            continue
+        for shift in expand_shifts(
+                employee_ids, template["date_from"], template["date_to"],
+                template["weekdays"], template["start"], template["end"]):
+            key = (shift.employee_id, shift.date)
+            if template["cancelled"]:
+                shifts.pop(key, None)
+                cancelled.add(key)
+            else:
+                shifts[key] = shift
+                cancelled.discard(key)
+
+    report["shifts"] = len(shifts)
+    report["cancelled"] = len(cancelled)
+    if dry_run:
+        return report
+    with transaction.atomic():
+        save_shifts(list(shifts.values()))
+        if cancelled:
+            Schedule.objects.filter(reduce(operator.or_, (
+                Q(employee_id=employee_id, date=day)
+                for employee_id, day in cancelled
+            ))).delete()
+    return report
+
+
+def summarize_import(reports):
+    """
+    Sum up batch reports of import_shifts, keeping the first
+    PATIENT_IMPORT_MAX_ERRORS errors.
+    """
+
+    summary = {"events": 0, "shifts": 0, "cancelled": 0, "invalid": 0,
+               "errors": []}
+    for report in reports:
+        for key, value in report.items():
+            if key != "errors":
+                summary[key] += value
+        free = PATIENT_IMPORT_MAX_ERRORS - len(summary["errors"])
+        summary["errors"] += report["errors"][:free]
+    return summary
+
+
+def get_feed_token(doctor_id):
+    """
+    Token of a doctor appointment feed url, signed with the doctor feed
+    secret.
+    """
+
+    feed_change, created = FeedChange.objects.get_or_create(
+        doctor_id=doctor_id
+    )
+    return _get_feed_signer(feed_change.secret).sign(str(doctor_id))
+
+
+def reset_feed_token(doctor_id):
+    """
+    Give a doctor feed a new secret, revoking feed urls given out before.
+    """
+
+    FeedChange.objects.bulk_create(
+        [FeedChange(doctor_id=doctor_id, secret=secrets.token_urlsafe())],
+        update_conflicts=True,
+        unique_fields=("doctor",),
+        update_fields=("secret",)
+    )
+
+
+def get_feed_doctor_id(token):
+    """
+    Doctor ID of a feed token, None if the token is invalid or its doctor is
+    no longer an active physician.
+    """
+
+    doctor_id = _get_token_doctor_id(token)
+    secret = _get_feed_owners().filter(pk=doctor_id).values_list(
+        "feed_change__secret", flat=True).first()
+    return _check_feed_token(token, doctor_id, secret)
+
+
+def get_feed_appointments(doctor_id):
+    """
+    Appointments of a doctor feed, from ICAL_FEED_PAST_DAYS days ago on.
+    """
+
+    start = timezone.make_aware(datetime.combine(
+        timezone.localdate() - timedelta(days=ICAL_FEED_PAST_DAYS), time.min
+    ))
+    return Appointment.objects.filter(doctor_id=doctor_id, datetime__gte=start)
+
+
+def get_feed_state(token):
+    """
+    Doctor and version of a feed for conditional requests, with one query.
+
+    Returns
+    ----------
+    tuple
+        doctor ID, ETag and last modified datetime (None for a feed that
+        never had appointments), None if the token is invalid (see
+        get_feed_doctor_id). Removed appointments don't show in modified
+        times, so the last change is the later of the newest modified time
+        and the last removal (see touch_feed).
+    """
+
+    doctor_id = _get_token_doctor_id(token)
+    if doctor_id is None:
+        return None
+    appointments = get_feed_appointments(doctor_id).order_by().values(
+        "doctor_id")
+    state = _get_feed_owners().filter(pk=doctor_id).values(
+        count=Subquery(
+            appointments.annotate(count=Count("id")).values("count")),
+        modified=Subquery(
+            appointments.annotate(modified=Max("modified")).values(
+                "modified")),
+        changed=F("feed_change__changed"),
+        secret=F("feed_change__secret")
+    ).first() or {}
+    if _check_feed_token(token, doctor_id, state.get("secret")) is None:
+        return None
+    modified = state["modified"]
+    changed = state["changed"]
+    last_modified = max(filter(None, (modified, changed)), default=None)
+    etag = "-".join(str(part) for part in (
+        doctor_id,
+        state["count"] or 0,
+        modified.timestamp() if modified else 0,
+        changed.timestamp() if changed else 0
+    ))
+    return doctor_id, etag, last_modified
+
+
+def touch_feed(doctor_id):
+    """
+    Mark a doctor feed changed, e.g. when an appointment is removed from it.
+    """
+
+    FeedChange.objects.bulk_create(
+        [FeedChange(doctor_id=doctor_id, changed=timezone.now())],
+        update_conflicts=True,
+        unique_fields=("doctor",),
+        update_fields=("changed",)
+    )
+
+
+def render_feed(appointments, url=None):
+    """
+    Yield lines of an iCalendar of appointments.
+
+    Patient names are left out, calendar apps may store events outside the
+    clinic.
+
+    Parameters
+    ----------
+    appointments : QuerySet
+        appointments of a doctor.
+    url : callable
+        absolute url of an appointment ID, URL property left out if not
+        given.
+    """
+
+    yield from _fold_lines(
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Clinic management system//Appointments//EN",
+        "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:Appointments",
+    )
+    stamp = _format_datetime(timezone.now())
+    for pk, start, duration, visit_type, purpose, took_place, modified in (
+            appointments.order_by("datetime").values_list(
+                "id", "datetime", "duration", "visit_type", "purpose",
+                "took_place", "modified").iterator()):
+        status = "CANCELLED" if took_place is False else "CONFIRMED"
+        yield from _fold_lines(
+            "BEGIN:VEVENT",
+            f"UID:appointment-{pk}",
+            f"DTSTAMP:{stamp}",
+            f"LAST-MODIFIED:{_format_datetime(modified)}",
+            f"DTSTART:{_format_datetime(start)}",
+            f"DTEND:{_format_datetime(start + timedelta(minutes=duration))}",
+            f"SUMMARY:{_escape(VISIT_TYPES.get(visit_type, visit_type))}",
+            f"DESCRIPTION:{_escape(purpose)}",
+            f"STATUS:{status}",
+            *([f"URL:{url(pk)}"] if url else []),
+            "END:VEVENT",
+        )
+    yield from _fold_lines("END:VCALENDAR")
+
+
+def _get_feed_signer(secret):
+    """
+    Signer of feed tokens of a doctor feed secret.
+    """
+
+    return signing.Signer(salt=f"{FEED_SALT}.{secret}")
+
+
+def _get_feed_owners():
+    """
+    Active physicians, the only users with a feed.
+    """
+
+    return User.objects.filter(
+        is_active=True, groups__name__iexact=PHYSICIANS
+    )
+
+
+def _get_token_doctor_id(token):
+    """
+    Doctor ID a feed token claims before its signature is checked, None if
+    malformed.
+    """
+
+    try:
+        return int(token.partition(signing.Signer().sep)[0])
+    except ValueError:
+        return None
+
+
+def _check_feed_token(token, doctor_id, secret):
+    """
+    Doctor ID if a feed token is signed with the doctor feed secret, None
+    otherwise.
+    """
+
+    if doctor_id is None or secret is None:
+        return None
+    try:
+        _get_feed_signer(secret).unsign(token)
+    except signing.BadSignature:
+        return None
+    return doctor_id
+
+
+def _unfold(stream):
+    """
+    Yield logical lines of a stream, joining folded continuation lines.
+    """
+
+    line = None
+    for physical in stream:
+        physical = physical.rstrip("\r\n")
+        if line is not None and physical[:1] in (" ", "\t"):
+            line += physical[1:]
+            continue
+        if line:
+            yield line
+        line = physical
+    if line:
+        yield line
+
+
+def _parse_line(line):
+    """
+    Name, parameters and value of a content line.
+    """
+
+    quoted = False
+    for index, character in enumerate(line):
+        if character == '"':
+            quoted = not quoted
+        elif character == ":" and not quoted:
+            break
+    else:
+        return line.upper(), {}, ""
+    name, *params = line[:index].split(";")
+    parameters = {}
+    for param in params:
+        key, _, value = param.partition("=")
+        parameters[key.upper()] = value.strip('"')
+    return name.upper(), parameters, line[index + 1:]
+
+
+def _get_value(event, name):
+    """
+    Value of the first property of a name, None if there's none.
+    """
+
+    values = event.get(name)
+    return values[0][1] if values else None
+
+
+def _get_datetime(event, name):
+    """
+    Naive local datetime of a DATE-TIME property.
+
+    UTC and TZID times are converted to the current time zone, floating
+    times are taken as they are.
+    """
+
+    if name not in event:
+        raise ValidationError({name: ["This property is required."]})
+    params, value = event[name][0]
+    return _parse_datetime(name, value, params.get("TZID"))
+
+
+def _parse_datetime(name, value, tzid=None):
+    """
+    Naive local datetime of a DATE-TIME value, see _get_datetime.
+    """
+
+    try:
+        if len(value) == 8:
+            raise ValidationError(
+                {name: ["All day events aren't shifts, set start time."]})
+        parsed = datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    except ValueError:
+        raise ValidationError({name: ["Enter a valid date-time."]})
+    if value.endswith("Z"):
+        return timezone.make_naive(parsed.replace(tzinfo=ZoneInfo("UTC")))
+    if tzid:
+        try:
+            zone = ZoneInfo(tzid)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValidationError({name: [f"Unknown time zone {tzid}."]})
+        return timezone.make_naive(parsed.replace(tzinfo=zone))
+    return parsed
+
+
+def _parse_rule(rule, start):
+    """
+    Last date and weekdays of a daily or weekly RRULE with UNTIL.
+    """
+
+    parts = dict(
+        part.partition("=")[::2] for part in rule.upper().split(";") if part
+    )
+    frequency = parts.pop("FREQ", None)
+    until = parts.pop("UNTIL", None)
+    byday = parts.pop("BYDAY", None)
+    if parts.pop("INTERVAL", "1") != "1" or parts:
+        raise ValidationError(
+            "Only FREQ, UNTIL, BYDAY and INTERVAL=1 are supported.")
+    if frequency not in ("DAILY", "WEEKLY"):
+        raise ValidationError("Only daily and weekly shifts are supported.")
+    if until is None:
+        raise ValidationError("Recurring shifts need UNTIL.")
+
+    if len(until) == 8:
+        try:
+            date_to = datetime.strptime(until, "%Y%m%d").date()
+        except ValueError:
+            raise ValidationError("Enter a valid UNTIL date.")
+    else:
+        date_to = _parse_datetime("UNTIL", until).date()
+    if (date_to - start.date()).days >= SHIFT_TEMPLATE_MAX_DAYS:
+        raise ValidationError(
+            f"Shifts can repeat for {SHIFT_TEMPLATE_MAX_DAYS} days at most.")
+
+    if byday:
+        try:
+            weekdays = [WEEKDAYS[day] for day in byday.split(",")]
+        except KeyError:
+            raise ValidationError("Enter BYDAY as two letter weekdays.")
+    elif frequency == "DAILY":
+        weekdays = list(range(7))
+    else:
+        weekdays = [start.weekday()]
+    return date_to, weekdays
+
+
+def _add_error(report, number, errors):
+    """
+    Count an invalid event in a batch report.
+    """
+
+    report["invalid"] += 1
+    report["errors"].append((number, errors))
+
+
+def _format_datetime(value):
+    """
+    UTC DATE-TIME value of an aware datetime.
+    """
+
+    return value.astimezone(ZoneInfo("UTC")).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _escape(text):
+    """
+    Escape a TEXT value.
+    """
+
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold_lines(*lines):
+    """
+    Yield content lines folded at 75 octets, with CRLF line ends.
+    """
+
+    for line in lines:
+        encoded = line.encode()
+        parts = []
+        # continuation lines start with a space
+        while len(encoded) > (74 if parts else 75):
+            cut = 74 if parts else 75
+            # don't split multi-byte characters
+            while (encoded[cut] & 0xC0) == 0x80:
+                cut -= 1
+            parts.append(encoded[:cut].decode())
+            encoded = encoded[cut:]
+        parts.append(encoded.decode())
+        yield "\r\n ".join(parts) + "\r\n"
@@ -0,0 +1,91 @@
+from bisect import bisect_left, bisect_right
+
+
+class IntervalIndex:
+    """
+    Half-open [start, end) intervals sorted by start.
+
+    Ends are kept alongside a running maximum, so finding an overlap takes a
+    single binary search even if stored intervals overlap each other.
+    """
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self._starts = [start for start, _ in intervals]
+        self._ends = [end for _, end in intervals]
+        self._max_ends = []
+        self._update_max_ends(0)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def overlaps(self, start, end):
+        """
+        Check if any stored interval overlaps [start, end).
+        """
+
+        if start >= end:
+            return False
+        count = bisect_left(self._starts, end)
+        return count > 0 and self._max_ends[count - 1] > start
+
+    def add(self, start, end):
+        """
+        Store an interval.
+
+        Takes linear time, pass known intervals to the constructor instead
+        and add only the few found along the way (e.g. booked in a series).
+        """
+
+        position = bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._ends.insert(position, end)
+        del self._max_ends[position:]
+        self._update_max_ends(position)
+
+    def _update_max_ends(self, position):
+        """
+        Recompute running maximum of ends from given position on.
+        """
+
+        current = self._max_ends[position - 1] if position else None
+        for end in self._ends[position:]:
+            current = end if current is None else max(current, end)
+            self._max_ends.append(current)
+
+
+def subtract_intervals(intervals, removed):
+    """
+    Remove parts of half-open [start, end) intervals.
+
+    Parameters
+    ----------
+    intervals : iterable
+        (start, end) tuples.
+    removed : iterable
+        (start, end) tuples to cut out of intervals.
+
+    Returns
+    ----------
+    list
+        sorted (start, end) tuples of what is left, empty intervals dropped.
+    """
+
+    removed = sorted(
+        (start, end) for start, end in removed if start < end
+    )
+    result = []
+    for start, end in sorted(intervals):
+        for removed_start, removed_end in removed:
+            if removed_end <= start:
+                continue
+            if removed_start >= end:
+                break
+            if removed_start > start:
+                result.append((start, removed_start))
+            start = max(start, removed_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
@@ -0,0 +1,117 @@
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+
+from django import forms
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from main.forms import AppointmentModelForm
+from main.models import Appointment
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    """
+    Compare size, query count and render time of the appointment form with
+    choice lists and with read-only doctor and patient.
+
+    Benchmark data is created inside a transaction that is rolled back.
+    """
+
+    help = "Benchmark appointment form rendering with many patients."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=10000)
+        parser.add_argument("--doctors", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            appointment_id = self._seed(
+                options["patients"], options["doctors"]
+            )
+            for name, form_class in (("choices", _ChoicesAppointmentForm),
+                                     ("read-only", AppointmentModelForm)):
+                queries, seconds, size = _measure(
+                    form_class, appointment_id, options["repeat"]
+                )
+                self.stdout.write(
+                    f"{name:>9}: {queries} queries, "
+                    f"{seconds * 1000:.1f} ms, {size / 1024:.1f} KiB"
+                )
+            transaction.set_rollback(True)
+
+    def _seed(self, patients, doctors):
+        """
+        Create patients, physicians and one appointment to display.
+        """
+
+        physicians = Group.objects.get_or_create(name="physicians")[0]
+        User.objects.bulk_create(
+            User(username=f"benchmark_doctor_{i}") for i in range(doctors)
+        )
+        employees = User.objects.filter(
+            username__startswith="benchmark_doctor_")
+        physicians.user_set.add(*employees)
+        Patient.objects.bulk_create(
+            Patient(
+                first_name="Benchmark",
+                last_name=str(i),
+                date_of_birth=date(1970, 1, 1),
+                personal_id=f"B{i:010d}",
+                email="benchmark@example.com",
+                phone="0"
+            ) for i in range(patients)
+        )
+        appointment = Appointment.objects.bulk_create([Appointment(
+            datetime=timezone.make_aware(
+                datetime.combine(date.today() + timedelta(days=1), time(8))),
+            patient=Patient.objects.filter(
+                personal_id__startswith="B").first(),
+            doctor=employees.first(),
+            purpose="Benchmark",
+            duration=30
+        )])[0]
+        return appointment.id
+
+
+class _ChoicesAppointmentForm(forms.ModelForm):
+    """
+    Appointment form rendering doctor and patient as disabled choice lists,
+    as done before read-only relation fields.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["doctor"].disabled = True
+        self.fields["patient"].disabled = True
+        self.fields["visit_type"].disabled = True
+        self.fields["duration"].disabled = True
+        self.fields["prescription"].required = False
+
+    class Meta:
+        model = Appointment
+        fields = "__all__"
+
+
+def _measure(form_class, appointment_id, repeat):
+    """
+    Return query count of a single fetch and render, its mean latency in
+    seconds and rendered HTML size in bytes.
+    """
+
+    def render():
+        appointment = Appointment.objects.select_related(
+            "doctor", "patient").get(id=appointment_id)
+        return str(form_class(instance=appointment))
+
+    with CaptureQueriesContext(connection) as queries:
+        html = render()
+    started = perf_counter()
+    for _ in range(repeat):
+        render()
+    seconds = (perf_counter() - started) / repeat
+    return len(queries), seconds, len(html.encode())
@@ -0,0 +1,158 @@
+from datetime import date, datetime, time, timedelta
+from threading import Barrier, Lock, Thread
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.utils import timezone
+
+from main.booking import SlotTaken, book_appointment
+from main.models import Appointment, Schedule
+from main.utils import get_appointment_times
+from patients.models import Patient
+
+DOCTOR_PREFIX = "benchmark_booking_doctor_"
+PATIENT_PREFIX = "BB"
+
+
+class Command(BaseCommand):
+    """
+    Book the same doctor slots from many threads at once and measure
+    successful bookings per second and conflict rate.
+
+    Threads need committed data, so the benchmark only runs with DEVELOPMENT
+    set or with --scratch for a database that may be written to, and deletes
+    benchmark schedules and appointments when it ends. Inactive benchmark
+    doctors and patients are kept and reused by the next run.
+    """
+
+    help = "Benchmark concurrent booking of contended appointment slots."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--doctors", type=int, default=2)
+        parser.add_argument("--hours", type=int, default=8)
+        parser.add_argument(
+            "--scratch",
+            action="store_true",
+            help="The configured database is a scratch copy, allow "
+                 "committing benchmark data without DEVELOPMENT=True."
+        )
+
+    def handle(self, *args, **options):
+        if not (settings.DEVELOPMENT or options["scratch"]):
+            raise CommandError(
+                "The benchmark commits data, run it with DEVELOPMENT=True "
+                "or --scratch against a scratch database."
+            )
+        group = Group.objects.get_or_create(name="physicians")[0]
+        try:
+            doctors, patients = self._seed(
+                group, options["doctors"], options["hours"], options["threads"]
+            )
+            slots = [
+                (schedule.employee, timezone.make_aware(
+                    datetime.combine(schedule.date, hour)))
+                for schedule in Schedule.objects.filter(
+                    employee__in=doctors).select_related("employee")
+                for hour in get_appointment_times(schedule)
+            ]
+            results = _run(slots, patients)
+        finally:
+            doctors = User.objects.filter(username__startswith=DOCTOR_PREFIX)
+            Appointment.objects.filter(doctor__in=doctors).delete()
+            Schedule.objects.filter(employee__in=doctors).delete()
+
+        attempts = sum(results[key] for key in ("booked", "taken", "errors"))
+        self.stdout.write(
+            f"{connection.vendor}, {options['threads']} threads, "
+            f"{len(slots)} slots, {attempts} attempts"
+        )
+        self.stdout.write(
+            f"{results['booked']} booked, {results['taken']} taken, "
+            f"{results['errors']} database errors"
+        )
+        self.stdout.write(
+            f"{results['booked'] / results['seconds']:.1f} bookings/s, "
+            f"conflict rate {results['taken'] / max(attempts, 1):.1%}"
+        )
+
+    def _seed(self, group, doctors, hours, threads):
+        """
+        Create doctors on one day shift and a patient per thread and doctor,
+        so patients never overlap with themselves.
+        """
+
+        work_date = date.today() + timedelta(days=1)
+        start = time(8)
+        end = (datetime.combine(work_date, start)
+               + timedelta(hours=hours)).time()
+
+        doctors = [
+            User.objects.get_or_create(
+                username=f"{DOCTOR_PREFIX}{i}",
+                defaults={"is_active": False}
+            )[0] for i in range(doctors)
+        ]
+        group.user_set.add(*doctors)
+        for doctor in doctors:
+            Schedule.objects.create(
+                date=work_date, start=start, end=end, employee=doctor
+            )
+        patients = [
+            Patient.objects.get_or_create(
+                personal_id=f"{PATIENT_PREFIX}{i:09d}",
+                defaults={
+                    "first_name": "Benchmark",
+                    "last_name": str(i),
+                    "date_of_birth": date(1970, 1, 1),
+                    "email": "benchmark@example.com",
+                    "phone": "0"
+                }
+            )[0] for i in range(threads * len(doctors))
+        ]
+        return doctors, [
+            dict(zip(doctors, patients[i::threads])) for i in range(threads)
+        ]
+
+
+def _run(slots, patients):
+    """
+    Let a thread per patients dict try to book every slot in the same order.
+    """
+
+    results = {"booked": 0, "taken": 0, "errors": 0}
+    results_lock = Lock()
+    barrier = Barrier(len(patients))
+
+    def book(patients_by_doctor):
+        barrier.wait()
+        for doctor, slot_datetime in slots:
+            try:
+                book_appointment(Appointment(
+                    datetime=slot_datetime,
+                    patient=patients_by_doctor[doctor],
+                    doctor=doctor,
+                    purpose="Benchmark"
+                ))
+                outcome = "booked"
+            except SlotTaken:
+                outcome = "taken"
+            except OperationalError:
+                outcome = "errors"
+            with results_lock:
+                results[outcome] += 1
+        connections.close_all()
+
+    threads = [Thread(target=book, args=(thread_patients,))
+               for thread_patients in patients]
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results["seconds"] = perf_counter() - started
+    return results
@@ -0,0 +1,96 @@
+from datetime import date
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from patients.models import Patient
+from patients.search import search_patients
+
+
+QUERIES = ("smith", "anna kowal", "8501", "zz")
+FIRST_NAMES = ("Anna", "John", "Maria", "Piotr", "Olga", "Adam", "Ewa")
+LAST_NAMES = ("Smith", "Kowalska", "Nowak", "Lee", "Johnson", "Wright")
+
+
+class Command(BaseCommand):
+    """
+    Compare latency of icontains patient search with indexed search at
+    growing table sizes.
+
+    Benchmark data is created inside a transaction that is rolled back.
+    """
+
+    help = "Benchmark patient search for a number of table sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--patients", type=int, nargs="+", default=[10000, 100000]
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = 0
+            for size in sorted(options["patients"]):
+                _seed(created, size)
+                created = size
+                for name, engine in (("icontains", _icontains_search),
+                                     ("indexed", _indexed_search)):
+                    seconds = _measure(engine, options["repeat"])
+                    self.stdout.write(
+                        f"{size:>9} patients {name:>9}: "
+                        f"{seconds * 1000:.2f} ms per search"
+                    )
+            transaction.set_rollback(True)
+
+
+def _seed(start, end, batch_size=5000):
+    """
+    Create patients numbered from start to end.
+    """
+
+    for batch_start in range(start, end, batch_size):
+        Patient.objects.bulk_create(
+            Patient(
+                first_name=f"{FIRST_NAMES[i % len(FIRST_NAMES)]}{i}",
+                last_name=LAST_NAMES[i % len(LAST_NAMES)],
+                date_of_birth=date(1970, 1, 1),
+                personal_id=f"{i * 7919 % 10 ** 11:011d}",
+                email="benchmark@example.com",
+                phone="0"
+            ) for i in range(batch_start, min(batch_start + batch_size, end))
+        )
+
+
+def _icontains_search(query):
+    """
+    Search as done before the search index, first page of results.
+    """
+
+    return list(Patient.objects.filter(
+        Q(first_name__icontains=query)
+        | Q(last_name__icontains=query)
+        | Q(personal_id__icontains=query)
+    )[:20])
+
+
+def _indexed_search(query):
+    """
+    First page of indexed search results.
+    """
+
+    return search_patients(query)[:20]
+
+
+def _measure(engine, repeat):
+    """
+    Mean latency of a search in seconds.
+    """
+
+    started = perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            engine(query)
+    return (perf_counter() - started) / (repeat * len(QUERIES))
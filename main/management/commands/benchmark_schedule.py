@@ -0,0 +1,176 @@
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from main.cache import (get_cache_stats, invalidate_free_slots,
+                        reset_cache_stats)
+from main.const import APPOINTMENT_TIME
+from main.models import Appointment, Schedule
+from main.bitmaps import iter_slot_times
+from main.utils import (compute_free_bitmaps, get_appointment_times,
+                        get_day_schedule, get_free_bitmaps,
+                        rebuild_free_slots)
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    """
+    Compare per-slot, set-based, materialized and cached free slot schedule
+    search query count and latency.
+
+    Benchmark data is created inside a transaction that is rolled back.
+    """
+
+    help = "Benchmark schedule search for a single specialty and day."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=40)
+        parser.add_argument("--hours", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            specialty = self._seed(options["doctors"], options["hours"])
+            schedules = Schedule.objects.filter(
+                employee__groups=specialty
+            ).select_related("employee")
+
+            reset_cache_stats()
+            for name, engine in (("per-slot", _legacy_day_schedule),
+                                 ("set-based", _computed_day_schedule),
+                                 ("free-slots", _free_slots_day_schedule),
+                                 ("cached", get_day_schedule)):
+                cold, warm, seconds, slots = _measure(
+                    engine, schedules, options["repeat"]
+                )
+                self.stdout.write(
+                    f"{name:>11}: {cold} queries cold, {warm} warm, "
+                    f"{seconds * 1000:.1f} ms, {slots} free slots"
+                )
+            stats = get_cache_stats()
+            self.stdout.write(
+                f"cache: {stats['hits']} hits, {stats['misses']} misses"
+            )
+
+            for schedule in schedules:
+                invalidate_free_slots(schedule.employee_id, schedule.date)
+            transaction.set_rollback(True)
+
+    def _seed(self, doctors, hours):
+        """
+        Create doctors on one day shift with every third slot booked.
+        """
+
+        specialty = Group.objects.create(name="benchmark specialists")
+        work_date = date.today() + timedelta(days=1)
+        start = time(8)
+        end = (datetime.combine(work_date, start)
+               + timedelta(hours=hours)).time()
+
+        User.objects.bulk_create(
+            User(username=f"benchmark_doctor_{i}") for i in range(doctors)
+        )
+        employees = User.objects.filter(username__startswith="benchmark_doctor_")
+        specialty.user_set.add(*employees)
+        schedules = Schedule.objects.bulk_create(
+            Schedule(date=work_date, start=start, end=end, employee=employee)
+            for employee in employees
+        )
+        patients = Patient.objects.bulk_create(
+            Patient(
+                first_name="Benchmark",
+                last_name=str(i),
+                date_of_birth=date(1970, 1, 1),
+                personal_id=f"B{i:010d}",
+                email="benchmark@example.com",
+                phone="0"
+            ) for i in range(doctors)
+        )
+
+        appointments = []
+        for schedule, patient in zip(schedules, patients):
+            for i, hour in enumerate(get_appointment_times(schedule)):
+                if i % 3 == 0:
+                    appointments.append(Appointment(
+                        datetime=timezone.make_aware(
+                            datetime.combine(work_date, hour)),
+                        patient=patient,
+                        doctor=schedule.employee,
+                        purpose="Benchmark",
+                        duration=APPOINTMENT_TIME
+                    ))
+        Appointment.objects.bulk_create(appointments)
+        rebuild_free_slots(Schedule.objects.filter(employee__in=employees))
+        return specialty
+
+
+def _legacy_day_schedule(schedules):
+    """
+    Check every slot with a separate query, as done before set-based search.
+    """
+
+    return [
+        hour
+        for schedule in schedules
+        for hour in get_appointment_times(schedule)
+        if _is_slot_free(schedule.employee, schedule.date, hour)
+    ]
+
+
+def _is_slot_free(doctor, day, hour):
+    """
+    Check a single slot has no appointment with a query, as done before
+    set-based search.
+    """
+
+    appointment_datetime = timezone.make_aware(datetime.combine(day, hour))
+    if appointment_datetime < timezone.now():
+        return False
+    return not Appointment.objects.filter(
+        doctor=doctor, datetime=appointment_datetime
+    ).exists()
+
+
+def _computed_day_schedule(schedules):
+    """
+    Subtract booked appointments fetched at once from working hours.
+    """
+
+    return [
+        hour
+        for bitmap in compute_free_bitmaps(schedules).values()
+        for hour in iter_slot_times(bitmap)
+    ]
+
+
+def _free_slots_day_schedule(schedules):
+    """
+    Read free slots from the FreeSlot table bypassing the cache.
+    """
+
+    return [
+        hour
+        for bitmap in get_free_bitmaps(schedules).values()
+        for hour in iter_slot_times(bitmap)
+    ]
+
+
+def _measure(engine, schedules, repeat):
+    """
+    Return query count of the first and the last run, mean latency of
+    repeated runs in seconds and result size.
+    """
+
+    with CaptureQueriesContext(connection) as cold:
+        result = engine(schedules.all())
+    started = perf_counter()
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as warm:
+            engine(schedules.all())
+    seconds = (perf_counter() - started) / repeat
+    return len(cold), len(warm), seconds, len(result)
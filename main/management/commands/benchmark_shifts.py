@@ -0,0 +1,109 @@
+import threading
+from datetime import date, time, timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from main.cache import invalidate_free_slots
+from main.models import FreeSlot, Schedule
+from main.shifts import (REBUILD_THREAD_NAME, expand_shifts, preview_shifts,
+                         save_shifts)
+
+EMPLOYEE_PREFIX = "benchmark_employee_"
+
+
+class Command(BaseCommand):
+    """
+    Compare saving a recurring shift one schedule at a time with expanding
+    and upserting it in bulk.
+
+    Shifts saved one by one are rolled back. Bulk shifts are committed, as
+    their free slots are rebuilt in a thread after commit, so the benchmark
+    only runs with DEVELOPMENT set and deletes them at the end. Inactive
+    benchmark employees are kept and reused by the next run.
+    """
+
+    help = "Benchmark generating a quarter of weekday shifts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--employees", type=int, default=200)
+        parser.add_argument("--days", type=int, default=92)
+        parser.add_argument(
+            "--legacy-employees",
+            type=int,
+            default=5,
+            help="Employees saved one schedule at a time, for comparison."
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEVELOPMENT:
+            raise CommandError(
+                "The benchmark commits data, run it with DEVELOPMENT=True."
+            )
+        User.objects.bulk_create(
+            (User(username=f"{EMPLOYEE_PREFIX}{i}", is_active=False)
+             for i in range(options["employees"])),
+            ignore_conflicts=True
+        )
+        employee_ids = list(User.objects.filter(
+            username__startswith=EMPLOYEE_PREFIX
+        ).order_by("pk").values_list("pk", flat=True))
+        try:
+            self._benchmark(employee_ids[:options["employees"]], options)
+        finally:
+            schedules = Schedule.objects.filter(employee__in=employee_ids)
+            for schedule in schedules.only("employee_id", "date"):
+                invalidate_free_slots(schedule.employee_id, schedule.date)
+            schedules.delete()
+
+    def _benchmark(self, employee_ids, options):
+        """
+        Time saving shifts one by one, then in bulk until the response and
+        until free slots are rebuilt.
+        """
+
+        date_from = date.today() + timedelta(days=1)
+        date_to = date_from + timedelta(days=options["days"] - 1)
+
+        with transaction.atomic():
+            legacy = expand_shifts(
+                employee_ids[:options["legacy_employees"]], date_from,
+                date_to, range(5), time(8), time(16)
+            )
+            started = perf_counter()
+            for schedule in legacy:
+                schedule.save()
+            seconds = perf_counter() - started
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f"   per-row: {len(legacy)} shifts in {seconds:.2f} s, "
+            f"{len(legacy) / seconds:.0f} shifts/s"
+        )
+
+        started = perf_counter()
+        shifts = expand_shifts(
+            employee_ids, date_from, date_to, range(5), time(8), time(16)
+        )
+        expanded = perf_counter() - started
+        started = perf_counter()
+        preview = preview_shifts(shifts)
+        previewed = perf_counter() - started
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            save_shifts(shifts)
+            committed = perf_counter() - started
+        for thread in threading.enumerate():
+            if thread.name == REBUILD_THREAD_NAME:
+                thread.join()
+        rebuilt = perf_counter() - started
+        self.stdout.write(
+            f"      bulk: {len(shifts)} shifts ({preview['unchanged']} "
+            f"already saved) expanded in {expanded:.2f} s, previewed in "
+            f"{previewed:.2f} s, committed in {committed:.2f} s "
+            f"({len(queries)} queries), {FreeSlot.objects.count()} free "
+            f"slots rebuilt in the background {rebuilt:.2f} s after saving"
+        )
@@ -0,0 +1,100 @@
+import random
+import tracemalloc
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from patients.typeahead import PrefixIndex
+
+
+FIRST_NAMES = ("Anna", "John", "Maria", "Piotr", "Olga", "Adam", "Ewa")
+LAST_NAMES = ("Smith", "Kowalska", "Nowak", "Lee", "Johnson", "Wright")
+
+
+class Command(BaseCommand):
+    """
+    Measure build time, memory and lookup latency of the patient typeahead
+    prefix index.
+
+    The index is filled with generated patients, the database isn't used.
+    """
+
+    help = "Benchmark patient typeahead prefix index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=1000000)
+        parser.add_argument("--lookups", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        size = options["patients"]
+        tracemalloc.start()
+        started = perf_counter()
+        index = PrefixIndex(size)
+        index.build(_generate(size))
+        build_seconds = perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(
+            f"{size} patients indexed in {build_seconds:.1f} s, "
+            f"{memory / 2 ** 20:.0f} MiB"
+        )
+
+        queries = _get_queries(size, options["lookups"])
+        latencies = []
+        for query in queries:
+            started = perf_counter()
+            index.lookup(query)
+            latencies.append(perf_counter() - started)
+        latencies.sort()
+        self.stdout.write(
+            f"lookup: p50 {_percentile(latencies, 50) * 1000:.3f} ms, "
+            f"p99 {_percentile(latencies, 99) * 1000:.3f} ms, "
+            f"max {latencies[-1] * 1000:.3f} ms"
+        )
+
+        started = perf_counter()
+        index.add(size + 1, "Benchmark", "Patient", "99999999999")
+        index.remove(size + 1)
+        self.stdout.write(
+            f"add and remove: {(perf_counter() - started) * 1000:.3f} ms"
+        )
+
+
+def _generate(size):
+    """
+    Yield (id, first_name, last_name, personal_id) tuples.
+    """
+
+    for i in range(size):
+        yield (
+            i,
+            f"{FIRST_NAMES[i % len(FIRST_NAMES)]}{i}",
+            LAST_NAMES[i % len(LAST_NAMES)],
+            f"{i * 7919 % 10 ** 11:011d}"
+        )
+
+
+def _get_queries(size, count):
+    """
+    Prefixes typed while searching generated patients.
+    """
+
+    rng = random.Random(0)
+    queries = []
+    for _ in range(count):
+        i = rng.randrange(size)
+        name = rng.choice((
+            f"{FIRST_NAMES[i % len(FIRST_NAMES)]}{i}",
+            LAST_NAMES[i % len(LAST_NAMES)],
+            f"{i * 7919 % 10 ** 11:011d}",
+        ))
+        queries.append(name[:rng.randint(1, len(name))])
+    return queries
+
+
+def _percentile(values, percent):
+    """
+    Percentile of sorted values.
+    """
+
+    return values[min(len(values) - 1, len(values) * percent // 100)]
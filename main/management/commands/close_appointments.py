@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.const import NO_SHOW_BATCH_SIZE, NO_SHOW_GRACE_HOURS
+from main.worklist import close_unattended_appointments, get_unattended_report
+
+
+class Command(BaseCommand):
+    """
+    Mark past appointments nobody closed as no-shows.
+    """
+
+    help = (
+        "Set took_place=False on appointments older than the grace period "
+        "which haven't been closed. Safe to interrupt and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=int,
+            default=NO_SHOW_GRACE_HOURS,
+            help="Hours after appointment start it can still be closed."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=NO_SHOW_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--after-id",
+            type=int,
+            default=0,
+            help="Resume after this appointment ID."
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report appointments that would be closed."
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(hours=options["grace_hours"])
+
+        if options["dry_run"]:
+            report = get_unattended_report(before)
+            self.stdout.write(
+                f"{report['count']} unattended appointments before "
+                f"{before:%Y-%m-%d %H:%M}."
+            )
+            if report["count"]:
+                self.stdout.write(
+                    f"Oldest {report['first']:%Y-%m-%d %H:%M}, "
+                    f"newest {report['last']:%Y-%m-%d %H:%M}."
+                )
+            return
+
+        total = 0
+        for closed, last_id in close_unattended_appointments(
+                before, options["batch_size"], options["after_id"]):
+            total += closed
+            self.stdout.write(f"Closed {total} appointments, last ID {last_id}.")
+        self.stdout.write(f"Marked {total} appointments as no-shows.")
@@ -0,0 +1,51 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from main.query_plans import get_hot_querysets, get_sequential_scans
+
+
+class Command(BaseCommand):
+    """
+    Print EXPLAIN output of hot appointment and schedule querysets.
+    """
+
+    help = "Show query plans of hot querysets and flag sequential scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctor", type=int, default=1)
+        parser.add_argument("--patient", type=int, default=1)
+        parser.add_argument("--specialty", type=int, default=1)
+        parser.add_argument(
+            "--date", type=date.fromisoformat, default=date.today()
+        )
+        parser.add_argument(
+            "--fail-on-seq-scan",
+            action="store_true",
+            help="Exit with an error if any plan has a sequential scan."
+        )
+
+    def handle(self, *args, **options):
+        querysets = get_hot_querysets(
+            options["doctor"],
+            options["patient"],
+            options["specialty"],
+            options["date"]
+        )
+        regressed = []
+        for name, queryset in querysets.items():
+            plan = queryset.explain()
+            scans = get_sequential_scans(plan)
+            self.stdout.write(f"== {name} ({connection.vendor})")
+            self.stdout.write(plan)
+            if scans:
+                regressed.append(name)
+                self.stdout.write(
+                    f"sequential scan on: {', '.join(scans)}"
+                )
+
+        if regressed and options["fail_on_seq_scan"]:
+            raise CommandError(
+                f"Sequential scans in: {', '.join(regressed)}"
+            )
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main.export import parse_since
+from main.fhir import FORMATS, RESOURCE_TYPES, get_endpoint, serialize
+
+
+class Command(BaseCommand):
+    """
+    Stream patients and appointments as FHIR R4 resources.
+    """
+
+    help = (
+        "Export patients and appointments as a FHIR Bundle or NDJSON to a "
+        "file or standard output, or push them to a FHIR server as a batch "
+        "Bundle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "resource_types",
+            nargs="*",
+            help=f"{' and/or '.join(RESOURCE_TYPES)}, all if not given."
+        )
+        parser.add_argument("--format", choices=FORMATS, default="bundle")
+        parser.add_argument(
+            "--since",
+            help="Only records changed since ISO date or datetime."
+        )
+        parser.add_argument(
+            "--output", help="File path, standard output if not given."
+        )
+        parser.add_argument(
+            "--endpoint",
+            help="FHIR server base url or a directory standing in for one."
+        )
+        parser.add_argument("--chunk-size", type=int)
+
+    def handle(self, *args, **options):
+        resource_types = options["resource_types"] or RESOURCE_TYPES
+        unknown = set(resource_types) - set(RESOURCE_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown resource types: {', '.join(unknown)}")
+        since = None
+        if options["since"]:
+            since = parse_since(options["since"])
+            if since is None:
+                raise CommandError("Invalid --since date.")
+        kwargs = {}
+        if options["chunk_size"]:
+            kwargs["chunk_size"] = options["chunk_size"]
+
+        started = timezone.now()
+        if options["endpoint"]:
+            get_endpoint(options["endpoint"]).push(serialize(
+                resource_types, "bundle", since, bundle_type="batch", **kwargs
+            ))
+        else:
+            chunks = serialize(resource_types, options["format"], since,
+                               **kwargs)
+            if options["output"]:
+                with open(options["output"], "w", encoding="utf-8") as output:
+                    output.writelines(chunks)
+            else:
+                for chunk in chunks:
+                    self.stdout.write(chunk, ending="")
+        # stderr keeps the export itself clean on standard output
+        self.stderr.write(
+            f"Next incremental export: --since {started.isoformat()}"
+        )
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main.export import parse_since
+from main.fhir import (FORMATS, RESOURCE_TYPES, get_endpoint, import_resources,
+                       pull_resources, read_resources, summarize_import)
+
+
+class Command(BaseCommand):
+    """
+    Save patients and appointments of FHIR R4 resources.
+    """
+
+    help = (
+        "Insert or update patients and appointments from a FHIR Bundle or "
+        "NDJSON file, or pull them from a FHIR server, in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source",
+            help="File path, - for standard input, or with --endpoint a FHIR "
+                 "server base url or a directory standing in for one."
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format, ndjson for .ndjson files, bundle otherwise."
+        )
+        parser.add_argument(
+            "--endpoint",
+            action="store_true",
+            help="Pull patients and appointments from a FHIR server."
+        )
+        parser.add_argument(
+            "--since",
+            help="Only pull records changed since ISO date or datetime."
+        )
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        format = options["format"] or (
+            "ndjson" if source.lower().endswith(".ndjson") else "bundle"
+        )
+        since = None
+        if options["since"]:
+            since = parse_since(options["since"])
+            if since is None:
+                raise CommandError("Invalid --since date.")
+        kwargs = {}
+        if options["batch_size"]:
+            kwargs["batch_size"] = options["batch_size"]
+
+        started = time.perf_counter()
+        pulled = timezone.now()
+        try:
+            if options["endpoint"]:
+                summary = self._import(pull_resources(
+                    get_endpoint(source), RESOURCE_TYPES, since), kwargs)
+            elif source == "-":
+                summary = self._import(
+                    read_resources(sys.stdin, format), kwargs)
+            else:
+                if not os.path.exists(source):
+                    raise CommandError(f"{source} doesn't exist.")
+                with open(source, encoding="utf-8") as stream:
+                    summary = self._import(
+                        read_resources(stream, format), kwargs)
+        except ValueError as e:
+            raise CommandError(f"Invalid bundle: {e}")
+
+        for number, errors in summary["errors"]:
+            self.stdout.write(f"resource {number}: {errors}")
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f"Imported {summary['resources']} resources in {seconds:.3f} s: "
+            f"{summary['created']} new, {summary['updated']} updated, "
+            f"{summary['unchanged']} unchanged, {summary['duplicates']} "
+            f"duplicates, {summary['invalid']} invalid."
+        )
+        if options["endpoint"]:
+            self.stdout.write(
+                f"Next incremental pull: --since {pulled.isoformat()}"
+            )
+
+    def _import(self, resources, kwargs):
+        """
+        Import resources printing progress after every batch.
+        """
+
+        def reports():
+            count = 0
+            for report in import_resources(resources, **kwargs):
+                count += report["resources"]
+                self.stdout.write(f"{count} resources", ending="\r")
+                yield report
+
+        summary = summarize_import(reports())
+        self.stdout.write("")
+        return summary
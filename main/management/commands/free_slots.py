@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Schedule
+from main.utils import (compute_free_bitmaps, get_free_bitmaps,
+                        rebuild_free_slots)
+
+
+class Command(BaseCommand):
+    """
+    Rebuild or check the FreeSlot table against Schedule and Appointment rows.
+    """
+
+    help = "Rebuild or check free slots materialized from schedules."
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=("rebuild", "check"))
+        parser.add_argument(
+            "--from-date",
+            help="Only schedules from this date on (YYYY-MM-DD)."
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        schedules = Schedule.objects.order_by("pk")
+        if options["from_date"]:
+            schedules = schedules.filter(date__gte=options["from_date"])
+
+        processed = missing = stale = 0
+        for batch in _batches(schedules, options["batch_size"]):
+            if options["action"] == "rebuild":
+                rebuild_free_slots(batch)
+            else:
+                batch_missing, batch_stale = _compare(batch)
+                missing += batch_missing
+                stale += batch_stale
+            processed += len(batch)
+
+        if options["action"] == "rebuild":
+            self.stdout.write(f"Rebuilt free slots of {processed} schedules.")
+            return
+
+        self.stdout.write(
+            f"Checked {processed} schedules: {missing} missing, "
+            f"{stale} stale free slots."
+        )
+        if missing or stale:
+            raise CommandError(
+                "Free slots out of sync. Run 'manage.py free_slots rebuild'."
+            )
+
+
+def _batches(schedules, batch_size):
+    """
+    Yield lists of schedules, paginating by primary key.
+    """
+
+    last_pk = 0
+    while True:
+        batch = list(schedules.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def _compare(schedules):
+    """
+    Count free slots missing from and stale in the FreeSlot table.
+    """
+
+    on_duty = [schedule for schedule in schedules if schedule.employee_id]
+    expected = compute_free_bitmaps(on_duty)
+    actual = get_free_bitmaps(on_duty, include_past=True)
+    missing = stale = 0
+    for key, expected_bitmap in expected.items():
+        actual_bitmap = actual.get(key, 0)
+        missing += bin(expected_bitmap & ~actual_bitmap).count("1")
+        stale += bin(actual_bitmap & ~expected_bitmap).count("1")
+    return missing, stale
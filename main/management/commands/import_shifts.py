@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.ical import import_shifts, read_events, summarize_import
+
+
+class Command(BaseCommand):
+    """
+    Save shifts of iCalendar events.
+    """
+
+    help = (
+        "Insert or update shifts from an iCalendar (.ics) file in batches. "
+        "Each event is a shift of the employee with the attendee email."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="iCalendar file path, - for standard input."
+        )
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate events without saving shifts."
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        kwargs = {"dry_run": options["dry_run"]}
+        if options["batch_size"]:
+            kwargs["batch_size"] = options["batch_size"]
+
+        started = time.perf_counter()
+        if path == "-":
+            summary = summarize_import(
+                import_shifts(read_events(sys.stdin), **kwargs))
+        else:
+            if not os.path.exists(path):
+                raise CommandError(f"{path} doesn't exist.")
+            with open(path, encoding="utf-8") as stream:
+                summary = summarize_import(
+                    import_shifts(read_events(stream), **kwargs))
+
+        for number, errors in summary["errors"]:
+            self.stdout.write(f"event {number}: {errors}")
+        seconds = time.perf_counter() - started
+        action = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            f"{action} {summary['events']} events in {seconds:.3f} s: "
+            f"{summary['shifts']} shifts, {summary['cancelled']} cancelled, "
+            f"{summary['invalid']} invalid."
+        )
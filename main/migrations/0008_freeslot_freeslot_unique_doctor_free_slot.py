@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 20:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0007_alter_appointment_took_place'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreeSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime', models.DateTimeField()),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='free_slots', to='main.schedule')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='freeslot',
+            constraint=models.UniqueConstraint(fields=('doctor', 'datetime'), name='unique_doctor_free_slot'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_freeslot_freeslot_unique_doctor_free_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='visit_type',
+            field=models.CharField(choices=[('consultation', 'Consultation'), ('follow_up', 'Follow-up'), ('examination', 'Examination'), ('procedure', 'Procedure')], default='consultation', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='duration',
+            field=models.PositiveSmallIntegerField(blank=True, default=30, help_text='Minutes. Visit type duration by default.'),
+            preserve_default=False,
+        ),
+    ]
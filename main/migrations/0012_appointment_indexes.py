@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_slothold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('took_place__isnull', True)), fields=['doctor', 'datetime'], name='appointment_doctor_pending'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'datetime'], name='appointment_patient_datetime'),
+        ),
+    ]
@@ -0,0 +1,117 @@
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+from main import bitmaps
+from main.intervals import subtract_intervals
+
+
+BATCH_SIZE = 1000
+
+
+def _applies_to(employee_break, day):
+    """
+    Same as Break.applies_to, historical models have no custom methods.
+    """
+
+    if employee_break.date is not None:
+        return employee_break.date == day
+    return employee_break.weekday is None \
+        or employee_break.weekday == day.weekday()
+
+
+def _as_aware(value):
+    """
+    Make naive datetime aware in the current time zone if time zones are on.
+    """
+
+    if settings.USE_TZ:
+        return timezone.make_aware(value)
+    return value
+
+
+def _as_naive(value):
+    """
+    Convert aware datetime to a naive one in the current time zone.
+    """
+
+    if settings.USE_TZ and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def fill_free_slots(apps, schema_editor):
+    """
+    Materialize free slots of schedules from today on, FreeSlot rows were
+    only written by signals so far and schedules saved earlier have none.
+    """
+
+    Schedule = apps.get_model("main", "Schedule")
+    Appointment = apps.get_model("main", "Appointment")
+    Break = apps.get_model("main", "Break")
+    Absence = apps.get_model("main", "Absence")
+    FreeSlot = apps.get_model("main", "FreeSlot")
+
+    today = timezone.localdate()
+    schedules = list(Schedule.objects.filter(
+        date__gte=today, employee__isnull=False
+    ))
+    FreeSlot.objects.filter(schedule__date__gte=today).delete()
+    if not schedules:
+        return
+
+    breaks = {}
+    for employee_break in Break.objects.exclude(date__lt=today):
+        breaks.setdefault(employee_break.employee_id, []).append(
+            employee_break)
+    absences = {}
+    for absence in Absence.objects.filter(date_to__gte=today):
+        absences.setdefault(absence.employee_id, []).append(absence)
+    booked = {}
+    for doctor_id, start, duration in Appointment.objects.filter(
+            datetime__gte=_as_aware(datetime.combine(today, time.min))
+    ).values_list("doctor_id", "datetime", "duration"):
+        start = _as_naive(start)
+        key = (doctor_id, start.date())
+        booked[key] = booked.get(key, 0) \
+            | bitmaps.get_busy_bitmap(start.time(), duration)
+
+    free_slots = []
+    for schedule in schedules:
+        day = schedule.date
+        if any(absence.date_from <= day <= absence.date_to
+               for absence in absences.get(schedule.employee_id, [])):
+            continue
+        intervals = subtract_intervals(
+            [(schedule.start, schedule.end)],
+            [(employee_break.start, employee_break.end)
+             for employee_break in breaks.get(schedule.employee_id, [])
+             if _applies_to(employee_break, day)]
+        )
+        shift = bitmaps.union(
+            bitmaps.get_shift_bitmap(start, end) for start, end in intervals
+        )
+        free = bitmaps.get_free_bitmap(
+            shift, booked.get((schedule.employee_id, day), 0))
+        free_slots.extend(
+            FreeSlot(
+                schedule_id=schedule.pk,
+                doctor_id=schedule.employee_id,
+                datetime=_as_aware(slot_datetime)
+            )
+            for slot_datetime in bitmaps.iter_slot_datetimes(free, day)
+        )
+    FreeSlot.objects.bulk_create(free_slots, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_appointment_modified'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_free_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 21:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0015_deletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed', models.DateTimeField()),
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feed_change', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 21:56
+
+from django.db import migrations, models
+import secrets
+
+
+def generate_secrets(apps, schema_editor):
+    """
+    Give every existing feed its own secret, AddField fills in one default.
+    """
+
+    FeedChange = apps.get_model("main", "FeedChange")
+    for feed_change in FeedChange.objects.all():
+        feed_change.secret = secrets.token_urlsafe()
+        feed_change.save(update_fields=["secret"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_feedchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedchange',
+            name='secret',
+            field=models.CharField(default=secrets.token_urlsafe, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='feedchange',
+            name='changed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(generate_secrets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+
+from .roles import is_nurse
+
+
+class NurseRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
+    """
+    Allow only logged in nurses.
+    """
+
+    def test_func(self):
+        """
+        Allow only nurses
+        """
+        return is_nurse(self.request.user)
+
+
+class StaffRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
+    """
+    Allow only logged in staff members.
+    """
+
+    def test_func(self):
+        """
+        Allow only users with admin panel access
+        """
+        return self.request.user.is_staff
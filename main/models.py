@@ -1,13 +1,53 @@
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import DEFERRED
 from django.urls import reverse
+from django.utils import timezone
 
 from patients.models import Patient
+from .const import (DEFAULT_VISIT_TYPE, VISIT_DURATIONS, VISIT_TYPE_CHOICES,
+                    WEEKDAY_CHOICES)
+from .intervals import IntervalIndex
+from .roles import get_physician_ids
 from .validators import is_physician
 
 
-class Schedule(models.Model):
+class LoadedValuesMixin:
+    """
+    Remember field values loaded from the database to detect changes.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values)
+            if value is not DEFERRED
+        }
+        return instance
+
+    def has_changed(self, *field_names):
+        """
+        Check if any of given fields (attribute names) differs from the value
+        loaded from the database. Unsaved objects count as changed.
+        """
+
+        loaded_values = getattr(self, "_loaded_values", None)
+        if self.pk is None or loaded_values is None:
+            return True
+        return any(
+            name not in loaded_values
+            or loaded_values[name] != getattr(self, name)
+            for name in field_names
+        )
+
+
+class Schedule(LoadedValuesMixin, models.Model):
     """
     Employee shift date, start time and end time.
     """
@@ -34,7 +74,77 @@ class Schedule(models.Model):
         return f"{self.employee.first_name} {self.employee.last_name}"
 
 
-class Appointment(models.Model):
+class Break(LoadedValuesMixin, models.Model):
+    """
+    Employee break within shifts.
+
+    Applies to a single date if date is set (e.g. to split a shift), every
+    week on a weekday if weekday is set, every shift otherwise.
+    """
+
+    employee = models.ForeignKey(User, on_delete=models.CASCADE)
+    start = models.TimeField()
+    end = models.TimeField()
+    date = models.DateField(null=True, blank=True)
+    weekday = models.PositiveSmallIntegerField(
+        choices=WEEKDAY_CHOICES,
+        null=True,
+        blank=True
+    )
+
+    def __str__(self):
+        if self.date:
+            applies = str(self.date)
+        elif self.weekday is not None:
+            applies = self.get_weekday_display()
+        else:
+            applies = "Daily"
+        return f"{self.employee} {applies} {self.start}-{self.end}"
+
+    def clean(self):
+        """
+        Check if break ends after it starts.
+        """
+
+        if self.start >= self.end:
+            raise ValidationError("Break must end after it starts!")
+
+    def applies_to(self, date):
+        """
+        Check if break applies to a given date.
+        """
+
+        if self.date is not None:
+            return self.date == date
+        return self.weekday is None or self.weekday == date.weekday()
+
+
+class Absence(LoadedValuesMixin, models.Model):
+    """
+    Employee whole days off, e.g. vacation or sick leave.
+    """
+
+    employee = models.ForeignKey(User, on_delete=models.CASCADE)
+    date_from = models.DateField()
+    date_to = models.DateField()
+    reason = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        return f"{self.employee} {self.date_from} - {self.date_to}"
+
+    def clean(self):
+        """
+        Check if absence does not end before it starts.
+        """
+
+        if self.date_from > self.date_to:
+            raise ValidationError("Absence can't end before it starts!")
+
+
+VALIDATED_FIELDS = ("doctor_id", "patient_id", "datetime", "duration")
+
+
+class Appointment(LoadedValuesMixin, models.Model):
     """
     Doctor appointments.
     """
@@ -57,6 +167,16 @@ class Appointment(models.Model):
     advice = models.TextField(null=True)
     prescription = models.TextField(null=True)
     took_place = models.BooleanField(null=True)
+    visit_type = models.CharField(
+        max_length=20,
+        choices=VISIT_TYPE_CHOICES,
+        default=DEFAULT_VISIT_TYPE
+    )
+    duration = models.PositiveSmallIntegerField(
+        blank=True,
+        help_text="Minutes. Visit type duration by default."
+    )
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         constraints = [
@@ -73,32 +193,237 @@ class Appointment(models.Model):
                     "at this datetime!"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=("doctor", "datetime"),
+                condition=models.Q(took_place__isnull=True),
+                name="appointment_doctor_pending"
+            ),
+            models.Index(
+                fields=("patient", "datetime"),
+                name="appointment_patient_datetime"
+            ),
+        ]
 
     def clean(self):
         """
         Check if user in doctor field is a physician on schedule.
+
+        Checks are skipped when none of the fields they depend on changed
+        since the appointment was loaded, e.g. when saving visit notes.
         """
-        employee = User.objects.filter(
-            models.Q(groups__name__iexact="physicians"),
-            id=self.doctor.id
-        )
+
+        if not self.has_changed(*VALIDATED_FIELDS):
+            return
         schedule = Schedule.objects.filter(
             models.Q(date=self.datetime),
-            employee__id=self.doctor.id
+            employee__id=self.doctor_id
         )
 
-        if not employee.exists():
+        if self.doctor_id not in get_physician_ids([self.doctor_id]):
             raise ValidationError("User is not a physician!")
         elif not schedule.exists():
             raise ValidationError("Doctor not on schedule!")
+        self._check_overlaps()
+
+    def clean_fields(self, exclude=None):
+        """
+        Validate fields, skipping doctor (is_physician) and patient existence
+        queries for relations that didn't change since the appointment was
+        loaded.
+        """
+
+        exclude = set(exclude or ())
+        for name in ("doctor", "patient"):
+            if not self.has_changed(f"{name}_id"):
+                exclude.add(name)
+        super().clean_fields(exclude)
+
+    def validate_constraints(self, exclude=None):
+        """
+        Check unique constraints only when fields they cover changed.
+        """
+
+        if self.has_changed(*VALIDATED_FIELDS):
+            super().validate_constraints(exclude)
+
+    def _check_overlaps(self):
+        """
+        Check if doctor or patient has another appointment overlapping this
+        one.
+        """
+
+        start = self.datetime
+        if settings.USE_TZ and timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        end = start + timedelta(minutes=self.get_duration())
+        nearby = Appointment.objects.filter(
+            models.Q(doctor_id=self.doctor_id)
+            | models.Q(patient_id=self.patient_id),
+            datetime__gt=start - timedelta(days=1),
+            datetime__lt=end
+        ).exclude(pk=self.pk).values_list(
+            "doctor_id", "patient_id", "datetime", "duration"
+        )
+
+        doctor_intervals = []
+        patient_intervals = []
+        for doctor_id, patient_id, other_start, duration in nearby:
+            interval = (other_start, other_start + timedelta(minutes=duration))
+            if doctor_id == self.doctor_id:
+                doctor_intervals.append(interval)
+            if patient_id == self.patient_id:
+                patient_intervals.append(interval)
+        doctor_index = IntervalIndex(doctor_intervals)
+        patient_index = IntervalIndex(patient_intervals)
+
+        if doctor_index.overlaps(start, end):
+            raise ValidationError(
+                "Doctor already has an appointment at this time!"
+            )
+        if patient_index.overlaps(start, end):
+            raise ValidationError(
+                "Patient already has an appointment at this time!"
+            )
+
+    def get_end(self):
+        """
+        Appointment end datetime.
+        """
+
+        return self.datetime + timedelta(minutes=self.get_duration())
+
+    def get_duration(self):
+        """
+        Appointment duration in minutes, visit type duration if not set.
+        """
+
+        if self.duration is None:
+            return VISIT_DURATIONS[self.visit_type]
+        return self.duration
 
     def __str__(self):
         datetime_string = self.datetime.strftime("%Y-%m-%d %H:%M")
         return f"{datetime_string} {self.doctor} {self.patient}"
 
     def save(self, *args, **kwargs):
+        self.duration = self.get_duration()
         self.clean()
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse("main:appointment", args=[self.id])
+
+
+class FreeSlot(models.Model):
+    """
+    Appointment time free to schedule.
+
+    Materialized from Schedule and Appointment rows and kept up to date by
+    signals in main.signals.
+    """
+
+    schedule = models.ForeignKey(
+        Schedule,
+        on_delete=models.CASCADE,
+        related_name="free_slots"
+    )
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE)
+    datetime = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=("doctor", "datetime"),
+                name="unique_doctor_free_slot"
+            )
+        ]
+
+    def __str__(self):
+        datetime_string = self.datetime.strftime("%Y-%m-%d %H:%M")
+        return f"{datetime_string} {self.doctor}"
+
+
+class SlotHold(models.Model):
+    """
+    Appointment time held for a while by an employee about to book it.
+
+    Other employees can't hold or book overlapping times until the hold
+    expires.
+    """
+
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="slot_holds"
+    )
+    datetime = models.DateTimeField()
+    end = models.DateTimeField()
+    expires = models.DateTimeField()
+    held_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="held_slots"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=("doctor", "datetime"),
+                name="unique_doctor_slot_hold"
+            )
+        ]
+
+    def __str__(self):
+        datetime_string = self.datetime.strftime("%Y-%m-%d %H:%M")
+        return f"{datetime_string} {self.doctor} held by {self.held_by}"
+
+
+class Deletion(models.Model):
+    """
+    ID of a deleted patient or appointment.
+
+    Written by signals in main.signals, so incremental exports can tell a
+    data warehouse which records to remove.
+    """
+
+    dataset = models.CharField(max_length=20)
+    record_id = models.BigIntegerField()
+    deleted = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=("dataset", "deleted"),
+                name="deletion_dataset_deleted"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.dataset} {self.record_id}"
+
+
+class FeedChange(models.Model):
+    """
+    Secret of a doctor calendar feed url and last time an appointment left
+    the feed.
+
+    Removed appointments don't show in modified times of the remaining
+    ones, so feeds take the time of the last removal from here (see
+    main.ical.touch_feed). Feed tokens are signed with the secret, a new
+    one revokes urls given out before (see main.ical.reset_feed_token).
+    """
+
+    doctor = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_change"
+    )
+    changed = models.DateTimeField(null=True, blank=True)
+    secret = models.CharField(max_length=64, default=secrets.token_urlsafe)
+
+    def __str__(self):
+        if self.changed is None:
+            return str(self.doctor)
+        changed_string = self.changed.strftime("%Y-%m-%d %H:%M")
+        return f"{self.doctor} {changed_string}"
@@ -0,0 +1,68 @@
+import re
+
+from django.db import connection
+
+from .querysets import (get_dashboard_appointments, get_day_open_appointments,
+                        get_day_start, get_specialty_schedules,
+                        get_treatment_history)
+
+
+# Sequential scan lines of EXPLAIN output by database vendor. SQLite
+# "SCAN table USING INDEX" reads an index in order and is not matched.
+SEQUENTIAL_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"\bSCAN (?:TABLE )?(\w+)(?! USING)(?:\s|$)"),
+    "postgresql": re.compile(r"\bSeq Scan on (\w+)"),
+}
+
+
+def get_hot_querysets(doctor_id, patient_id, specialty_id, day):
+    """
+    Querysets of the most frequent appointment and schedule lookups, built
+    by the same functions as the worklist and views.
+
+    Parameters
+    ----------
+    doctor_id : int
+    patient_id : int
+    specialty_id : int
+        group ID.
+    day : datetime.date
+
+    Returns
+    ----------
+    dict
+        querysets by name.
+    """
+
+    # paginated querysets, ordered as get_appointment_page orders them
+    return {
+        "next_appointment": get_day_open_appointments(doctor_id, day),
+        "treatment_history": get_treatment_history(patient_id).order_by(
+            "datetime", "id"),
+        "upcoming_appointments": get_dashboard_appointments(
+            get_day_start(day)).order_by("datetime", "id"),
+        "specialty_schedules": get_specialty_schedules(specialty_id, day),
+    }
+
+
+def get_sequential_scans(plan, vendor=None):
+    """
+    Names of tables read with a sequential scan according to a query plan.
+
+    Parameters
+    ----------
+    plan : str
+        EXPLAIN output.
+    vendor : str
+        database vendor, default connection vendor if not given.
+
+    Returns
+    ----------
+    list
+        table names, empty for unsupported vendors.
+    """
+
+    pattern = SEQUENTIAL_SCAN_PATTERNS.get(vendor or connection.vendor)
+    if pattern is None:
+        return []
+    return pattern.findall(plan)
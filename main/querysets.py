@@ -0,0 +1,139 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Appointment, Schedule
+
+
+def get_day_start(day):
+    """
+    Aware midnight of a day, today if not given.
+    """
+
+    if day is None:
+        return timezone.localtime().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def get_open_appointments(doctor):
+    """
+    Doctor appointments not marked as taken place with doctors and patients,
+    ordered by datetime.
+    """
+
+    return Appointment.objects.filter(
+        Q(doctor=doctor)
+        & Q(took_place=None)
+    ).select_related("doctor", "patient").order_by("datetime")
+
+
+def get_day_open_appointments(doctor, day=None):
+    """
+    Doctor appointments of a day not marked as taken place, see
+    get_open_appointments.
+
+    Parameters
+    ----------
+    doctor : User or int
+        physician or their ID.
+    day : datetime.date
+        today if not given.
+
+    Returns
+    ----------
+    QuerySet
+    """
+
+    start = get_day_start(day)
+    return get_open_appointments(doctor).filter(
+        Q(datetime__gte=start)
+        & Q(datetime__lt=start + timedelta(days=1))
+    )
+
+
+def get_treatment_history(patient):
+    """
+    Patient appointments with doctor names only.
+
+    Parameters
+    ----------
+    patient : Patient or int
+        patient or their ID.
+
+    Returns
+    ----------
+    QuerySet
+        unordered, see get_appointment_page.
+    """
+
+    return Appointment.objects.filter(
+        patient=patient
+    ).select_related("doctor").only(
+        "datetime", "doctor__first_name", "doctor__last_name"
+    )
+
+
+def get_dashboard_appointments(start, end=None, doctor=None, specialty=None):
+    """
+    Appointments with doctors and patients listed on nurse dashboard.
+
+    Parameters
+    ----------
+    start : datetime.datetime
+        earliest appointment datetime.
+    end : datetime.datetime
+        datetime appointments start before, no limit if not given.
+    doctor : User or int
+        only appointments of this doctor if given.
+    specialty : Group or int
+        only appointments of doctors of this specialty if given.
+
+    Returns
+    ----------
+    QuerySet
+        unordered, see get_appointment_page.
+    """
+
+    appointments = Appointment.objects.select_related(
+        "doctor", "patient"
+    ).filter(Q(datetime__gte=start))
+    if end is not None:
+        appointments = appointments.filter(Q(datetime__lt=end))
+    if doctor:
+        appointments = appointments.filter(doctor=doctor)
+    if specialty:
+        appointments = appointments.filter(doctor__groups=specialty)
+    return appointments
+
+
+def get_specialty_schedules(specialty_id, date_from, date_to=None,
+                            employee_id=None):
+    """
+    Schedules with employees of a specialty between two dates.
+
+    Parameters
+    ----------
+    specialty_id : int
+        group ID.
+    date_from : datetime.date or str
+    date_to : datetime.date or str
+        date_from if not given.
+    employee_id : int
+        only schedules of this employee if given.
+
+    Returns
+    ----------
+    QuerySet
+    """
+
+    query = Q(employee__groups__id=specialty_id)
+    if employee_id:
+        query &= Q(employee__id=employee_id)
+    if date_to is None:
+        query &= Q(date=date_from)
+    else:
+        query &= Q(date__gte=date_from) & Q(date__lte=date_to)
+    return Schedule.objects.filter(query).select_related("employee")
@@ -0,0 +1,89 @@
+from django.contrib.auth.models import Group, User
+
+
+NURSES = "nurses"
+PHYSICIANS = "physicians"
+
+
+def get_roles(user_id):
+    """
+    Get lower case names of groups a user belongs to with one query.
+
+    Roles aren't cached across requests, a per-process cache would keep
+    revoked roles in other processes. See get_user_roles.
+
+    Parameters
+    ----------
+    user_id : int
+
+    Returns
+    ----------
+    frozenset
+        group names.
+    """
+
+    return frozenset(
+        name.lower() for name in Group.objects.filter(
+            user__id=user_id).values_list("name", flat=True)
+    )
+
+
+def get_physician_ids(user_ids):
+    """
+    Get IDs of given users who are in physicians group with one query.
+
+    Parameters
+    ----------
+    user_ids : iterable
+
+    Returns
+    ----------
+    frozenset
+        user IDs.
+    """
+
+    return frozenset(User.objects.filter(
+        pk__in=user_ids, groups__name__iexact=PHYSICIANS
+    ).values_list("id", flat=True))
+
+
+def get_user_roles(user):
+    """
+    Get roles of a user, resolved once per user object.
+
+    request.user lives as long as the request, so roles are looked up once
+    per request at most.
+
+    Parameters
+    ----------
+    user : User or AnonymousUser
+
+    Returns
+    ----------
+    frozenset
+        group names, empty for anonymous users.
+    """
+
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, "_roles", None)
+    if roles is None:
+        roles = get_roles(user.pk)
+        user._roles = roles
+    return roles
+
+
+def is_nurse(user):
+    """
+    Check if user belongs to nurses group.
+    """
+
+    return NURSES in get_user_roles(user)
+
+
+def is_doctor(user):
+    """
+    Check if user belongs to physicians group.
+    """
+
+    return PHYSICIANS in get_user_roles(user)
@@ -0,0 +1,237 @@
+from datetime import timedelta
+from functools import partial
+from threading import Thread
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from .const import FREE_SLOT_REBUILD_BATCH_SIZE, SHIFT_PREVIEW_ROWS
+from .models import FreeSlot, Schedule
+from .utils import rebuild_free_slots
+
+
+REBUILD_THREAD_NAME = "free-slot-rebuild"
+
+
+def expand_shifts(employee_ids, date_from, date_to, weekdays, start, end):
+    """
+    Expand a recurring shift template into schedules.
+
+    Parameters
+    ----------
+    employee_ids : iterable
+        IDs of employees working the shift.
+    date_from : datetime.date
+    date_to : datetime.date
+        last day of the shift, inclusive.
+    weekdays : iterable
+        days of week the shift applies to, 0 for Monday.
+    start : datetime.time
+    end : datetime.time
+
+    Returns
+    ----------
+    list
+        unsaved Schedule objects ordered by date.
+    """
+
+    employee_ids = list(employee_ids)
+    weekdays = set(weekdays)
+    days = (
+        date_from + timedelta(days=offset)
+        for offset in range((date_to - date_from).days + 1)
+    )
+    return [
+        Schedule(date=day, start=start, end=end, employee_id=employee_id)
+        for day in days if day.weekday() in weekdays
+        for employee_id in employee_ids
+    ]
+
+
+def preview_shifts(shifts, limit=SHIFT_PREVIEW_ROWS):
+    """
+    Compare expanded shifts with shifts already saved for the same employees
+    and days.
+
+    Parameters
+    ----------
+    shifts : list
+        unsaved Schedule objects, see expand_shifts.
+    limit : int
+        shifts listed in rows.
+
+    Returns
+    ----------
+    dict
+        total, new, changed and unchanged counts, rows with date, employee
+        (full name), start, end and saved (start and end tuple, None for new
+        shifts) keys of the first limit shifts.
+    """
+
+    saved = _get_saved_times(shifts)
+    names = {
+        pk: f"{first_name} {last_name}".strip() or username
+        for pk, first_name, last_name, username in User.objects.filter(
+            pk__in={shift.employee_id for shift in shifts}
+        ).values_list("pk", "first_name", "last_name", "username")
+    }
+    preview = {"total": len(shifts), "new": 0, "changed": 0, "unchanged": 0,
+               "rows": []}
+    for shift in shifts:
+        times = saved.get((shift.employee_id, shift.date))
+        if times is None:
+            preview["new"] += 1
+        elif times == (shift.start, shift.end):
+            preview["unchanged"] += 1
+        else:
+            preview["changed"] += 1
+        if len(preview["rows"]) < limit:
+            preview["rows"].append({
+                "date": shift.date,
+                "employee": names.get(shift.employee_id),
+                "start": shift.start,
+                "end": shift.end,
+                "saved": times
+            })
+    return preview
+
+
+def save_shifts(shifts):
+    """
+    Insert shifts with one bulk upsert and rebuild their free slots.
+
+    A shift of an employee already working that day replaces start and end
+    of the saved one (unique_employee_work_date). Schedule signals are
+    skipped, so free slots of new and changed shifts are rebuilt in a
+    background thread after commit instead (see start_free_slot_rebuild).
+    Until then changed shifts have no free slots, so nothing can be booked
+    outside their new hours.
+
+    Parameters
+    ----------
+    shifts : list
+        unsaved Schedule objects, see expand_shifts.
+
+    Returns
+    ----------
+    int
+        number of shifts saved.
+    """
+
+    if not shifts:
+        return 0
+    with transaction.atomic():
+        saved = _get_saved_times(shifts)
+        changed = {
+            (shift.employee_id, shift.date) for shift in shifts
+            if saved.get((shift.employee_id, shift.date))
+            != (shift.start, shift.end)
+        }
+        Schedule.objects.bulk_create(
+            shifts,
+            update_conflicts=True,
+            unique_fields=("date", "employee"),
+            update_fields=("start", "end")
+        )
+        if not changed:
+            return len(shifts)
+        schedules = _get_changed([
+            shift for shift in shifts
+            if (shift.employee_id, shift.date) in changed
+        ])
+        FreeSlot.objects.filter(schedule__in=[
+            schedule.pk for schedule in schedules
+            if (schedule.employee_id, schedule.date) in saved
+        ]).delete()
+        transaction.on_commit(partial(
+            start_free_slot_rebuild, [schedule.pk for schedule in schedules]
+        ))
+    return len(shifts)
+
+
+def start_free_slot_rebuild(schedule_ids):
+    """
+    Rebuild free slots of given schedules in a background thread, so saving
+    a quarter of shifts doesn't wait for hundreds of thousands of rows.
+
+    Parameters
+    ----------
+    schedule_ids : list
+
+    Returns
+    ----------
+    threading.Thread
+        started thread, named REBUILD_THREAD_NAME.
+    """
+
+    thread = Thread(
+        target=_rebuild_in_thread, args=(schedule_ids,),
+        name=REBUILD_THREAD_NAME
+    )
+    thread.start()
+    return thread
+
+
+def rebuild_schedule_free_slots(schedule_ids,
+                                batch_size=FREE_SLOT_REBUILD_BATCH_SIZE):
+    """
+    Rebuild free slots of given schedules, a transaction per batch so
+    bookings aren't blocked for the whole rebuild.
+
+    Parameters
+    ----------
+    schedule_ids : list
+    batch_size : int
+        schedules rebuilt per transaction.
+    """
+
+    for start in range(0, len(schedule_ids), batch_size):
+        rebuild_free_slots(Schedule.objects.filter(
+            pk__in=schedule_ids[start:start + batch_size]))
+
+
+def _rebuild_in_thread(schedule_ids):
+    """
+    Thread target of start_free_slot_rebuild, closes the connection the
+    thread opened.
+    """
+
+    try:
+        rebuild_schedule_free_slots(schedule_ids)
+    finally:
+        connection.close()
+
+
+def _get_changed(shifts):
+    """
+    Saved schedules of exactly the employee and day pairs of given shifts.
+    """
+
+    keys = {(shift.employee_id, shift.date) for shift in shifts}
+    return [
+        schedule for schedule in _get_saved(shifts)
+        if (schedule.employee_id, schedule.date) in keys
+    ]
+
+
+def _get_saved(shifts):
+    """
+    Saved schedules of the employees and days of given shifts.
+    """
+
+    return Schedule.objects.filter(
+        employee__in={shift.employee_id for shift in shifts},
+        date__in={shift.date for shift in shifts}
+    )
+
+
+def _get_saved_times(shifts):
+    """
+    Start and end of saved schedules by (employee_id, date) of given shifts.
+    """
+
+    return {
+        (employee_id, day): (start, end)
+        for employee_id, day, start, end in _get_saved(shifts).values_list(
+            "employee_id", "date", "start", "end")
+    }
@@ -0,0 +1,204 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_free_slots
+from .ical import touch_feed
+from .models import Absence, Appointment, Break, Deletion, Schedule
+from .utils import rebuild_free_slots, release_free_slot, take_free_slot
+from patients.models import Patient
+
+
+# Export datasets of models whose deletions are recorded.
+DELETION_DATASETS = {Patient: "patients", Appointment: "appointments"}
+# User fields exported with appointments of a doctor.
+DOCTOR_EXPORT_FIELDS = ("username", "first_name", "last_name")
+
+
+@receiver(post_save, sender=Schedule)
+def update_schedule_free_slots(sender, instance, **kwargs):
+    """
+    Recreate free slots of a saved schedule. Invalidate cached free slots of
+    the day and employee it was moved from.
+    """
+
+    loaded_values = getattr(instance, "_loaded_values", {})
+    invalidate_free_slots(
+        loaded_values.get("employee_id"),
+        loaded_values.get("date")
+    )
+    schedule = Schedule.objects.get(pk=instance.pk)
+    rebuild_free_slots([schedule])
+    instance._loaded_values = schedule._loaded_values
+
+
+@receiver(post_delete, sender=Schedule)
+def invalidate_schedule_free_slots(sender, instance, **kwargs):
+    """
+    Invalidate cached free slots of a deleted schedule.
+    """
+
+    date = Schedule._meta.get_field("date").to_python(instance.date)
+    invalidate_free_slots(instance.employee_id, date)
+
+
+@receiver(post_save, sender=Appointment)
+def touch_previous_doctor_feed(sender, instance, created, **kwargs):
+    """
+    Mark the calendar feed of a doctor an appointment was moved from
+    changed. Runs before take_appointment_free_slot updates loaded values.
+    """
+
+    loaded_values = getattr(instance, "_loaded_values", {})
+    previous_doctor_id = loaded_values.get("doctor_id")
+    if not created and previous_doctor_id not in (None, instance.doctor_id):
+        touch_feed(previous_doctor_id)
+
+
+@receiver(post_save, sender=Appointment)
+def take_appointment_free_slot(sender, instance, created, **kwargs):
+    """
+    Remove booked slot from free slots. Release the previous one if an
+    appointment was moved.
+    """
+
+    loaded_values = getattr(instance, "_loaded_values", {})
+    previous_doctor_id = loaded_values.get("doctor_id")
+    previous_datetime = loaded_values.get("datetime")
+    moved = (previous_doctor_id != instance.doctor_id
+             or previous_datetime != instance.datetime
+             or loaded_values.get("duration") != instance.duration)
+
+    if not created and moved and previous_datetime is not None:
+        release_free_slot(previous_doctor_id, previous_datetime)
+    if created or moved:
+        take_free_slot(
+            instance.doctor_id, instance.datetime, instance.duration
+        )
+    instance._loaded_values = {
+        **loaded_values,
+        "doctor_id": instance.doctor_id,
+        "patient_id": instance.patient_id,
+        "datetime": instance.datetime,
+        "duration": instance.duration
+    }
+
+
+@receiver(post_delete, sender=Appointment)
+def release_appointment_free_slot(sender, instance, **kwargs):
+    """
+    Put a cancelled appointment slots back into free slots.
+    """
+
+    release_free_slot(instance.doctor_id, instance.datetime)
+    touch_feed(instance.doctor_id)
+
+
+@receiver(post_delete, sender=Patient)
+@receiver(post_delete, sender=Appointment)
+def record_deletion(sender, instance, **kwargs):
+    """
+    Keep the ID of a deleted patient or appointment for incremental exports.
+    """
+
+    Deletion.objects.create(
+        dataset=DELETION_DATASETS[sender], record_id=instance.pk
+    )
+
+
+@receiver(pre_save, sender=User)
+def load_exported_doctor_fields(sender, instance, update_fields=None,
+                                **kwargs):
+    """
+    Remember saved names of a user before they may change, for
+    touch_renamed_doctor_appointments.
+    """
+
+    if instance.pk is None or (
+            update_fields is not None
+            and not set(update_fields) & set(DOCTOR_EXPORT_FIELDS)):
+        return
+    instance._exported_values = User.objects.filter(
+        pk=instance.pk).values_list(*DOCTOR_EXPORT_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def touch_renamed_doctor_appointments(sender, instance, **kwargs):
+    """
+    Mark appointments of a renamed doctor modified. User has no modified
+    time, so incremental exports pick new names up from appointments.
+    """
+
+    saved_values = getattr(instance, "_exported_values", None)
+    instance._exported_values = None
+    values = tuple(getattr(instance, name) for name in DOCTOR_EXPORT_FIELDS)
+    if saved_values is not None and saved_values != values:
+        Appointment.objects.filter(doctor=instance).update(
+            modified=timezone.now())
+
+
+@receiver(post_save, sender=Break)
+@receiver(post_delete, sender=Break)
+def update_break_free_slots(sender, instance, **kwargs):
+    """
+    Recreate free slots of shifts a break applies or applied to.
+    """
+
+    loaded_values = getattr(instance, "_loaded_values", {})
+    schedules = _get_break_schedules(
+        instance.employee_id, instance.date, instance.weekday
+    )
+    if loaded_values:
+        schedules |= _get_break_schedules(
+            loaded_values["employee_id"],
+            loaded_values["date"],
+            loaded_values["weekday"]
+        )
+    rebuild_free_slots(schedules)
+    instance._loaded_values = {
+        "employee_id": instance.employee_id,
+        "date": instance.date,
+        "weekday": instance.weekday
+    }
+
+
+@receiver(post_save, sender=Absence)
+@receiver(post_delete, sender=Absence)
+def update_absence_free_slots(sender, instance, **kwargs):
+    """
+    Recreate free slots of shifts within an absence, current and previous.
+    """
+
+    loaded_values = getattr(instance, "_loaded_values", {})
+    schedules = Schedule.objects.filter(
+        employee=instance.employee_id,
+        date__range=(instance.date_from, instance.date_to)
+    )
+    if loaded_values:
+        schedules |= Schedule.objects.filter(
+            employee=loaded_values["employee_id"],
+            date__range=(loaded_values["date_from"], loaded_values["date_to"])
+        )
+    rebuild_free_slots(schedules)
+    instance._loaded_values = {
+        "employee_id": instance.employee_id,
+        "date_from": instance.date_from,
+        "date_to": instance.date_to
+    }
+
+
+def _get_break_schedules(employee_id, date, weekday):
+    """
+    Employee schedules a break with given date and weekday applies to.
+    Recurring breaks only rebuild schedules from today, as past free slots
+    are never offered.
+    """
+
+    schedules = Schedule.objects.filter(employee=employee_id)
+    if date is not None:
+        return schedules.filter(date=date)
+    schedules = schedules.filter(date__gte=timezone.localdate())
+    if weekday is not None:
+        return schedules.filter(date__iso_week_day=weekday + 1)
+    return schedules
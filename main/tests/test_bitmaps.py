@@ -0,0 +1,120 @@
+from datetime import date, datetime, time
+
+from django.test import SimpleTestCase
+
+from ..bitmaps import (FULL_DAY, get_busy_bitmap, get_fitting_bitmap,
+                       get_free_bitmap, get_future_bitmap,
+                       get_keys_set_at, get_shift_bitmap, get_slot_index,
+                       get_slot_time, get_times_bitmap, intersect, is_set_at,
+                       iter_slot_datetimes, iter_slot_times, union)
+
+
+class TestSlotIndex(SimpleTestCase):
+
+    def test_get_slot_index(self):
+        self.assertEqual(0, get_slot_index(time(0)))
+        self.assertEqual(17, get_slot_index(time(8, 30)))
+        self.assertEqual(17, get_slot_index(time(8, 45)))
+
+    def test_get_slot_time(self):
+        self.assertEqual(time(8, 30), get_slot_time(17))
+
+
+class TestShiftBitmap(SimpleTestCase):
+
+    def test_get_shift_bitmap(self):
+        bitmap = get_shift_bitmap(time(8), time(10))
+        self.assertEqual(
+            [time(8), time(8, 30), time(9), time(9, 30)],
+            list(iter_slot_times(bitmap))
+        )
+
+    def test_get_shift_bitmap_off_grid(self):
+        bitmap = get_shift_bitmap(time(8, 15), time(9, 45))
+        self.assertEqual(
+            [time(8, 30), time(9), time(9, 30)],
+            list(iter_slot_times(bitmap))
+        )
+
+    def test_get_shift_bitmap_empty(self):
+        self.assertEqual(0, get_shift_bitmap(time(10), time(10)))
+        self.assertEqual(0, get_shift_bitmap(time(10), time(8)))
+
+
+class TestBitmapOperations(SimpleTestCase):
+
+    def setUp(self):
+        self.shift = get_shift_bitmap(time(8), time(10))
+        self.booked = get_times_bitmap([time(8, 30), time(9, 10)])
+
+    def test_get_times_bitmap_ignores_off_grid(self):
+        self.assertEqual(get_times_bitmap([time(8, 30)]), self.booked)
+
+    def test_get_free_bitmap(self):
+        free = get_free_bitmap(self.shift, self.booked)
+        self.assertEqual(
+            [time(8), time(9), time(9, 30)],
+            list(iter_slot_times(free))
+        )
+
+    def test_get_busy_bitmap(self):
+        self.assertEqual(
+            [time(8), time(8, 30), time(9)],
+            list(iter_slot_times(get_busy_bitmap(time(8, 15), 60)))
+        )
+        self.assertEqual(
+            [time(23, 30)],
+            list(iter_slot_times(get_busy_bitmap(time(23, 30), 90)))
+        )
+
+    def test_get_fitting_bitmap(self):
+        free = get_free_bitmap(self.shift, self.booked)
+        self.assertEqual(free, get_fitting_bitmap(free, 30))
+        self.assertEqual(
+            [time(9)],
+            list(iter_slot_times(get_fitting_bitmap(free, 60)))
+        )
+        self.assertEqual(0, get_fitting_bitmap(free, 90))
+
+    def test_intersect_and_union(self):
+        other = get_shift_bitmap(time(9), time(11))
+        self.assertEqual(
+            [time(9), time(9, 30)],
+            list(iter_slot_times(intersect([self.shift, other])))
+        )
+        self.assertEqual(
+            get_shift_bitmap(time(8), time(11)),
+            union([self.shift, other])
+        )
+        self.assertEqual(FULL_DAY, intersect([]))
+        self.assertEqual(0, union([]))
+
+    def test_is_set_at(self):
+        self.assertTrue(is_set_at(self.shift, time(9, 30)))
+        self.assertFalse(is_set_at(self.shift, time(10)))
+        self.assertFalse(is_set_at(self.shift, time(9, 15)))
+
+    def test_get_keys_set_at(self):
+        bitmaps = {
+            1: self.shift,
+            2: get_shift_bitmap(time(12), time(14)),
+            3: get_shift_bitmap(time(9), time(13)),
+        }
+        self.assertEqual([1, 3], get_keys_set_at(bitmaps, time(9)))
+        self.assertEqual([2, 3], get_keys_set_at(bitmaps, time(12, 30)))
+
+    def test_get_future_bitmap(self):
+        now = datetime(2100, 1, 1, 8, 10)
+        self.assertEqual(FULL_DAY, get_future_bitmap(date(2100, 1, 2), now))
+        self.assertEqual(0, get_future_bitmap(date(2099, 12, 31), now))
+        future = get_future_bitmap(date(2100, 1, 1), now) & self.shift
+        self.assertEqual(
+            [time(8, 30), time(9), time(9, 30)],
+            list(iter_slot_times(future))
+        )
+
+    def test_iter_slot_datetimes(self):
+        self.assertEqual(
+            [datetime(2100, 1, 1, 8, 30)],
+            list(iter_slot_datetimes(self.booked, date(2100, 1, 1)))
+        )
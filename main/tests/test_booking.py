@@ -0,0 +1,289 @@
+from datetime import date, datetime, time, timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User, Group
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from patients.models import Patient
+from ..booking import (PAST_APPOINTMENT_MESSAGE, SLOT_HELD_MESSAGE,
+                       SLOT_TAKEN_MESSAGE, SlotTaken,
+                       book_appointment, book_appointments,
+                       get_series_datetimes, hold_slot)
+from ..models import Appointment, FreeSlot, Schedule, SlotHold
+from ..utils import rebuild_free_slots
+
+
+class TestBookAppointment(TestCase):
+
+    def setUp(self):
+        physicians_group = Group.objects.create(name="physicians")
+        self.doctor = User.objects.create(username="doctor")
+        self.doctor.groups.add(physicians_group)
+        self.patients = [
+            Patient.objects.create(
+                first_name="Johnny",
+                last_name="Test",
+                date_of_birth="2022-12-12",
+                personal_id=f"1234567891{i}",
+                email="email@email.com",
+                phone="0123456789",
+                address=None
+            ) for i in range(2)
+        ]
+        Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="10:00",
+            employee=self.doctor
+        )
+
+    def _appointment(self, hour, patient=0, visit_type="consultation"):
+        return Appointment(
+            datetime=timezone.make_aware(
+                datetime.combine(date(2100, 1, 1), hour)),
+            patient=self.patients[patient],
+            doctor=self.doctor,
+            purpose="Toothache",
+            visit_type=visit_type
+        )
+
+    def test_book_appointment_takes_free_slots(self):
+        appointment = book_appointment(
+            self._appointment(time(8), visit_type="examination"))
+        self.assertIsNotNone(appointment.pk)
+        self.assertEqual(2, FreeSlot.objects.count())
+
+    def test_taken_slot_raises(self):
+        book_appointment(self._appointment(time(8, 30)))
+        with self.assertRaises(SlotTaken):
+            book_appointment(self._appointment(time(8, 30), patient=1))
+        self.assertEqual(1, Appointment.objects.count())
+
+    def test_partly_taken_slots_raise_and_keep_free_slots(self):
+        book_appointment(self._appointment(time(9)))
+        with self.assertRaises(SlotTaken):
+            book_appointment(
+                self._appointment(time(8, 30), 1, visit_type="examination"))
+        self.assertEqual(3, FreeSlot.objects.count())
+
+    def test_slot_outside_schedule_raises(self):
+        with self.assertRaises(SlotTaken):
+            book_appointment(self._appointment(time(12)))
+
+    def test_invalid_appointment_keeps_free_slots(self):
+        self.doctor.groups.clear()
+        with self.assertRaises(ValidationError):
+            book_appointment(self._appointment(time(8)))
+        self.assertEqual(4, FreeSlot.objects.count())
+
+    def test_past_appointment_raises(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        Schedule.objects.create(
+            date=yesterday, start="08:00", end="10:00", employee=self.doctor
+        )
+        appointment = self._appointment(time(8))
+        appointment.datetime = timezone.make_aware(
+            datetime.combine(yesterday, time(8)))
+        with self.assertRaisesMessage(
+                ValidationError, PAST_APPOINTMENT_MESSAGE):
+            book_appointment(appointment)
+        self.assertFalse(Appointment.objects.exists())
+
+
+class TestHoldSlot(TestCase):
+
+    def setUp(self):
+        physicians_group = Group.objects.create(name="physicians")
+        self.doctor = User.objects.create(username="doctor")
+        self.doctor.groups.add(physicians_group)
+        self.nurse = User.objects.create(username="nurse")
+        self.other_nurse = User.objects.create(username="other_nurse")
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678911",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="10:00",
+            employee=self.doctor
+        )
+        self.start = timezone.make_aware(datetime(2100, 1, 1, 8))
+
+    def _appointment(self, start):
+        return Appointment(
+            datetime=start,
+            patient=self.patient,
+            doctor=self.doctor,
+            purpose="Toothache"
+        )
+
+    def test_hold_slot(self):
+        hold = hold_slot(self.doctor.id, self.start, 60, self.nurse)
+        self.assertEqual(self.start + timedelta(hours=1), hold.end)
+        self.assertGreater(hold.expires, timezone.now())
+
+    def test_past_slot_cant_be_held(self):
+        with self.assertRaisesMessage(
+                ValidationError, PAST_APPOINTMENT_MESSAGE):
+            hold_slot(self.doctor.id, timezone.now() - timedelta(hours=1),
+                      30, self.nurse)
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_held_slot_cant_be_held_by_other(self):
+        hold_slot(self.doctor.id, self.start, 60, self.nurse)
+        with self.assertRaisesMessage(SlotTaken, SLOT_HELD_MESSAGE):
+            hold_slot(self.doctor.id, self.start + timedelta(minutes=30),
+                      30, self.other_nurse)
+
+    def test_taken_slot_cant_be_held(self):
+        book_appointment(self._appointment(self.start))
+        with self.assertRaises(SlotTaken):
+            hold_slot(self.doctor.id, self.start, 30, self.nurse)
+
+    def test_holding_another_slot_releases_previous(self):
+        hold_slot(self.doctor.id, self.start, 30, self.nurse)
+        hold_slot(self.doctor.id, self.start + timedelta(hours=1), 30,
+                  self.nurse)
+        self.assertEqual(1, SlotHold.objects.count())
+
+    def test_held_slot_booked_by_holder_only(self):
+        hold_slot(self.doctor.id, self.start, 30, self.nurse)
+        with self.assertRaisesMessage(SlotTaken, SLOT_HELD_MESSAGE):
+            book_appointment(
+                self._appointment(self.start), held_by=self.other_nurse)
+        book_appointment(self._appointment(self.start), held_by=self.nurse)
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_expired_hold_ignored(self):
+        hold_slot(self.doctor.id, self.start, 30, self.nurse, seconds=1)
+        SlotHold.objects.update(expires=timezone.now())
+        book_appointment(
+            self._appointment(self.start), held_by=self.other_nurse)
+        self.assertEqual(1, Appointment.objects.count())
+
+
+class TestBookAppointments(TestCase):
+
+    def setUp(self):
+        physicians_group = Group.objects.create(name="physicians")
+        self.doctor = User.objects.create(username="doctor")
+        self.doctor.groups.add(physicians_group)
+        self.nurse = User.objects.create(username="nurse")
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678911",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        Schedule.objects.bulk_create(
+            Schedule(
+                date=date(2100, 1, 1) + timedelta(weeks=i),
+                start=time(8),
+                end=time(10),
+                employee=self.doctor
+            ) for i in range(12)
+        )
+        rebuild_free_slots(Schedule.objects.all())
+        self.start = timezone.make_aware(datetime(2100, 1, 1, 8))
+
+    def _series(self, count, start=None, interval=timedelta(weeks=1)):
+        return [
+            Appointment(
+                datetime=appointment_datetime,
+                patient=self.patient,
+                doctor=self.doctor,
+                purpose="Physiotherapy"
+            ) for appointment_datetime in get_series_datetimes(
+                start or self.start, count, interval)
+        ]
+
+    def test_book_series(self):
+        report = book_appointments(self._series(12))
+        self.assertEqual(12, Appointment.objects.count())
+        self.assertTrue(all(entry["error"] is None for entry in report))
+        self.assertEqual(12 * 3, FreeSlot.objects.count())
+
+    def test_query_count_does_not_grow_with_series(self):
+        with CaptureQueriesContext(connection) as short_series:
+            book_appointments(self._series(2))
+        with CaptureQueriesContext(connection) as long_series:
+            book_appointments(self._series(
+                10, start=self.start + timedelta(hours=1)))
+        self.assertEqual(len(short_series), len(long_series))
+
+    def test_report_conflicts(self):
+        book_appointment(self._series(1, self.start + timedelta(weeks=1))[0])
+        report = book_appointments(self._series(
+            2, start=self.start + timedelta(weeks=11)) + self._series(3))
+        self.assertEqual(
+            [None, "Doctor not on schedule!", None, SLOT_TAKEN_MESSAGE,
+             None],
+            [entry["error"] for entry in report]
+        )
+        self.assertEqual(4, Appointment.objects.count())
+
+    def test_overlapping_occurrences_reported(self):
+        report = book_appointments(
+            self._series(2, interval=timedelta(minutes=30))
+            + self._series(1, start=self.start + timedelta(minutes=30))
+        )
+        self.assertEqual(
+            [None, None, SLOT_TAKEN_MESSAGE],
+            [entry["error"] for entry in report]
+        )
+
+    def test_past_occurrences_reported(self):
+        today = timezone.localdate()
+        Schedule.objects.bulk_create(
+            Schedule(date=today + timedelta(weeks=i), start=time(0, 30),
+                     end=time(23, 30), employee=self.doctor)
+            for i in (-1, 1)
+        )
+        rebuild_free_slots(Schedule.objects.filter(date__lt=date(2100, 1, 1)))
+        start = timezone.make_aware(datetime.combine(
+            today - timedelta(weeks=1), time(12)))
+        report = book_appointments(
+            self._series(2, start=start, interval=timedelta(weeks=2)))
+        self.assertEqual(
+            [PAST_APPOINTMENT_MESSAGE, None],
+            [entry["error"] for entry in report]
+        )
+        self.assertEqual(1, Appointment.objects.count())
+
+        report = book_appointments(self._series(1, start=start),
+                                   allow_past=True)
+        self.assertIsNone(report[0]["error"])
+
+    def test_other_nurse_hold_reported(self):
+        hold_slot(self.doctor.id, self.start, 30, self.nurse)
+        report = book_appointments(self._series(2))
+        self.assertEqual(
+            [SLOT_HELD_MESSAGE, None],
+            [entry["error"] for entry in report]
+        )
+
+    def test_concurrent_booking_rolls_back_series(self):
+        series = self._series(2)
+        with patch("main.booking.FreeSlot.objects.filter") as mock_filter:
+            mock_filter.return_value.values_list.return_value = [
+                (pk, self.doctor.id, slot_datetime)
+                for pk, slot_datetime in FreeSlot.objects.values_list(
+                    "pk", "datetime")
+            ]
+            mock_filter.return_value.delete.return_value = (0, {})
+            with self.assertRaises(SlotTaken):
+                book_appointments(series)
+        self.assertFalse(Appointment.objects.exists())
@@ -0,0 +1,152 @@
+from datetime import date, datetime, time
+from threading import Barrier, Thread
+from unittest.mock import Mock
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from patients.models import Patient
+from ..cache import (get_cache_stats, get_free_slots_key,
+                     get_or_compute_free_slots, invalidate_free_slots,
+                     reset_cache_stats)
+from ..models import Appointment, Schedule
+from ..bitmaps import iter_slot_times
+from ..utils import get_cached_free_bitmaps
+
+
+class TestGetOrComputeFreeSlots(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.key = (1, date(2100, 1, 1))
+
+    def test_miss_computes_and_hit_reads_cache(self):
+        compute = Mock(return_value={self.key: 0b1})
+        first = get_or_compute_free_slots([self.key], compute)
+        second = get_or_compute_free_slots([self.key], compute)
+        self.assertEqual(first, second)
+        compute.assert_called_once_with([self.key])
+        self.assertEqual({"hits": 1, "misses": 1}, get_cache_stats())
+
+    def test_days_without_free_slots_are_cached(self):
+        compute = Mock(return_value={})
+        get_or_compute_free_slots([self.key], compute)
+        result = get_or_compute_free_slots([self.key], compute)
+        self.assertEqual({self.key: 0}, result)
+        compute.assert_called_once()
+
+    def test_invalidate(self):
+        compute = Mock(return_value={})
+        get_or_compute_free_slots([self.key], compute)
+        invalidate_free_slots(*self.key)
+        get_or_compute_free_slots([self.key], compute)
+        self.assertEqual(2, compute.call_count)
+
+    def test_reset_cache_stats(self):
+        get_or_compute_free_slots([self.key], Mock(return_value={}))
+        reset_cache_stats()
+        self.assertEqual({"hits": 0, "misses": 0}, get_cache_stats())
+
+    def test_concurrent_misses_compute_once(self):
+        threads_count = 8
+        barrier = Barrier(threads_count)
+        calls = []
+        results = []
+
+        def compute(keys):
+            calls.append(keys)
+            return {self.key: 0b1}
+
+        def search():
+            barrier.wait()
+            results.append(get_or_compute_free_slots([self.key], compute))
+
+        threads = [Thread(target=search) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(threads_count, len(results))
+        for result in results:
+            self.assertEqual({self.key: 0b1}, result)
+
+
+@override_settings(CACHES={
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": "/tmp/clinic-management-test-cache",
+    }
+})
+class TestGetOrComputeFreeSlotsFileBackend(SimpleTestCase):
+
+    def test_miss_computes_and_hit_reads_cache(self):
+        cache.clear()
+        key = (1, date(2100, 1, 1))
+        compute = Mock(return_value={key: 0b1})
+        get_or_compute_free_slots([key], compute)
+        result = get_or_compute_free_slots([key], compute)
+        self.assertEqual({key: 0b1}, result)
+        compute.assert_called_once()
+        cache.clear()
+
+
+class TestFreeSlotsCacheInvalidation(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create(username="doctor")
+        self.doctor.groups.add(Group.objects.create(name="physicians"))
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678911",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        self.schedule = Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="10:00",
+            employee=self.doctor
+        )
+        self.schedule.refresh_from_db()
+        self.key = (self.doctor.id, date(2100, 1, 1))
+
+    def _free_hours(self):
+        free_bitmaps = get_cached_free_bitmaps([self.schedule])
+        return list(iter_slot_times(free_bitmaps[self.key]))
+
+    def test_appointment_saved_and_deleted_invalidates(self):
+        self.assertEqual(4, len(self._free_hours()))
+        appointment = Appointment.objects.create(
+            datetime=timezone.make_aware(datetime(2100, 1, 1, 8)),
+            patient=self.patient,
+            doctor=self.doctor,
+            purpose="Toothache"
+        )
+        self.assertNotIn(time(8), self._free_hours())
+        appointment.delete()
+        self.assertIn(time(8), self._free_hours())
+
+    def test_schedule_saved_invalidates(self):
+        self.assertEqual(4, len(self._free_hours()))
+        self.schedule.end = "09:00"
+        self.schedule.save()
+        self.assertEqual([time(8), time(8, 30)], self._free_hours())
+
+    def test_schedule_moved_invalidates_previous_day(self):
+        self.assertEqual(4, len(self._free_hours()))
+        self.schedule.date = date(2100, 1, 2)
+        self.schedule.save()
+        self.assertIsNone(cache.get(get_free_slots_key(*self.key)))
+
+    def test_schedule_deleted_invalidates(self):
+        self.assertEqual(4, len(self._free_hours()))
+        self.schedule.delete()
+        self.assertIsNone(cache.get(get_free_slots_key(*self.key)))
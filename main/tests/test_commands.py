@@ -0,0 +1,132 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ..models import Appointment, FreeSlot, Schedule
+from patients.models import Patient
+
+
+class TestFreeSlotsCommand(TestCase):
+
+    def setUp(self):
+        self.doctor = User.objects.create(username="doctor")
+        Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="10:00",
+            employee=self.doctor
+        )
+
+    def test_check_in_sync(self):
+        out = StringIO()
+        call_command("free_slots", "check", stdout=out)
+        self.assertIn("0 missing, 0 stale", out.getvalue())
+
+    def test_check_out_of_sync_raises(self):
+        FreeSlot.objects.first().delete()
+        with self.assertRaises(CommandError):
+            call_command("free_slots", "check", stdout=StringIO())
+
+    def test_rebuild(self):
+        FreeSlot.objects.all().delete()
+        call_command("free_slots", "rebuild", stdout=StringIO())
+        self.assertEqual(4, FreeSlot.objects.count())
+
+
+class TestCloseAppointmentsCommand(TestCase):
+
+    def setUp(self):
+        doctor = User.objects.create(username="doctor")
+        patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678910",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        now = timezone.now()
+        Appointment.objects.bulk_create(
+            Appointment(
+                datetime=now - timedelta(hours=hours),
+                patient=patient,
+                doctor=doctor,
+                purpose="Toothache",
+                duration=30,
+                took_place=took_place
+            ) for hours, took_place in (
+                (1, None), (30, None), (40, None), (50, None), (60, True)
+            )
+        )
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command("close_appointments", dry_run=True, stdout=out)
+        self.assertIn("3 unattended appointments", out.getvalue())
+        self.assertEqual(
+            4, Appointment.objects.filter(took_place=None).count()
+        )
+
+    def test_close_in_batches(self):
+        out = StringIO()
+        call_command("close_appointments", batch_size=2, stdout=out)
+        self.assertIn("Marked 3 appointments as no-shows", out.getvalue())
+        self.assertEqual(
+            3, Appointment.objects.filter(took_place=False).count()
+        )
+        self.assertEqual(
+            1, Appointment.objects.filter(took_place=None).count()
+        )
+
+    def test_grace_hours(self):
+        call_command("close_appointments", grace_hours=45, stdout=StringIO())
+        self.assertEqual(
+            1, Appointment.objects.filter(took_place=False).count()
+        )
+
+    def test_resume_after_id(self):
+        second = Appointment.objects.order_by("id")[1]
+        call_command(
+            "close_appointments", after_id=second.id, stdout=StringIO()
+        )
+        self.assertEqual(
+            2, Appointment.objects.filter(took_place=False).count()
+        )
+
+
+class TestBenchmarkBookingCommand(TransactionTestCase):
+
+    def test_each_slot_booked_once(self):
+        out = StringIO()
+        call_command(
+            "benchmark_booking", threads=2, doctors=1, hours=1, scratch=True,
+            stdout=out
+        )
+        self.assertIn("2 slots, 4 attempts", out.getvalue())
+        self.assertIn("2 booked", out.getvalue())
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(Schedule.objects.exists())
+
+    @override_settings(DEVELOPMENT=False)
+    def test_refuses_configured_database(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark_booking", stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+
+
+class TestBenchmarkAppointmentFormCommand(TestCase):
+
+    def test_read_only_form_smaller(self):
+        out = StringIO()
+        call_command(
+            "benchmark_appointment_form", patients=20, doctors=2, repeat=1,
+            stdout=out
+        )
+        self.assertIn("read-only: 1 queries", out.getvalue())
+        self.assertFalse(Patient.objects.exists())
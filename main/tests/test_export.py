@@ -0,0 +1,213 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..export import export, parse_since
+from ..models import Appointment
+from ..worklist import close_unattended_appointments
+from patients.models import Address, Patient
+
+
+class ExportTestCase(TestCase):
+
+    def setUp(self):
+        self.doctor = User.objects.create(
+            username="doctor", first_name="Gregory", last_name="House"
+        )
+        self.patients = [
+            Patient.objects.create(
+                first_name="Johnny",
+                last_name=f"Test{i}",
+                date_of_birth="2022-12-12",
+                personal_id=f"1234567891{i}",
+                email="email@email.com",
+                phone="0123456789",
+                address=Address.objects.create(
+                    street="Test Lane",
+                    number=str(i),
+                    zip_code="00-000",
+                    city="Testington",
+                    country="Republic of Testland"
+                )
+            ) for i in range(3)
+        ]
+        start = timezone.make_aware(datetime(2020, 1, 1, 8))
+        Appointment.objects.bulk_create(
+            Appointment(
+                datetime=start + timedelta(days=i),
+                patient=self.patients[i % 3],
+                doctor=self.doctor,
+                purpose="Checkup",
+                duration=30
+            ) for i in range(5)
+        )
+
+    def _export(self, *args, **kwargs):
+        return "".join(export(*args, **kwargs))
+
+
+class TestExport(ExportTestCase):
+
+    def test_csv_patients_with_address(self):
+        rows = list(csv.DictReader(io.StringIO(
+            self._export("patients", "csv"))))
+        self.assertEqual(3, len(rows))
+        self.assertEqual("Testington", rows[0]["address__city"])
+        self.assertEqual("12345678910", rows[0]["personal_id"])
+
+    def test_ndjson_appointments_with_names(self):
+        lines = self._export("appointments", "ndjson").splitlines()
+        self.assertEqual(5, len(lines))
+        row = json.loads(lines[0])
+        self.assertEqual("House", row["doctor__last_name"])
+        self.assertEqual("12345678910", row["patient__personal_id"])
+        self.assertEqual("2020-01-01T08:00:00Z", row["datetime"])
+
+    def test_columnar_chunks(self):
+        lines = self._export("appointments", "columnar", chunk_size=2)
+        chunks = [json.loads(line) for line in lines.splitlines()]
+        self.assertEqual([2, 2, 1], [chunk["rows"] for chunk in chunks])
+        self.assertEqual(
+            ["Checkup", "Checkup"], chunks[0]["columns"]["purpose"]
+        )
+
+    def test_changed_since(self):
+        since = timezone.now()
+        patient = self.patients[1]
+        patient.phone = "9876543210"
+        patient.save()
+        address = self.patients[2].address
+        address.city = "Elsewhere"
+        address.save()
+        list(close_unattended_appointments(since + timedelta(days=1)))
+        rows = list(csv.DictReader(io.StringIO(
+            self._export("patients", "csv", since))))
+        self.assertEqual(
+            ["12345678911", "12345678912"],
+            [row["personal_id"] for row in rows]
+        )
+        lines = self._export("appointments", "ndjson", since).splitlines()
+        self.assertEqual(5, len(lines))
+
+    def test_renamed_since(self):
+        since = timezone.now()
+        patient = self.patients[1]
+        patient.last_name = "Renamed"
+        patient.save()
+        lines = self._export("appointments", "ndjson", since).splitlines()
+        self.assertEqual(
+            ["Renamed", "Renamed"],
+            [json.loads(line)["patient__last_name"] for line in lines]
+        )
+        since = timezone.now()
+        self.doctor.last_login = since
+        self.doctor.save(update_fields=["last_login"])
+        self.assertEqual("", self._export("appointments", "csv", since)
+                         .split("\r\n", 1)[1])
+        self.doctor.last_name = "Wilson"
+        self.doctor.save()
+        lines = self._export("appointments", "ndjson", since).splitlines()
+        self.assertEqual(5, len(lines))
+        self.assertEqual("Wilson", json.loads(lines[0])["doctor__last_name"])
+
+    def test_deleted_since(self):
+        since = timezone.now()
+        appointment = Appointment.objects.order_by("pk").first()
+        appointment_id = appointment.pk
+        appointment.delete()
+        patient = self.patients[2]
+        # Deleting a patient fails on the invalid Appointment.patient
+        # default, so send the signal a deletion would.
+        post_delete.send(sender=Patient, instance=patient)
+        lines = self._export("appointments", "ndjson", since).splitlines()
+        self.assertEqual(1, len(lines))
+        row = json.loads(lines[0])
+        self.assertEqual(appointment_id, row["id"])
+        self.assertIsNone(row["purpose"])
+        self.assertIsNotNone(row["deleted"])
+        rows = list(csv.DictReader(io.StringIO(
+            self._export("patients", "csv", since))))
+        self.assertEqual([str(patient.pk)], [row["id"] for row in rows])
+        self.assertEqual("", rows[0]["personal_id"])
+        self.assertNotEqual("", rows[0]["deleted"])
+
+    def test_deleted_only_in_incremental_exports(self):
+        Appointment.objects.order_by("pk").first().delete()
+        rows = list(csv.DictReader(io.StringIO(
+            self._export("appointments", "csv"))))
+        self.assertEqual(4, len(rows))
+        self.assertEqual({""}, {row["deleted"] for row in rows})
+
+    def test_single_query_per_chunk_with_joins(self):
+        with CaptureQueriesContext(connection) as queries:
+            self._export("appointments", "csv")
+        self.assertEqual(1, len(queries))
+        self.assertIn("JOIN", queries[0]["sql"])
+
+    def test_parse_since(self):
+        self.assertEqual(
+            timezone.make_aware(datetime(2020, 1, 2)),
+            parse_since("2020-01-02")
+        )
+        self.assertIsNone(parse_since("yesterday"))
+        self.assertIsNone(parse_since("2020-13-01"))
+
+
+class TestExportCommand(ExportTestCase):
+
+    def test_export_to_stdout(self):
+        out = io.StringIO()
+        err = io.StringIO()
+        call_command(
+            "export_data", "appointments", format="ndjson", stdout=out,
+            stderr=err
+        )
+        self.assertEqual(5, len(out.getvalue().splitlines()))
+        self.assertIn("--since", err.getvalue())
+
+
+class TestExportView(ExportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="admin", is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_stream_csv(self):
+        response = self.client.get("/export/patients")
+        self.assertTrue(response.streaming)
+        self.assertEqual("text/csv", response["Content-Type"])
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(4, len(content.splitlines()))
+
+    def test_since(self):
+        response = self.client.get(
+            "/export/appointments", {"since": "2100-01-01"}
+        )
+        self.assertEqual(b"", b"".join(response.streaming_content)
+                         .split(b"\r\n", 1)[1])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(
+            404, self.client.get("/export/users").status_code
+        )
+        self.assertEqual(
+            400, self.client.get("/export/patients?format=xml").status_code
+        )
+        self.assertEqual(
+            400, self.client.get("/export/patients?since=never").status_code
+        )
+
+    def test_staff_only(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(403, self.client.get("/export/patients").status_code)
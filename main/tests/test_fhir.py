@@ -0,0 +1,362 @@
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..fhir import (DirectoryEndpoint, import_resources, iter_bundle,
+                    pull_resources, read_resources, serialize,
+                    summarize_import)
+from ..models import Appointment, FreeSlot, Schedule
+from patients.models import Address, Patient
+
+
+class FhirTestCase(TestCase):
+
+    def setUp(self):
+        physicians_group = Group.objects.create(name="physicians")
+        self.doctor = User.objects.create(
+            username="doctor", first_name="Gregory", last_name="House"
+        )
+        self.doctor.groups.add(physicians_group)
+        self.patients = [
+            Patient.objects.create(
+                first_name="Johnny",
+                last_name=f"Test{i}",
+                date_of_birth="2022-12-12",
+                personal_id=f"1234567891{i}",
+                email="email@email.com",
+                phone="0123456789",
+                address=Address.objects.create(
+                    street="Test Lane",
+                    number="1",
+                    apartment="2",
+                    zip_code="00-000",
+                    city="Testington",
+                    country="Republic of Testland"
+                ) if i == 0 else None
+            ) for i in range(2)
+        ]
+        Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="12:00",
+            employee=self.doctor
+        )
+        self.appointment = Appointment.objects.create(
+            datetime=self._datetime(time(8)),
+            patient=self.patients[0],
+            doctor=self.doctor,
+            purpose="Toothache"
+        )
+
+    def _datetime(self, hour):
+        return timezone.make_aware(datetime.combine(date(2100, 1, 1), hour))
+
+    def _bundle(self, *args, **kwargs):
+        return json.loads("".join(serialize(*args, **kwargs)))
+
+    def _resources(self, *args, **kwargs):
+        return [
+            json.loads(line)
+            for line in "".join(serialize(*args, **kwargs)).splitlines()
+        ]
+
+    def _import(self, resources, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return summarize_import(import_resources(resources, **kwargs))
+
+
+class TestSerialize(FhirTestCase):
+
+    def test_bundle(self):
+        bundle = self._bundle(["Patient", "Appointment"])
+        self.assertEqual("Bundle", bundle["resourceType"])
+        self.assertEqual("collection", bundle["type"])
+        resources = [entry["resource"] for entry in bundle["entry"]]
+        self.assertEqual(
+            ["Patient", "Patient", "Appointment"],
+            [resource["resourceType"] for resource in resources]
+        )
+        patient = resources[0]
+        self.assertEqual("12345678910", patient["identifier"][0]["value"])
+        self.assertEqual(
+            [{"family": "Test0", "given": ["Johnny"]}], patient["name"]
+        )
+        self.assertEqual(["Test Lane", "1", "2"], patient["address"][0]["line"])
+        self.assertNotIn("address", resources[1])
+
+        appointment = resources[2]
+        self.assertEqual("booked", appointment["status"])
+        self.assertEqual("2100-01-01T08:00:00Z", appointment["start"])
+        self.assertEqual("2100-01-01T08:30:00Z", appointment["end"])
+        self.assertEqual(
+            ["12345678910", "doctor"],
+            [participant["actor"]["identifier"]["value"]
+             for participant in appointment["participant"]]
+        )
+
+    def test_batch_bundle_updates_by_identifier(self):
+        bundle = self._bundle(["Patient"], bundle_type="batch")
+        self.assertEqual(
+            {
+                "method": "PUT",
+                "url": "Patient?identifier=urn:clinic:personal-id|12345678910"
+            },
+            bundle["entry"][0]["request"]
+        )
+
+    def test_ndjson_since(self):
+        since = timezone.now()
+        self.patients[1].phone = "9876543210"
+        self.patients[1].save()
+        resources = self._resources(
+            ["Patient", "Appointment"], "ndjson", since)
+        self.assertEqual(["1234567891"], [
+            resource["identifier"][0]["value"][:-1] for resource in resources
+        ])
+
+    def test_streams_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(serialize(["Appointment"]))
+        self.assertEqual(1, len(queries))
+        self.assertEqual(3, len(chunks))
+
+
+class TestReadResources(FhirTestCase):
+
+    def test_iter_bundle_in_small_reads(self):
+        text = "".join(serialize(["Patient", "Appointment"]))
+        text = text.rstrip()[:-1] + ', "total": 1234567}'
+        header = {}
+        stream = io.StringIO(text)
+        stream.read = lambda size, read=stream.read: read(min(size, 7))
+        entries = list(iter_bundle(stream, header))
+        self.assertEqual(json.loads(text)["entry"], entries)
+        self.assertEqual(1234567, header["total"])
+        self.assertEqual("collection", header["type"])
+
+    def test_invalid_bundle(self):
+        with self.assertRaises(ValueError):
+            list(read_resources(io.StringIO('{"entry": [{"a": 1} {')))
+        with self.assertRaises(ValueError):
+            list(read_resources(io.StringIO("[]")))
+
+    def test_ndjson(self):
+        stream = io.StringIO('{"resourceType": "Patient"}\n\nnot json\n')
+        self.assertEqual(
+            [{"resourceType": "Patient"}, None],
+            list(read_resources(stream, "ndjson"))
+        )
+
+
+class TestImportResources(FhirTestCase):
+
+    def test_round_trip_unchanged(self):
+        resources = self._resources(
+            ["Patient", "Appointment"], "ndjson")
+        modified = Patient.objects.get(pk=self.patients[0].pk).modified
+        summary = self._import(resources)
+        self.assertEqual(3, summary["unchanged"])
+        self.assertEqual(
+            modified, Patient.objects.get(pk=self.patients[0].pk).modified
+        )
+
+    def test_upsert(self):
+        patient, other, appointment = self._resources(
+            ["Patient", "Appointment"], "ndjson")
+        patient["telecom"][0]["value"] = "9876543210"
+        patient["address"][0]["city"] = "Elsewhere"
+        other["address"] = [{"line": ["Main St", "5"], "postalCode": "11-111",
+                             "city": "Othertown", "country": "Testland"}]
+        new = dict(other, identifier=[
+            {"system": "urn:clinic:personal-id", "value": "22345678910"}])
+        appointment["status"] = "fulfilled"
+        new_appointment = json.loads(json.dumps(appointment))
+        new_appointment["start"] = "2100-01-01T10:00:00+01:00"
+        new_appointment["participant"][0]["actor"]["identifier"]["value"] = (
+            "22345678910")
+
+        since = timezone.now()
+        summary = self._import(
+            [patient, other, new, appointment, new_appointment])
+        self.assertEqual(2, summary["created"])
+        self.assertEqual(3, summary["updated"])
+        self.assertEqual([], summary["errors"])
+
+        patient = Patient.objects.select_related("address").get(
+            personal_id="12345678910")
+        self.assertEqual("9876543210", patient.phone)
+        self.assertEqual("Elsewhere", patient.address.city)
+        self.assertGreaterEqual(patient.address.modified, since)
+        other = Patient.objects.get(personal_id="12345678911")
+        self.assertEqual("Othertown", other.address.city)
+        self.assertGreaterEqual(other.modified, since)
+        appointment = Appointment.objects.get(pk=self.appointment.pk)
+        self.assertTrue(appointment.took_place)
+        self.assertGreaterEqual(appointment.modified, since)
+        booked = Appointment.objects.get(patient__personal_id="22345678910")
+        self.assertEqual(self._datetime(time(9)), booked.datetime)
+        self.assertFalse(FreeSlot.objects.filter(
+            datetime=self._datetime(time(9))).exists())
+
+    def test_invalid_resources(self):
+        patient, _, appointment = self._resources(
+            ["Patient", "Appointment"], "ndjson")
+        patient["telecom"][1]["value"] = "not an email"
+        no_start = dict(appointment)
+        del no_start["start"]
+        unknown_doctor = json.loads(json.dumps(appointment))
+        unknown_doctor["participant"][1]["actor"]["identifier"]["value"] = "x"
+        taken = json.loads(json.dumps(appointment))
+        taken["participant"][0]["actor"]["identifier"]["value"] = "12345678911"
+        summary = self._import([
+            patient, no_start, unknown_doctor, taken, None,
+            {"resourceType": "Practitioner"}, {"resourceType": "Patient",
+                                               "telecom": ["phone"]}
+        ])
+        self.assertEqual(7, summary["invalid"])
+        errors = dict(summary["errors"])
+        self.assertIn("email", errors[1])
+        self.assertIn("start", errors[2])
+        self.assertEqual(["Unknown practitioner."], errors[3]["participant"])
+        self.assertEqual(
+            ["Doctor already has an appointment at this time!"],
+            errors[4]["start"]
+        )
+        self.assertIn("resourceType", errors[6])
+
+    def test_fixed_queries_per_batch(self):
+        def resources(count):
+            return [{
+                "resourceType": "Patient",
+                "identifier": [{"system": "urn:clinic:personal-id",
+                                "value": f"{count:02}{i:09}"}],
+                "name": [{"family": "Test", "given": ["Johnny"]}],
+                "birthDate": "2000-01-01",
+                "telecom": [{"system": "phone", "value": "0123456789"},
+                            {"system": "email", "value": "a@example.com"}],
+                "address": [{"line": ["Test Lane", str(i)],
+                             "postalCode": "00-000", "city": "Testington",
+                             "country": "Testland"}],
+            } for i in range(count)]
+
+        counts = []
+        for count in (2, 10):
+            batch = resources(count)
+            self._import(batch)
+            for resource in batch:
+                resource["telecom"][0]["value"] = "9876543210"
+                resource["address"][0]["city"] = "Elsewhere"
+            with CaptureQueriesContext(connection) as queries:
+                summary = self._import(batch + resources(count + 10))
+            self.assertEqual(count, summary["updated"])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_batches(self):
+        resources = self._resources(["Patient"], "ndjson")
+        reports = list(import_resources(resources, batch_size=1))
+        self.assertEqual(2, len(reports))
+
+
+class TestEndpoint(FhirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.endpoint = DirectoryEndpoint(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write(self, resource_type, resources):
+        path = os.path.join(self.directory.name, f"{resource_type}.ndjson")
+        with open(path, "w", encoding="utf-8") as stream:
+            stream.writelines(json.dumps(r) + "\n" for r in resources)
+
+    def test_push_batch_bundle(self):
+        call_command("fhir_export", endpoint=self.directory.name,
+                     stderr=io.StringIO())
+        path = os.path.join(self.directory.name, "Bundle.json")
+        with open(path, encoding="utf-8") as stream:
+            bundle = json.load(stream)
+        self.assertEqual("batch", bundle["type"])
+        self.assertEqual(3, len(bundle["entry"]))
+
+    def test_pull_since(self):
+        patient, other = self._resources(["Patient"], "ndjson")
+        other["meta"]["lastUpdated"] = "2000-01-01T00:00:00Z"
+        self._write("Patient", [patient, other])
+        self._write("Appointment", self._resources(["Appointment"], "ndjson"))
+        resources = list(pull_resources(
+            self.endpoint, since=timezone.now() - timedelta(days=1)))
+        self.assertEqual(
+            ["Patient", "Appointment"],
+            [resource["resourceType"] for resource in resources]
+        )
+
+    def test_import_command_pulls_from_endpoint(self):
+        patient = self._resources(["Patient"], "ndjson")[0]
+        patient["name"][0]["family"] = "Changed"
+        self._write("Patient", [patient])
+        out = io.StringIO()
+        call_command("fhir_import", self.directory.name, endpoint=True,
+                     stdout=out)
+        self.assertIn("1 updated", out.getvalue())
+        self.assertEqual(
+            "Changed", Patient.objects.get(pk=self.patients[0].pk).last_name
+        )
+
+    def test_import_command_reads_bundle_file(self):
+        path = os.path.join(self.directory.name, "export.json")
+        call_command("fhir_export", output=path, stderr=io.StringIO())
+        out = io.StringIO()
+        call_command("fhir_import", path, stdout=out)
+        self.assertIn("3 unchanged", out.getvalue())
+
+
+class TestFhirView(FhirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="admin", is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_searchset_bundle(self):
+        response = self.client.get("/fhir/Patient")
+        self.assertTrue(response.streaming)
+        self.assertEqual("application/fhir+json", response["Content-Type"])
+        bundle = json.loads(b"".join(response.streaming_content))
+        self.assertEqual("searchset", bundle["type"])
+        self.assertEqual(
+            f"http://testserver/fhir/Patient/{self.patients[0].pk}",
+            bundle["entry"][0]["fullUrl"]
+        )
+
+    def test_ndjson_since(self):
+        response = self.client.get(
+            "/fhir/Appointment", {"_format": "ndjson", "_since": "2100-01-01"}
+        )
+        self.assertEqual(b"", b"".join(response.streaming_content))
+
+    def test_invalid_parameters(self):
+        self.assertEqual(404, self.client.get("/fhir/Practitioner").status_code)
+        self.assertEqual(
+            400, self.client.get("/fhir/Patient?_format=xml").status_code
+        )
+        self.assertEqual(
+            400, self.client.get("/fhir/Patient?_since=never").status_code
+        )
+
+    def test_staff_only(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(403, self.client.get("/fhir/Patient").status_code)
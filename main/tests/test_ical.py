@@ -0,0 +1,314 @@
+import io
+import os
+import tempfile
+from datetime import date, datetime, time
+from email.utils import format_datetime
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..ical import (get_feed_doctor_id, get_feed_token, import_shifts,
+                    read_events, reset_feed_token, shift_from_event,
+                    summarize_import)
+from ..models import Appointment, FeedChange, FreeSlot, Schedule
+from ..shifts import rebuild_schedule_free_slots
+from patients.models import Patient
+
+
+# 2100-01-01 is a Friday
+CALENDAR = (
+    "BEGIN:VCALENDAR\r\n"
+    "VERSION:2.0\r\n"
+    "BEGIN:VEVENT\r\n"
+    "UID:1\r\n"
+    "DTSTART;TZID=Europe/Warsaw:21000104T090000\r\n"
+    "DTEND;TZID=Europe/Warsaw:21000104T130000\r\n"
+    "RRULE:FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=21000113\r\n"
+    "ATTENDEE;CN=\"House, Gregory\":mailto:Doctor@\r\n"
+    " clinic.com\r\n"
+    "BEGIN:VALARM\r\n"
+    "TRIGGER:-PT15M\r\n"
+    "END:VALARM\r\n"
+    "END:VEVENT\r\n"
+    "BEGIN:VEVENT\r\n"
+    "UID:2\r\n"
+    "DTSTART:21000101T080000Z\r\n"
+    "DTEND:21000101T100000Z\r\n"
+    "ATTENDEE:mailto:doctor@clinic.com\r\n"
+    "STATUS:CANCELLED\r\n"
+    "END:VEVENT\r\n"
+    "END:VCALENDAR\r\n"
+)
+
+
+class IcalTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        physicians_group = Group.objects.create(name="physicians")
+        self.doctor = User.objects.create(
+            username="doctor", first_name="Gregory", last_name="House",
+            email="doctor@clinic.com"
+        )
+        self.doctor.groups.add(physicians_group)
+        Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="12:00",
+            employee=self.doctor
+        )
+
+    def _import(self, calendar=CALENDAR, **kwargs):
+        return summarize_import(
+            import_shifts(read_events(io.StringIO(calendar)), **kwargs)
+        )
+
+
+# Test data is never committed, so rebuild free slots in the test thread.
+@mock.patch(
+    "main.shifts.start_free_slot_rebuild", rebuild_schedule_free_slots)
+class TestShiftImport(IcalTestCase):
+
+    def test_read_events_unfolds_lines_and_skips_alarms(self):
+        events = list(read_events(io.StringIO(CALENDAR)))
+        self.assertEqual(2, len(events))
+        self.assertEqual(
+            [({"CN": "House, Gregory"}, "mailto:Doctor@clinic.com")],
+            events[0]["ATTENDEE"]
+        )
+        self.assertNotIn("TRIGGER", events[0])
+
+    def test_shift_from_event(self):
+        events = list(read_events(io.StringIO(CALENDAR)))
+        self.assertEqual(
+            {
+                "email": "doctor@clinic.com",
+                "date_from": date(2100, 1, 4),
+                "date_to": date(2100, 1, 13),
+                "weekdays": [0, 2],
+                "start": time(8),
+                "end": time(12),
+                "cancelled": False
+            },
+            shift_from_event(events[0])
+        )
+        self.assertTrue(shift_from_event(events[1])["cancelled"])
+
+    def test_import_upserts_and_cancels_shifts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = self._import()
+        self.assertEqual(
+            (2, 4, 1, 0),
+            (summary["events"], summary["shifts"], summary["cancelled"],
+             summary["invalid"])
+        )
+        self.assertEqual(
+            [date(2100, 1, day) for day in (4, 6, 11, 13)],
+            list(Schedule.objects.order_by("date").values_list(
+                "date", flat=True))
+        )
+        self.assertTrue(FreeSlot.objects.filter(
+            doctor=self.doctor, datetime__date=date(2100, 1, 4)).exists())
+        self.assertFalse(FreeSlot.objects.filter(
+            doctor=self.doctor, datetime__date=date(2100, 1, 1)).exists())
+
+    def test_import_with_fixed_queries(self):
+        with self.assertNumQueries(19), \
+                self.captureOnCommitCallbacks(execute=True):
+            self._import(batch_size=10)
+
+    def test_import_reports_invalid_events(self):
+        calendar = CALENDAR.replace("Doctor@", "nobody@").replace(
+            "DTEND:21000101T100000Z", "DTEND:21000101T070000Z")
+        summary = self._import(calendar)
+        self.assertEqual(2, summary["invalid"])
+        self.assertEqual(
+            [(1, {"ATTENDEE": ["Unknown employee."]}),
+             (2, {"DTEND": [
+                 "Shift must end after it starts on the same day!"]})],
+            sorted(summary["errors"])
+        )
+        self.assertEqual(1, Schedule.objects.count())
+
+    def test_unsupported_rules_are_invalid(self):
+        for rule in ("FREQ=MONTHLY;UNTIL=21000113", "FREQ=WEEKLY;COUNT=3",
+                     "FREQ=WEEKLY;INTERVAL=2;UNTIL=21000113",
+                     "FREQ=WEEKLY;BYDAY=XX;UNTIL=21000113"):
+            calendar = CALENDAR.replace(
+                "FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=21000113", rule)
+            with self.subTest(rule=rule):
+                self.assertEqual(
+                    [1], [number for number, errors
+                          in self._import(calendar)["errors"]]
+                )
+
+    def test_dry_run(self):
+        summary = self._import(dry_run=True)
+        self.assertEqual(4, summary["shifts"])
+        self.assertEqual(1, Schedule.objects.count())
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "shifts.ics")
+            with open(path, "w", encoding="utf-8", newline="") as stream:
+                stream.write(CALENDAR)
+            out = io.StringIO()
+            call_command("import_shifts", path, stdout=out)
+        self.assertIn("2 events", out.getvalue())
+        self.assertIn("4 shifts, 1 cancelled, 0 invalid", out.getvalue())
+        self.assertEqual(4, Schedule.objects.count())
+
+
+class TestAppointmentFeed(IcalTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Secret",
+            date_of_birth="2022-12-12",
+            personal_id="12345678910",
+            email="email@email.com",
+            phone="0123456789"
+        )
+        self.appointments = [
+            Appointment.objects.create(
+                datetime=timezone.make_aware(
+                    datetime.combine(date(2100, 1, 1), time(8 + i))),
+                patient=self.patient,
+                doctor=self.doctor,
+                purpose=f"Toothache, {'long ' * 20}story"
+            ) for i in range(2)
+        ]
+        self.url = reverse(
+            "main:calendar", args=[get_feed_token(self.doctor.pk)])
+
+    def test_feed_token(self):
+        token = get_feed_token(self.doctor.pk)
+        self.assertEqual(self.doctor.pk, get_feed_doctor_id(token))
+        self.assertIsNone(get_feed_doctor_id(token + "x"))
+        response = self.client.get(
+            reverse("main:calendar", args=[token + "x"]))
+        self.assertEqual(404, response.status_code)
+
+    def test_feed_token_differs_per_feed_secret(self):
+        other_doctor = User.objects.create(username="other")
+        other_doctor.groups.add(self.doctor.groups.get())
+        FeedChange.objects.create(
+            doctor=other_doctor,
+            secret=FeedChange.objects.get(doctor=self.doctor).secret
+        )
+        forged = get_feed_token(self.doctor.pk).replace(
+            str(self.doctor.pk), str(other_doctor.pk), 1)
+        self.assertIsNone(get_feed_doctor_id(forged))
+        self.assertNotEqual(forged, get_feed_token(other_doctor.pk))
+
+    def test_reset_feed_token_revokes_url(self):
+        token = get_feed_token(self.doctor.pk)
+        reset_feed_token(self.doctor.pk)
+        self.assertIsNone(get_feed_doctor_id(token))
+        self.assertEqual(404, self.client.get(self.url).status_code)
+        self.assertEqual(
+            200,
+            self.client.get(reverse(
+                "main:calendar", args=[get_feed_token(self.doctor.pk)]
+            )).status_code
+        )
+
+    def test_inactive_doctor_feed_not_found(self):
+        self.doctor.is_active = False
+        self.doctor.save()
+        self.assertEqual(404, self.client.get(self.url).status_code)
+
+    def test_former_physician_feed_not_found(self):
+        self.doctor.groups.clear()
+        self.assertEqual(404, self.client.get(self.url).status_code)
+
+    def test_feed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            "text/calendar; charset=utf-8", response["Content-Type"])
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+        content = response.content.decode()
+        self.assertTrue(content.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertEqual(2, content.count("BEGIN:VEVENT"))
+        self.assertIn(
+            f"UID:appointment-{self.appointments[0].pk}\r\n", content)
+        self.assertIn("DTSTART:21000101T080000Z\r\n", content)
+        self.assertIn("DTEND:21000101T083000Z\r\n", content)
+        self.assertIn("DESCRIPTION:Toothache\\, long", content)
+        self.assertNotIn("Secret", content)
+        self.assertTrue(all(
+            len(line.encode()) <= 75 for line in content.split("\r\n")
+        ))
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            etag_response = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(304, etag_response.status_code)
+        date_response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(304, date_response.status_code)
+
+    def test_changes_modify_feed(self):
+        response = self.client.get(self.url)
+        self.appointments[0].took_place = False
+        self.appointments[0].save()
+        changed = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(200, changed.status_code)
+        self.assertIn("STATUS:CANCELLED", changed.content.decode())
+
+        self.appointments[1].delete()
+        deleted = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=changed["ETag"])
+        self.assertEqual(200, deleted.status_code)
+        self.assertEqual(1, deleted.content.decode().count("BEGIN:VEVENT"))
+
+    def test_removal_modifies_feed_after_last_modified(self):
+        response = self.client.get(self.url)
+        self.appointments[1].delete()
+        last_modified = format_datetime(
+            timezone.now() - timezone.timedelta(seconds=1), usegmt=True)
+        self.assertNotEqual(
+            304,
+            self.client.get(
+                self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code
+        )
+        self.assertNotEqual(response["ETag"], self.client.get(self.url)["ETag"])
+
+    def test_state_kept_in_database(self):
+        self.appointments[1].delete()
+        response = self.client.get(self.url)
+        cache.clear()
+        self.assertEqual(
+            304,
+            self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code
+        )
+        self.assertEqual(
+            response["Last-Modified"],
+            self.client.get(self.url)["Last-Modified"]
+        )
+
+    def test_empty_feed(self):
+        Appointment.objects.all().delete()
+        FeedChange.objects.update(changed=None)
+        response = self.client.get(self.url)
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(response["ETag"], self.client.get(self.url)["ETag"])
+
+    def test_doctor_sees_feed_url(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse("main:main"))
+        self.assertIn(self.url, response.content.decode())
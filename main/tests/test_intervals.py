@@ -0,0 +1,56 @@
+from django.test import SimpleTestCase
+
+from ..intervals import IntervalIndex, subtract_intervals
+
+
+class TestIntervalIndex(SimpleTestCase):
+
+    def setUp(self):
+        self.index = IntervalIndex([(10, 20), (30, 40), (0, 5)])
+
+    def test_len(self):
+        self.assertEqual(3, len(self.index))
+
+    def test_overlaps(self):
+        self.assertTrue(self.index.overlaps(15, 16))
+        self.assertTrue(self.index.overlaps(19, 31))
+        self.assertTrue(self.index.overlaps(-5, 1))
+
+    def test_touching_intervals_do_not_overlap(self):
+        self.assertFalse(self.index.overlaps(20, 30))
+        self.assertFalse(self.index.overlaps(5, 10))
+        self.assertFalse(self.index.overlaps(40, 50))
+
+    def test_empty_interval_does_not_overlap(self):
+        self.assertFalse(self.index.overlaps(15, 15))
+
+    def test_long_interval_hidden_behind_short_ones(self):
+        index = IntervalIndex([(0, 100), (10, 11), (20, 21)])
+        self.assertTrue(index.overlaps(50, 60))
+
+    def test_add(self):
+        self.index.add(22, 25)
+        self.assertTrue(self.index.overlaps(24, 26))
+        self.index.add(-10, 35)
+        self.assertTrue(self.index.overlaps(25, 26))
+
+    def test_empty_index(self):
+        self.assertFalse(IntervalIndex().overlaps(0, 10))
+
+
+class TestSubtractIntervals(SimpleTestCase):
+
+    def test_split_interval(self):
+        result = subtract_intervals([(0, 10)], [(3, 5)])
+        self.assertEqual([(0, 3), (5, 10)], result)
+
+    def test_removed_overlapping_ends(self):
+        result = subtract_intervals([(0, 10), (20, 30)], [(8, 22), (-5, 2)])
+        self.assertEqual([(2, 8), (22, 30)], result)
+
+    def test_removed_whole_interval(self):
+        self.assertEqual([], subtract_intervals([(3, 5)], [(0, 10)]))
+
+    def test_nothing_removed(self):
+        result = subtract_intervals([(5, 10), (0, 3)], [(3, 5), (7, 7)])
+        self.assertEqual([(0, 3), (5, 10)], result)
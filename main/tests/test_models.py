@@ -1,4 +1,4 @@
-from datetime import date
+from datetime import date, datetime
 
 from django.contrib.auth.models import User, Group
 from django.core.exceptions import ValidationError
@@ -7,7 +7,9 @@ from django.test import TestCase
 from django.utils import timezone
 
 from patients.models import Patient
+from ..forms import AppointmentModelForm
 from ..models import Schedule, Appointment
+from ..validators import is_physician
 
 
 class TestSchedule(TestCase):
@@ -127,3 +129,159 @@ class TestAppointment(TestCase):
             took_place=None
         )
         self.assertEqual(len(Appointment.objects.all()), 1)
+
+
+class TestAppointmentDuration(TestCase):
+
+    def setUp(self):
+        physicians_group = Group.objects.create(name="physicians")
+        self.doctor = User.objects.create_user(username="Doctor")
+        self.doctor.groups.add(physicians_group)
+        self.patients = [
+            Patient.objects.create(
+                first_name="Johnny",
+                last_name="Test",
+                date_of_birth="2022-12-12",
+                personal_id=f"1234567891{i}",
+                email="email@email.com",
+                phone="0123456789",
+                address=None
+            ) for i in range(2)
+        ]
+        Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="16:00",
+            employee=self.doctor
+        )
+
+    def _book(self, hour, minute=0, visit_type="consultation", patient=0):
+        return Appointment.objects.create(
+            datetime=timezone.make_aware(datetime(2100, 1, 1, hour, minute)),
+            patient=self.patients[patient],
+            doctor=self.doctor,
+            purpose="Toothache",
+            visit_type=visit_type
+        )
+
+    def test_duration_defaults_to_visit_type_duration(self):
+        self.assertEqual(30, self._book(8).duration)
+        self.assertEqual(90, self._book(9, visit_type="procedure").duration)
+
+    def test_overlapping_doctor_appointment_not_possible(self):
+        self._book(8, visit_type="examination")
+        with self.assertRaises(ValidationError):
+            self._book(8, 30, patient=1)
+
+    def test_overlapping_patient_appointment_not_possible(self):
+        other_doctor = User.objects.create_user(username="Other")
+        other_doctor.groups.add(Group.objects.get(name="physicians"))
+        Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="16:00",
+            employee=other_doctor
+        )
+        self._book(8, visit_type="examination")
+        with self.assertRaises(ValidationError):
+            Appointment.objects.create(
+                datetime=timezone.make_aware(datetime(2100, 1, 1, 8, 30)),
+                patient=self.patients[0],
+                doctor=other_doctor,
+                purpose="Toothache"
+            )
+
+    def test_adjacent_appointments_possible(self):
+        self._book(8, visit_type="examination")
+        self._book(9, patient=1)
+        self.assertEqual(2, Appointment.objects.count())
+
+    def test_overlap_check_does_not_load_doctor(self):
+        self._book(8, visit_type="examination")
+        appointment = Appointment(
+            datetime=timezone.make_aware(datetime(2100, 1, 1, 8, 30)),
+            patient_id=self.patients[1].pk,
+            doctor_id=self.doctor.pk,
+            purpose="Toothache"
+        )
+        with self.assertNumQueries(1):
+            with self.assertRaises(ValidationError):
+                appointment._check_overlaps()
+
+    def test_saving_appointment_does_not_conflict_with_itself(self):
+        appointment = self._book(8, visit_type="examination")
+        appointment.diagnosis = "Caries"
+        appointment.save()
+
+
+class TestAppointmentValidationOnChange(TestCase):
+
+    def setUp(self):
+        physicians_group = Group.objects.create(name="physicians")
+        self.doctor = User.objects.create_user(username="Doctor")
+        self.doctor.groups.add(physicians_group)
+        patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678911",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        self.schedule = Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="16:00",
+            employee=self.doctor
+        )
+        appointment = Appointment.objects.create(
+            datetime=timezone.make_aware(datetime(2100, 1, 1, 8)),
+            patient=patient,
+            doctor=self.doctor,
+            purpose="Toothache"
+        )
+        self.appointment = Appointment.objects.get(pk=appointment.pk)
+
+    def test_saving_notes_skips_validation(self):
+        self.schedule.delete()
+        self.appointment.diagnosis = "Caries"
+        with self.assertNumQueries(1):
+            self.appointment.save()
+
+    def test_saving_notes_from_form_skips_validation(self):
+        appointment = Appointment.objects.select_related(
+            "doctor", "patient").get(pk=self.appointment.pk)
+        form = AppointmentModelForm({
+            "datetime": appointment.datetime,
+            "purpose": appointment.purpose,
+            "examination": "Checked",
+            "diagnosis": "Caries",
+            "advice": "Brush teeth",
+            "took_place": True
+        }, instance=appointment)
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid(), form.errors)
+            form.save()
+
+    def test_changed_doctor_validated(self):
+        self.appointment.doctor = User.objects.create_user(username="Nurse")
+        with self.assertRaises(ValidationError) as context:
+            self.appointment.full_clean()
+        self.assertIn("doctor", context.exception.message_dict)
+
+    def test_changed_datetime_validated(self):
+        self.appointment.datetime = timezone.make_aware(
+            datetime(2100, 1, 2, 8))
+        with self.assertRaisesMessage(ValidationError, "not on schedule"):
+            self.appointment.save()
+
+    def test_physician_validator_single_query(self):
+        with self.assertNumQueries(1):
+            is_physician(self.doctor.id)
+
+    def test_physician_removed_from_group_not_valid(self):
+        is_physician(self.doctor.id)
+        self.doctor.groups.clear()
+        with self.assertRaises(ValidationError):
+            is_physician(self.doctor.id)
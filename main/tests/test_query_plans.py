@@ -0,0 +1,108 @@
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from patients.models import Patient
+from ..models import Appointment, Schedule
+from ..query_plans import get_hot_querysets, get_sequential_scans
+
+
+class TestGetSequentialScans(SimpleTestCase):
+
+    def test_sqlite_plan(self):
+        plan = "2 0 0 SCAN main_appointment\n"\
+            "5 0 0 SCAN auth_user USING INDEX auth_user_idx\n"\
+            "7 0 0 SCAN TABLE main_schedule"
+        self.assertEqual(
+            ["main_appointment", "main_schedule"],
+            get_sequential_scans(plan, "sqlite")
+        )
+
+    def test_sqlite_index_search(self):
+        plan = "4 0 0 SEARCH main_appointment USING INDEX idx (doctor_id=?)"
+        self.assertEqual([], get_sequential_scans(plan, "sqlite"))
+
+    def test_postgresql_plan(self):
+        plan = "Sort\n  ->  Seq Scan on main_appointment  (cost=0.00..1.01)"
+        self.assertEqual(
+            ["main_appointment"],
+            get_sequential_scans(plan, "postgresql")
+        )
+
+    def test_unsupported_vendor(self):
+        self.assertEqual([], get_sequential_scans("SCAN x", "oracle"))
+
+
+class TestHotQueryPlans(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.specialty = Group.objects.create(name="dentists")
+        doctors = User.objects.bulk_create(
+            User(username=f"doctor_{i}") for i in range(20)
+        )
+        cls.specialty.user_set.add(*doctors)
+        patients = Patient.objects.bulk_create(
+            Patient(
+                first_name="Johnny",
+                last_name=str(i),
+                date_of_birth=date(1970, 1, 1),
+                personal_id=f"{i:011d}",
+                email="email@email.com",
+                phone="0123456789"
+            ) for i in range(50)
+        )
+        Schedule.objects.bulk_create(
+            Schedule(
+                date=date(2100, 1, 1) + timedelta(days=day),
+                start=time(8),
+                end=time(16),
+                employee=doctor
+            ) for doctor in doctors for day in range(20)
+        )
+        Appointment.objects.bulk_create(
+            Appointment(
+                datetime=timezone.make_aware(
+                    datetime(2100, 1, 1, 8) + timedelta(minutes=30 * i)),
+                patient=patients[i % len(patients)],
+                doctor=doctors[i % len(doctors)],
+                purpose="Toothache",
+                took_place=True if i % 3 else None,
+                duration=30
+            ) for i in range(1000)
+        )
+        cls.querysets = get_hot_querysets(
+            doctors[0].id, patients[0].id, cls.specialty.id, date(2100, 1, 2)
+        )
+
+    def test_no_sequential_scans(self):
+        for name, queryset in self.querysets.items():
+            with self.subTest(name):
+                self.assertEqual(
+                    [], get_sequential_scans(queryset.explain())
+                )
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite plan format")
+    def test_appointment_indexes_used(self):
+        self.assertIn(
+            "appointment_doctor_pending",
+            self.querysets["next_appointment"].explain()
+        )
+        self.assertIn(
+            "appointment_patient_datetime",
+            self.querysets["treatment_history"].explain()
+        )
+
+    def test_explain_queries_command(self):
+        out = StringIO()
+        call_command(
+            "explain_queries", "--fail-on-seq-scan",
+            specialty=self.specialty.id, stdout=out
+        )
+        self.assertIn("== next_appointment", out.getvalue())
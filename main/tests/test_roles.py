@@ -0,0 +1,94 @@
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from clinic_management_system.context_processors import get_user_group
+from ..roles import get_roles, get_user_roles, is_doctor, is_nurse
+from ..validators import is_physician
+
+
+class TestRoles(TestCase):
+
+    def setUp(self):
+        self.nurses_group = Group.objects.create(name="Nurses")
+        self.physicians_group = Group.objects.create(name="physicians")
+        self.user = User.objects.create_user(
+            username="test_name",
+            password="test_pw"
+        )
+        self.user.groups.add(self.nurses_group)
+
+    def test_get_roles_lower_case(self):
+        self.assertEqual(frozenset({"nurses"}), get_roles(self.user.pk))
+
+    def test_get_roles_not_cached_across_requests(self):
+        get_roles(self.user.pk)
+        # bulk delete sends no m2m_changed, like a change in another process
+        User.groups.through.objects.filter(user=self.user).delete()
+        self.assertEqual(frozenset(), get_roles(self.user.pk))
+
+    def test_get_user_roles_once_per_user_object(self):
+        user = User.objects.get(pk=self.user.pk)
+        get_user_roles(user)
+        user._roles = frozenset({"physicians"})
+        self.assertTrue(is_doctor(user))
+        self.assertFalse(is_nurse(user))
+
+    def test_anonymous_user_has_no_roles(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(frozenset(), get_user_roles(AnonymousUser()))
+
+    def test_group_added_invalidates_roles(self):
+        get_roles(self.user.pk)
+        self.user.groups.add(self.physicians_group)
+        self.assertIn("physicians", get_roles(self.user.pk))
+
+    def test_group_removed_from_reverse_side_invalidates_roles(self):
+        get_roles(self.user.pk)
+        self.nurses_group.user_set.remove(self.user)
+        self.assertEqual(frozenset(), get_roles(self.user.pk))
+
+    def test_group_cleared_from_reverse_side_invalidates_roles(self):
+        get_roles(self.user.pk)
+        self.nurses_group.user_set.clear()
+        self.assertEqual(frozenset(), get_roles(self.user.pk))
+
+    def test_group_renamed_invalidates_roles(self):
+        get_roles(self.user.pk)
+        self.nurses_group.name = "midwives"
+        self.nurses_group.save()
+        self.assertEqual(frozenset({"midwives"}), get_roles(self.user.pk))
+
+    def test_group_deleted_invalidates_roles(self):
+        get_roles(self.user.pk)
+        self.nurses_group.delete()
+        self.assertEqual(frozenset(), get_roles(self.user.pk))
+
+    def test_is_physician_validator(self):
+        with self.assertRaises(ValidationError):
+            is_physician(self.user.pk)
+        self.user.groups.add(self.physicians_group)
+        is_physician(self.user.pk)
+
+    def test_context_processor_shares_request_roles(self):
+        request = RequestFactory().get("/")
+        request.user = User.objects.get(pk=self.user.pk)
+        get_user_roles(request.user)
+        with self.assertNumQueries(0):
+            result = get_user_group(request)
+        self.assertEqual({"is_nurse": True, "is_doctor": False}, result)
+
+    def _count_role_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(path)
+        return sum(
+            "auth_user_groups" in query["sql"]
+            for query in queries.captured_queries
+        )
+
+    def test_page_resolves_roles_once(self):
+        self.client.force_login(self.user)
+        self.assertEqual(1, self._count_role_queries("/schedule/search"))
+        self.assertEqual(1, self._count_role_queries("/schedule/search"))
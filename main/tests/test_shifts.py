@@ -0,0 +1,218 @@
+import threading
+from datetime import date, datetime, time
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..forms import ShiftTemplateForm
+from ..models import Appointment, FreeSlot, Schedule
+from ..shifts import (REBUILD_THREAD_NAME, expand_shifts, preview_shifts,
+                      rebuild_schedule_free_slots, save_shifts)
+from patients.models import Patient
+
+
+class ShiftsTestCase(TestCase):
+
+    def setUp(self):
+        physicians_group = Group.objects.create(name="physicians")
+        self.doctors = [
+            User.objects.create(username=f"doctor{i}", first_name="Gregory",
+                                last_name=f"House{i}")
+            for i in range(2)
+        ]
+        physicians_group.user_set.add(*self.doctors)
+        # 2100-01-01 is a Friday
+        Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="10:00",
+            employee=self.doctors[0]
+        )
+
+    def _expand(self, weekdays=range(5), start=time(8), end=time(12)):
+        return expand_shifts(
+            [doctor.pk for doctor in self.doctors], date(2100, 1, 1),
+            date(2100, 1, 10), weekdays, start, end
+        )
+
+
+# Test data is never committed, so rebuild free slots in the test thread.
+@mock.patch(
+    "main.shifts.start_free_slot_rebuild", rebuild_schedule_free_slots)
+class TestShifts(ShiftsTestCase):
+
+    def test_expand_shifts_on_weekdays(self):
+        shifts = self._expand()
+        self.assertEqual(12, len(shifts))
+        self.assertEqual(
+            {date(2100, 1, day) for day in (1, 4, 5, 6, 7, 8)},
+            {shift.date for shift in shifts}
+        )
+        self.assertEqual(
+            [(date(2100, 1, 2), self.doctors[0].pk)],
+            [(shift.date, shift.employee_id)
+             for shift in self._expand(weekdays=[5])][:1]
+        )
+
+    def test_preview(self):
+        preview = preview_shifts(self._expand(), limit=3)
+        self.assertEqual(
+            (12, 11, 1, 0),
+            (preview["total"], preview["new"], preview["changed"],
+             preview["unchanged"])
+        )
+        self.assertEqual(3, len(preview["rows"]))
+        self.assertEqual("Gregory House0", preview["rows"][0]["employee"])
+        self.assertEqual((time(8), time(10)), preview["rows"][0]["saved"])
+        self.assertIsNone(preview["rows"][1]["saved"])
+
+    def test_save_upserts_existing_shift(self):
+        existing = Schedule.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(12, save_shifts(self._expand()))
+        self.assertEqual(12, Schedule.objects.count())
+        existing.refresh_from_db()
+        self.assertEqual(time(12), existing.end)
+        self.assertEqual(8, FreeSlot.objects.filter(schedule=existing).count())
+        self.assertEqual(12 * 8, FreeSlot.objects.count())
+
+    def test_save_keeps_booked_slots_taken(self):
+        Appointment.objects.create(
+            datetime=timezone.make_aware(datetime(2100, 1, 1, 8)),
+            patient=Patient.objects.create(
+                first_name="Johnny",
+                last_name="Test",
+                date_of_birth="2022-12-12",
+                personal_id="12345678911",
+                email="email@email.com",
+                phone="0123456789"
+            ),
+            doctor=self.doctors[0],
+            purpose="Toothache"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            save_shifts(self._expand())
+        self.assertFalse(FreeSlot.objects.filter(
+            doctor=self.doctors[0],
+            datetime=timezone.make_aware(datetime(2100, 1, 1, 8))
+        ).exists())
+        self.assertEqual(12 * 8 - 1, FreeSlot.objects.count())
+
+    def test_save_rebuilds_changed_shifts_after_commit(self):
+        existing = Schedule.objects.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            save_shifts(self._expand())
+        self.assertFalse(FreeSlot.objects.exists())
+        self.assertEqual(1, len(callbacks))
+        callbacks[0]()
+        self.assertEqual(8, FreeSlot.objects.filter(schedule=existing).count())
+        with self.captureOnCommitCallbacks() as callbacks:
+            save_shifts(self._expand())
+        self.assertEqual([], callbacks)
+        self.assertEqual(12 * 8, FreeSlot.objects.count())
+
+    def test_save_queries_independent_of_shift_count(self):
+        counts = []
+        for end_day in (2, 20):
+            with CaptureQueriesContext(connection) as queries, \
+                    self.captureOnCommitCallbacks(execute=True):
+                save_shifts(expand_shifts(
+                    [doctor.pk for doctor in self.doctors],
+                    date(2100, 2, 1), date(2100, 2, end_day), range(7),
+                    time(8), time(9)
+                ))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_form_validation(self):
+        data = {
+            "employees": [self.doctors[0].pk],
+            "date_from": "2100-01-01",
+            "date_to": "2100-03-31",
+            "weekdays": ["0", "4"],
+            "start": "08:00",
+            "end": "16:00"
+        }
+        form = ShiftTemplateForm(data)
+        self.assertTrue(form.is_valid())
+        self.assertEqual([0, 4], form.get_shift()["weekdays"])
+        self.assertFalse(ShiftTemplateForm({**data, "end": "07:00"}).is_valid())
+        self.assertFalse(
+            ShiftTemplateForm({**data, "date_to": "2099-12-31"}).is_valid())
+        self.assertFalse(
+            ShiftTemplateForm({**data, "date_to": "2101-12-31"}).is_valid())
+
+
+@mock.patch(
+    "main.shifts.start_free_slot_rebuild", rebuild_schedule_free_slots)
+class TestScheduleAdmin(ShiftsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser(username="admin"))
+        self.data = {
+            "employees": [doctor.pk for doctor in self.doctors],
+            "date_from": "2100-01-01",
+            "date_to": "2100-01-10",
+            "weekdays": ["0", "1", "2", "3", "4"],
+            "start": "08:00",
+            "end": "12:00"
+        }
+
+    def test_preview(self):
+        response = self.client.post(
+            "/admin/main/schedule/generate/", {**self.data, "_preview": "1"}
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(12, response.context["preview"]["total"])
+        self.assertEqual(1, Schedule.objects.count())
+
+    def test_generate(self):
+        response = self.client.post(
+            "/admin/main/schedule/generate/", {**self.data, "_save": "1"}
+        )
+        self.assertRedirects(response, "/admin/main/schedule/")
+        self.assertEqual(12, Schedule.objects.count())
+
+    def test_generate_requires_add_permission(self):
+        staff = User.objects.create_user(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get("/admin/main/schedule/generate/")
+        self.assertEqual(403, response.status_code)
+
+    def test_add_date_range(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/admin/main/schedule/add/", {
+                "date": "2100-01-01",
+                "date_to_year": "2100",
+                "date_to_month": "1",
+                "date_to_day": "5",
+                "start": "08:00",
+                "end": "09:00",
+                "employee": self.doctors[1].pk
+            })
+        self.assertEqual(302, response.status_code)
+        self.assertEqual(
+            5, Schedule.objects.filter(employee=self.doctors[1]).count()
+        )
+        self.assertEqual(
+            10, FreeSlot.objects.filter(doctor=self.doctors[1]).count()
+        )
+
+
+class TestFreeSlotRebuildThread(TransactionTestCase):
+
+    def test_rebuild_in_thread_after_commit(self):
+        doctor = User.objects.create(username="doctor")
+        save_shifts(expand_shifts(
+            [doctor.pk], date(2100, 1, 4), date(2100, 1, 5), range(5),
+            time(8), time(10)
+        ))
+        for thread in threading.enumerate():
+            if thread.name == REBUILD_THREAD_NAME:
+                thread.join()
+        self.assertEqual(8, FreeSlot.objects.count())
@@ -0,0 +1,156 @@
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth.models import User, Group
+from django.test import TestCase
+from django.utils import timezone
+
+from patients.models import Patient
+from ..models import Absence, Appointment, Break, FreeSlot, Schedule
+
+
+class TestFreeSlotSignals(TestCase):
+
+    def setUp(self):
+        self.physicians_group = Group.objects.create(name="physicians")
+        self.doctor = User.objects.create(username="doctor")
+        self.doctor.groups.add(self.physicians_group)
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678911",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        self.schedule = Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start="08:00",
+            end="10:00",
+            employee=self.doctor
+        )
+
+    def _free_hours(self):
+        return [
+            timezone.make_naive(slot_datetime).time()
+            for slot_datetime in FreeSlot.objects.order_by(
+                "datetime").values_list("datetime", flat=True)
+        ]
+
+    def _book(self, hour, visit_type="consultation"):
+        return Appointment.objects.create(
+            datetime=timezone.make_aware(datetime.combine(date(2100, 1, 1), hour)),
+            patient=self.patient,
+            doctor=self.doctor,
+            purpose="Toothache",
+            visit_type=visit_type
+        )
+
+    def test_schedule_saved_creates_free_slots(self):
+        self.assertEqual(
+            [time(8), time(8, 30), time(9), time(9, 30)],
+            self._free_hours()
+        )
+
+    def test_schedule_changed_rebuilds_free_slots(self):
+        self.schedule.end = "09:00"
+        self.schedule.save()
+        self.assertEqual([time(8), time(8, 30)], self._free_hours())
+
+    def test_schedule_deleted_removes_free_slots(self):
+        self.schedule.delete()
+        self.assertEqual([], self._free_hours())
+
+    def test_appointment_created_takes_free_slot(self):
+        self._book(time(8, 30))
+        self.assertEqual([time(8), time(9), time(9, 30)], self._free_hours())
+
+    def test_appointment_deleted_releases_free_slot(self):
+        self._book(time(8, 30)).delete()
+        self.assertEqual(
+            [time(8), time(8, 30), time(9), time(9, 30)],
+            self._free_hours()
+        )
+
+    def test_appointment_moved_updates_free_slots(self):
+        appointment = self._book(time(8, 30))
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.datetime = timezone.make_aware(datetime(2100, 1, 1, 9))
+        appointment.save()
+        self.assertEqual([time(8), time(8, 30), time(9, 30)], self._free_hours())
+
+    def test_appointment_notes_saved_keeps_free_slots(self):
+        appointment = Appointment.objects.get(pk=self._book(time(8, 30)).pk)
+        appointment.diagnosis = "Caries"
+        appointment.save()
+        self.assertEqual([time(8), time(9), time(9, 30)], self._free_hours())
+
+    def test_longer_appointment_takes_every_overlapped_slot(self):
+        self._book(time(8, 30), visit_type="examination")
+        self.assertEqual([time(8), time(9, 30)], self._free_hours())
+
+    def test_longer_appointment_deleted_releases_slots(self):
+        self._book(time(8, 30), visit_type="examination").delete()
+        self.assertEqual(
+            [time(8), time(8, 30), time(9), time(9, 30)],
+            self._free_hours()
+        )
+
+    def test_break_saved_removes_free_slots(self):
+        Break.objects.create(
+            employee=self.doctor, start=time(8, 30), end=time(9)
+        )
+        self.assertEqual([time(8), time(9), time(9, 30)], self._free_hours())
+
+    def test_break_moved_rebuilds_free_slots(self):
+        employee_break = Break.objects.create(
+            employee=self.doctor, start=time(8, 30), end=time(9),
+            date=date(2100, 1, 1)
+        )
+        employee_break = Break.objects.get(pk=employee_break.pk)
+        employee_break.date = date(2100, 1, 2)
+        employee_break.save()
+        self.assertEqual(
+            [time(8), time(8, 30), time(9), time(9, 30)],
+            self._free_hours()
+        )
+
+    def test_weekday_break_applies_to_matching_days_only(self):
+        Break.objects.create(
+            employee=self.doctor, start=time(8), end=time(9), weekday=3
+        )
+        self.assertEqual(4, len(self._free_hours()))
+        Break.objects.create(
+            employee=self.doctor, start=time(8), end=time(9), weekday=4
+        )
+        self.assertEqual([time(9), time(9, 30)], self._free_hours())
+
+    def test_recurring_break_skips_past_schedules(self):
+        past_schedule = Schedule.objects.create(
+            date=timezone.localdate() - timedelta(days=7),
+            start="08:00",
+            end="10:00",
+            employee=self.doctor
+        )
+        FreeSlot.objects.filter(schedule=past_schedule).delete()
+        Break.objects.create(
+            employee=self.doctor, start=time(8), end=time(9)
+        )
+        Break.objects.create(
+            employee=self.doctor, start=time(9), end=time(9, 30),
+            weekday=past_schedule.date.weekday()
+        )
+        self.assertFalse(
+            FreeSlot.objects.filter(schedule=past_schedule).exists()
+        )
+        self.assertNotIn(time(8), self._free_hours())
+
+    def test_absence_removes_and_restores_free_slots(self):
+        absence = Absence.objects.create(
+            employee=self.doctor,
+            date_from=date(2099, 12, 30),
+            date_to=date(2100, 1, 2)
+        )
+        self.assertEqual([], self._free_hours())
+        absence.delete()
+        self.assertEqual(4, len(self._free_hours()))
@@ -1,10 +1,20 @@
 from datetime import datetime, time, date
-from unittest.mock import patch, Mock, MagicMock
+from importlib import import_module
+from unittest.mock import patch, Mock
 
+from django.apps import apps
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
 
-from ..utils import (get_appointment_times, get_day_schedule,
-                     get_next_appointment, is_appointment_available)
+from patients.models import Patient
+from ..models import Absence, Appointment, Break, FreeSlot, Schedule
+from ..bitmaps import get_shift_bitmap, get_times_bitmap
+from ..utils import (compute_free_bitmaps, get_appointment_times,
+                     get_booked_appointments, get_day_schedule,
+                     get_earliest_free_slots, get_free_bitmaps,
+                     get_working_intervals, rebuild_free_slots,
+                     release_free_slot, take_free_slot)
 
 
 class TestGetAppointmentTimes(TestCase):
@@ -18,96 +28,317 @@ class TestGetAppointmentTimes(TestCase):
         expected = [time(8), time(8, 30)]
         self.assertEqual(expected, result)
 
+    def test_get_appointment_times_off_grid_start(self):
+        schedule = Schedule(
+            date=date(2100, 1, 1),
+            start=time(8, 15),
+            end=time(9, 30)
+        )
+        result = get_appointment_times(schedule)
+        self.assertEqual([time(8, 30), time(9)], result)
+
+    def test_get_appointment_times_skips_breaks(self):
+        schedule = Schedule(
+            date=date(2100, 1, 1),
+            start=time(8),
+            end=time(10)
+        )
+        result = get_appointment_times(schedule, [(time(8, 30), time(9, 15))])
+        self.assertEqual([time(8), time(9, 30)], result)
+
 
 class TestGetDaySchedule(TestCase):
 
-    @patch("main.utils.is_appointment_available", return_value=True)
-    @patch("main.utils._sort_day_schedule_by_hour", return_value=["10", "8", "9"])
-    @patch("main.models.Schedule")
-    @patch("main.utils.get_appointment_times", return_value=["8", "9", "10"])
-    def test_get_day_schedule(
-            self, mock_appointments, mock_schedule, mock_sort_hour,
-            mock_is_appointment_available):
-        mock_schedule.emp_full_name.return_value = "Teston Testingly"
-        mock_schedule.employee.id = "1"
-        mock_schedule.date = "2023-01-01"
-        result = get_day_schedule([mock_schedule])
+    def setUp(self):
+        self.mock_schedule = Mock()
+        self.mock_schedule.emp_full_name.return_value = "Teston Testingly"
+        self.mock_schedule.employee.id = 1
+        self.mock_schedule.employee_id = 1
+        self.mock_schedule.date = date(2100, 1, 1)
+
+    @patch(
+        "main.utils.get_cached_free_bitmaps",
+        return_value={(1, date(2100, 1, 1)): get_times_bitmap(
+            [time(10), time(8), time(9)])}
+    )
+    def test_get_day_schedule(self, mock_free_bitmaps):
+        result = get_day_schedule([self.mock_schedule])
         expected = [
             {
-                "employee_id": "1",
-                "employee_full_name": "Teston Testingly",
-                "date": "2023-01-01",
-                "hour": "8",
-            }, {
-                "employee_id": "1",
-                "employee_full_name": "Teston Testingly",
-                "date": "2023-01-01",
-                "hour": "9",
-            }, {
-                "employee_id": "1",
+                "employee_id": 1,
                 "employee_full_name": "Teston Testingly",
-                "date": "2023-01-01",
-                "hour": "10",
-            }
+                "date": date(2100, 1, 1),
+                "hour": hour,
+            } for hour in (time(8), time(9), time(10))
         ]
         self.assertEqual(expected, result)
 
-    @patch("main.utils.is_appointment_available", return_value=False)
-    @patch("main.models.Schedule")
-    @patch("main.utils.get_appointment_times", return_value=["8", "9", "10"])
-    def test_get_day_schedule_appointment_unavailable(
-            self, mock_appointments, mock_schedule,
-            mock_is_appointment_available):
-        expected = []
-        result = get_day_schedule([mock_schedule])
-        self.assertEqual(expected, result)
+    @patch(
+        "main.utils.get_cached_free_bitmaps",
+        return_value={
+            (1, date(2100, 1, 1)): get_times_bitmap([time(9), time(10)]),
+            (2, date(2100, 1, 1)): get_times_bitmap([time(8), time(9)]),
+        }
+    )
+    def test_get_day_schedule_ordered_by_hour(self, mock_free_bitmaps):
+        other_schedule = Mock()
+        other_schedule.employee.id = 2
+        other_schedule.employee_id = 2
+        other_schedule.date = date(2100, 1, 1)
+        result = get_day_schedule([self.mock_schedule, other_schedule])
+        slots = [(slot["hour"], slot["employee_id"]) for slot in result]
+        expected = [
+            (time(8), 2), (time(9), 1), (time(9), 2), (time(10), 1)
+        ]
+        self.assertEqual(expected, slots)
 
+    @patch("main.utils.get_cached_free_bitmaps", return_value={})
+    def test_get_day_schedule_no_free_slots(self, mock_free_bitmaps):
+        result = get_day_schedule([self.mock_schedule])
+        self.assertEqual([], result)
 
-class TestGetNextAppointment(TestCase):
+    @patch("main.utils.get_cached_free_bitmaps", return_value={})
+    def test_get_day_schedule_reads_free_slots_once(self, mock_free_bitmaps):
+        get_day_schedule([self.mock_schedule, self.mock_schedule])
+        mock_free_bitmaps.assert_called_once()
 
-    @patch("main.utils.Appointment.objects")
-    def test_get_appointment_returns_appointment(self, mock_appointment):
-        mock_appointment.filter.return_value = mock_appointment
-        mock_appointment.order_by.return_value = [1, 2]
-        expected = 1
-        result = get_next_appointment("user")
-        self.assertEqual(expected, result)
 
-    def test_get_appointment_returns_none(self):
-        result = get_next_appointment(1)
-        self.assertIsNone(result)
+class TestGetEarliestFreeSlots(TestCase):
+
+    def _mock_schedule(self, employee_id, day):
+        mock_schedule = Mock()
+        mock_schedule.employee.id = employee_id
+        mock_schedule.employee_id = employee_id
+        mock_schedule.emp_full_name.return_value = f"Doctor {employee_id}"
+        mock_schedule.date = day
+        return mock_schedule
+
+    def _slots(self, result):
+        return [
+            (slot["employee_id"], slot["date"], slot["hour"])
+            for slot in result
+        ]
+
+    @patch(
+        "main.utils.get_cached_free_bitmaps",
+        return_value={
+            (1, date(2100, 1, 1)): get_times_bitmap([time(10), time(12)]),
+            (1, date(2100, 1, 2)): get_times_bitmap([time(8), time(12)]),
+            (2, date(2100, 1, 1)): get_times_bitmap([time(9), time(12)]),
+        }
+    )
+    def test_merges_employees_slots_in_time_order(self, mock_free_bitmaps):
+        schedules = [
+            self._mock_schedule(1, date(2100, 1, 2)),
+            self._mock_schedule(1, date(2100, 1, 1)),
+            self._mock_schedule(2, date(2100, 1, 1)),
+        ]
+        result = get_earliest_free_slots(schedules, 10)
+        expected = [
+            (2, date(2100, 1, 1), time(9)),
+            (1, date(2100, 1, 1), time(10)),
+            (1, date(2100, 1, 1), time(12)),
+            (2, date(2100, 1, 1), time(12)),
+            (1, date(2100, 1, 2), time(8)),
+            (1, date(2100, 1, 2), time(12)),
+        ]
+        self.assertEqual(expected, self._slots(result))
+
+    @patch(
+        "main.utils.get_cached_free_bitmaps",
+        return_value={
+            (1, date(2100, 1, 1)): get_times_bitmap([time(9), time(10)]),
+            (1, date(2100, 1, 2)): get_times_bitmap([time(8)]),
+        }
+    )
+    def test_stops_at_limit(self, mock_free_bitmaps):
+        schedules = [
+            self._mock_schedule(1, date(2100, 1, 1)),
+            self._mock_schedule(1, date(2100, 1, 2)),
+        ]
+        result = get_earliest_free_slots(schedules, 2)
+        expected = [
+            (1, date(2100, 1, 1), time(9)),
+            (1, date(2100, 1, 1), time(10)),
+        ]
+        self.assertEqual(expected, self._slots(result))
+        schedules[1].emp_full_name.assert_not_called()
+
+    @patch("main.utils.get_cached_free_bitmaps", return_value={})
+    def test_no_schedules(self, mock_free_bitmaps):
+        self.assertEqual([], get_earliest_free_slots([], 10))
 
 
-class TestIsAppointmentAvailable(TestCase):
+class TestGetBookedAppointments(TestCase):
 
     def setUp(self):
-        self.comparison_magic_mock = MagicMock()
-        self.comparison_magic_mock.__lt__.return_value = False
+        self.doctor = User.objects.create(username="doctor")
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678911",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        self.schedule = Schedule(
+            date=date(2100, 1, 1),
+            start=time(8),
+            end=time(16),
+            employee=self.doctor
+        )
 
-    @patch("main.utils.datetime")
-    @patch("main.utils.Appointment.objects")
-    def test_appointment_available(self, mock_appointment, mock_datetime):
-        mock_datetime.now.return_value = self.comparison_magic_mock
-        mock_datetime.combine.return_value = self.comparison_magic_mock
-        mock_appointment.filter.return_value = False
-        result = is_appointment_available("1", date(2023, 1, 1), time(8, 30))
-        self.assertTrue(result)
+    def _book(self, appointment_datetime):
+        Appointment.objects.bulk_create([
+            Appointment(
+                datetime=timezone.make_aware(appointment_datetime),
+                patient=self.patient,
+                doctor=self.doctor,
+                purpose="Toothache",
+                duration=30
+            )
+        ])
 
-    @patch("main.utils.datetime")
-    @patch("main.utils.Appointment.objects")
-    def test_appointment_not_available(self, mock_appointment, mock_datetime):
-        mock_datetime.now.return_value = self.comparison_magic_mock
-        mock_datetime.combine.return_value = self.comparison_magic_mock
-        mock_appointment.filter.return_value = True
-        result = is_appointment_available("1", date(2023, 1, 1), time(8, 30))
-        self.assertFalse(result)
+    def test_no_schedules(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(set(), get_booked_appointments([]))
 
-    @patch("main.utils.datetime")
-    @patch("main.utils.Appointment.objects")
-    def test_appointment_datetime_less_than_now(
-            self, mock_appointment, mock_datetime):
-        self.comparison_magic_mock.__lt__.return_value = True
-        mock_datetime.now.return_value = self.comparison_magic_mock
-        mock_datetime.combine.return_value = self.comparison_magic_mock
-        result = is_appointment_available("1", date(2023, 1, 1), time(8, 30))
-        self.assertFalse(result)
+    def test_returns_booked_datetimes_within_schedule_days(self):
+        self._book(datetime(2100, 1, 1, 8, 30))
+        self._book(datetime(2100, 1, 2, 8, 30))
+        with self.assertNumQueries(1):
+            result = get_booked_appointments([self.schedule])
+        self.assertEqual(
+            {(self.doctor.id, datetime(2100, 1, 1, 8, 30), 30)},
+            result
+        )
+
+
+class TestFreeSlots(TestCase):
+
+    def setUp(self):
+        self.doctor = User.objects.create(username="doctor")
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678911",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        self.schedule = Schedule.objects.create(
+            date=date(2100, 1, 1),
+            start=time(8),
+            end=time(10),
+            employee=self.doctor
+        )
+        self.schedule.refresh_from_db()
+
+    def test_compute_free_bitmaps_subtracts_booked(self):
+        Appointment.objects.bulk_create([
+            Appointment(
+                datetime=timezone.make_aware(datetime(2100, 1, 1, 8, 30)),
+                patient=self.patient,
+                doctor=self.doctor,
+                purpose="Toothache",
+                duration=30
+            )
+        ])
+        result = compute_free_bitmaps([self.schedule])
+        expected = {(self.doctor.id, date(2100, 1, 1)): get_times_bitmap(
+            [time(8), time(9), time(9, 30)])}
+        self.assertEqual(expected, result)
+
+    def test_get_working_intervals(self):
+        Break.objects.bulk_create([
+            Break(employee=self.doctor, start=time(8, 30), end=time(9)),
+            Break(employee=self.doctor, start=time(9, 30), end=time(12),
+                  date=date(2100, 1, 1)),
+            Break(employee=self.doctor, start=time(8), end=time(9),
+                  date=date(2100, 1, 2)),
+        ])
+        with self.assertNumQueries(2):
+            result = get_working_intervals([self.schedule])
+        expected = {(self.doctor.id, date(2100, 1, 1)): [
+            (time(8), time(8, 30)), (time(9), time(9, 30))
+        ]}
+        self.assertEqual(expected, result)
+
+    def test_get_working_intervals_absent(self):
+        Absence.objects.bulk_create([
+            Absence(employee=self.doctor, date_from=date(2100, 1, 1),
+                    date_to=date(2100, 1, 1))
+        ])
+        result = get_working_intervals([self.schedule])
+        self.assertEqual({(self.doctor.id, date(2100, 1, 1)): []}, result)
+
+    def test_compute_free_bitmaps_skips_breaks(self):
+        Break.objects.bulk_create([
+            Break(employee=self.doctor, start=time(8, 30), end=time(9))
+        ])
+        result = compute_free_bitmaps([self.schedule])
+        expected = {(self.doctor.id, date(2100, 1, 1)): get_times_bitmap(
+            [time(8), time(9), time(9, 30)])}
+        self.assertEqual(expected, result)
+
+    def test_rebuild_free_slots(self):
+        FreeSlot.objects.all().delete()
+        rebuild_free_slots([self.schedule])
+        self.assertEqual(
+            compute_free_bitmaps([self.schedule]),
+            get_free_bitmaps([self.schedule])
+        )
+
+    def test_get_free_bitmaps_excludes_past(self):
+        self.schedule.date = date(2000, 1, 1)
+        self.schedule.save()
+        self.assertEqual({}, get_free_bitmaps([self.schedule]))
+        self.assertEqual(
+            {(self.doctor.id, date(2000, 1, 1)): get_shift_bitmap(
+                time(8), time(10))},
+            get_free_bitmaps([self.schedule], include_past=True)
+        )
+
+    def test_release_free_slot_outside_schedule_ignored(self):
+        release_free_slot(self.doctor.id, datetime(2100, 1, 1, 12))
+        release_free_slot(self.doctor.id, datetime(2100, 1, 2, 8))
+        self.assertEqual(4, FreeSlot.objects.count())
+
+    def test_take_and_release_free_slot(self):
+        take_free_slot(self.doctor.id, datetime(2100, 1, 1, 8, 15), 30)
+        self.assertEqual(2, FreeSlot.objects.count())
+        release_free_slot(self.doctor.id, datetime(2100, 1, 1, 8))
+        self.assertEqual(4, FreeSlot.objects.count())
+
+    def test_fill_free_slots_migration(self):
+        migration = import_module("main.migrations.0014_fill_free_slots")
+        Schedule.objects.bulk_create([
+            Schedule(date=date(2100, 1, 2), start=time(8), end=time(10),
+                     employee=self.doctor),
+            Schedule(date=date(2000, 1, 1), start=time(8), end=time(10),
+                     employee=self.doctor)
+        ])
+        Break.objects.bulk_create([
+            Break(employee=self.doctor, start=time(9), end=time(9, 30),
+                  date=date(2100, 1, 2))
+        ])
+        Appointment.objects.bulk_create([
+            Appointment(
+                datetime=timezone.make_aware(datetime(2100, 1, 1, 8, 30)),
+                patient=self.patient,
+                doctor=self.doctor,
+                purpose="Toothache",
+                duration=60
+            )
+        ])
+        FreeSlot.objects.all().delete()
+        migration.fill_free_slots(apps, None)
+        self.assertEqual(
+            [datetime(2100, 1, 1, 8), datetime(2100, 1, 1, 9, 30),
+             datetime(2100, 1, 2, 8), datetime(2100, 1, 2, 8, 30),
+             datetime(2100, 1, 2, 9, 30)],
+            [timezone.make_naive(slot) for slot in FreeSlot.objects.order_by(
+                "datetime").values_list("datetime", flat=True)]
+        )
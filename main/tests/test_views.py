@@ -1,9 +1,17 @@
-from unittest.mock import patch, call
+from unittest.mock import Mock, patch, call
+import datetime
 
 from django.contrib.auth.models import User, Group
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
+from ..booking import PAST_APPOINTMENT_MESSAGE, SLOT_TAKEN_MESSAGE, SlotTaken
+from ..ical import get_feed_token
+from ..models import Appointment, Schedule, SlotHold
+from patients.models import Patient
+
 
 class TestScheduleSearchView(TestCase):
     def setUp(self):
@@ -57,13 +65,13 @@ class TestScheduleListView(TestCase):
         response = self.client.get("/schedule/search-results", data=self.data)
         self.assertEqual(response.status_code, 403)
 
-    @patch("main.views.Schedule.objects.filter")
+    @patch("main.querysets.Schedule.objects.filter")
     def test_get(self, mock_schedule_filter):
         response = self.client.get("/schedule/search-results", data=self.data)
         self.assertTemplateUsed(response, "main/schedule_search_results.html")
 
-    @patch("main.views.Q")
-    @patch("main.views.Schedule.objects.filter")
+    @patch("main.querysets.Q")
+    @patch("main.querysets.Schedule.objects.filter")
     def test_schedule_q_calls_emp(self, mock_schedule_filter, mock_views_q):
         self.client.get('/schedule/search-results', data=self.data)
         expected_q_calls = [
@@ -72,8 +80,8 @@ class TestScheduleListView(TestCase):
             call(date="2023-01-01")]
         self.assertEqual(mock_views_q.call_args_list, expected_q_calls)
 
-    @patch("main.views.Q")
-    @patch("main.views.Schedule.objects.filter")
+    @patch("main.querysets.Q")
+    @patch("main.querysets.Schedule.objects.filter")
     def test_schedule_q_calls_no_emp(self, mock_schedule_filter, mock_views_q):
         self.data["employee"] = ""
         self.client.get('/schedule/search-results', data=self.data)
@@ -82,6 +90,57 @@ class TestScheduleListView(TestCase):
             call(date="2023-01-01")]
         self.assertEqual(mock_views_q.call_args_list, expected_q_calls)
 
+    def _add_doctors_on_schedule(self, specialty, count):
+        for i in range(count):
+            doctor = User.objects.create_user(
+                username=f"{specialty.name}_{i}"
+            )
+            doctor.groups.add(specialty)
+            Schedule.objects.create(
+                date="2100-01-01",
+                start="08:00",
+                end="18:00",
+                employee=doctor
+            )
+
+    def test_get_query_count_independent_of_number_of_doctors(self):
+        dentists = Group.objects.create(name="dentists")
+        cardiologists = Group.objects.create(name="cardiologists")
+        self._add_doctors_on_schedule(dentists, 1)
+        self._add_doctors_on_schedule(cardiologists, 5)
+        query_counts = []
+        for specialty in (dentists, cardiologists):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    "/schedule/search-results",
+                    data={"specialties": specialty.id, "date": "2100-01-01"}
+                )
+            query_counts.append(len(queries))
+        self.assertEqual(len(response.context["schedule"]), 100)
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_get_visit_type_filters_hours_fitting_visit(self):
+        dentists = Group.objects.create(name="dentists")
+        self._add_doctors_on_schedule(dentists, 1)
+        response = self.client.get(
+            "/schedule/search-results",
+            data={
+                "specialties": dentists.id,
+                "date": "2100-01-01",
+                "visit_type": "procedure"
+            }
+        )
+        hours = [slot["hour"] for slot in response.context["schedule"]]
+        self.assertEqual(datetime.time(16, 30), hours[-1])
+        self.assertEqual(18, len(hours))
+
+    def test_redirect_when_invalid_visit_type(self):
+        response = self.client.get(
+            "/schedule/search-results",
+            data={**self.data, "visit_type": "surgery"}
+        )
+        self.assertRedirects(response, "/schedule/search")
+
     def test_redirect_when_no_specialty_or_date(self):
         response = self.client.get("/schedule/search-results", follow=True)
         self.assertRedirects(response, "/schedule/search")
@@ -111,6 +170,90 @@ class TestScheduleListView(TestCase):
             self.assertTrue(session[key] == data[key])
 
 
+class TestEarliestSlotListView(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_name",
+            email="test@email.com",
+            password="test_pw"
+        )
+        self.nurses_group = Group.objects.create(name="nurses")
+        self.user.groups.add(self.nurses_group)
+        self.cardiologists = Group.objects.create(name="cardiologists")
+        self.client.force_login(self.user)
+
+    def _add_doctor_on_schedule(self, username, days):
+        doctor = User.objects.create_user(username=username)
+        doctor.groups.add(self.cardiologists)
+        for day in days:
+            Schedule.objects.create(
+                date=datetime.date.today() + datetime.timedelta(days=day),
+                start="08:00",
+                end="18:00",
+                employee=doctor
+            )
+        return doctor
+
+    def test_get_not_nurse_forbidden(self):
+        self.user.groups.remove(self.nurses_group)
+        response = self.client.get("/schedule/earliest")
+        self.assertEqual(response.status_code, 403)
+
+    def test_redirect_when_no_specialty(self):
+        response = self.client.get("/schedule/earliest")
+        self.assertRedirects(response, "/schedule/search")
+
+    def test_redirect_when_invalid_date(self):
+        response = self.client.get(
+            "/schedule/earliest",
+            data={"specialties": self.cardiologists.id, "date": "tomorrow"}
+        )
+        self.assertRedirects(response, "/schedule/search")
+
+    def test_get_returns_earliest_slots_up_to_limit(self):
+        self._add_doctor_on_schedule("doctor_1", [1, 2])
+        doctor = self._add_doctor_on_schedule("doctor_2", [1])
+        response = self.client.get(
+            "/schedule/earliest",
+            data={"specialties": self.cardiologists.id, "limit": 4}
+        )
+        self.assertTemplateUsed(response, "main/schedule_earliest_results.html")
+        schedule = response.context["schedule"]
+        self.assertEqual(len(schedule), 4)
+        self.assertEqual(
+            [slot["hour"] for slot in schedule],
+            [datetime.time(8), datetime.time(8),
+             datetime.time(8, 30), datetime.time(8, 30)]
+        )
+
+        response = self.client.get(
+            "/schedule/earliest",
+            data={
+                "specialties": self.cardiologists.id,
+                "employee": doctor.id,
+                "limit": 4
+            }
+        )
+        employees = {slot["employee_id"] for slot in response.context["schedule"]}
+        self.assertEqual(employees, {doctor.id})
+
+    def test_get_query_count_independent_of_number_of_days(self):
+        self._add_doctor_on_schedule("doctor_1", [1])
+        with CaptureQueriesContext(connection) as one_day:
+            self.client.get(
+                "/schedule/earliest",
+                data={"specialties": self.cardiologists.id}
+            )
+        self._add_doctor_on_schedule("doctor_2", [1, 2, 3, 4, 5, 6])
+        with CaptureQueriesContext(connection) as many_days:
+            self.client.get(
+                "/schedule/earliest",
+                data={"specialties": self.cardiologists.id}
+            )
+        self.assertEqual(len(one_day), len(many_days))
+
+
 class TestAppointmentConfirmView(TestCase):
 
     def setUp(self):
@@ -157,7 +300,8 @@ class TestAppointmentConfirmView(TestCase):
     @patch("main.views.User")
     @patch("main.views.datetime")
     @patch("main.views.Appointment")
-    def test_valid_post_data(self, mock_save, mock_datetime,
+    @patch("main.views.book_appointment")
+    def test_valid_post_data(self, mock_book, mock_save, mock_datetime,
                              mock_user, mock_patient):
         session = self.client.session
         session["hour"] = "08:30"
@@ -216,8 +360,10 @@ class TestAppointmentConfirmView(TestCase):
     @patch("main.views.User")
     @patch("main.views.datetime")
     @patch("main.views.Appointment")
-    def test_valid_post_resets_session(self, mock_save, mock_datetime,
-                                       mock_user, mock_patient):
+    @patch("main.views.book_appointment")
+    def test_valid_post_resets_session(self, mock_book, mock_save,
+                                       mock_datetime, mock_user,
+                                       mock_patient):
         session = self.client.session
         session["hour"] = "08:30"
         session["date"] = "2023-01-01"
@@ -228,6 +374,179 @@ class TestAppointmentConfirmView(TestCase):
         self.assertIsNone(self.client.session["date"])
         self.assertIsNone(self.client.session["doctor_id"])
 
+    @patch("main.views.Patient")
+    @patch("main.views.User")
+    @patch("main.views.datetime")
+    @patch("main.views.Appointment")
+    @patch("main.views.book_appointment", side_effect=SlotTaken())
+    def test_slot_taken_returns_same_page_with_error(
+            self, mock_book, mock_save, mock_datetime, mock_user,
+            mock_patient):
+        session = self.client.session
+        session["hour"] = "08:30"
+        session["date"] = "2023-01-01"
+        session["doctor_id"] = "1"
+        session.save()
+        response = self.client.post(
+            "/appointment/confirm",
+            data=self.post_data
+        )
+        self.assertTemplateUsed(response, "main/appointment_confirm.html")
+        self.assertEqual(response.context["error"], SLOT_TAKEN_MESSAGE)
+
+
+class TestSlotBookingViews(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_name",
+            email="test@email.com",
+            password="test_pw"
+        )
+        self.nurses_group = Group.objects.create(name="nurses")
+        self.user.groups.add(self.nurses_group)
+        self.doctor = User.objects.create(username="doctor")
+        self.doctor.groups.add(Group.objects.create(name="physicians"))
+        Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678911",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        self.tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        Schedule.objects.create(
+            date=self.tomorrow,
+            start="08:00",
+            end="10:00",
+            employee=self.doctor
+        )
+        self.slot_data = {
+            "doctor": self.doctor.id,
+            "date": self.tomorrow.isoformat(),
+            "hour": "08:30"
+        }
+        self.book_data = {
+            **self.slot_data,
+            "personal_id": "12345678911",
+            "purpose": "lorem ipsum"
+        }
+        self.client.force_login(self.user)
+
+    def test_not_nurse_forbidden(self):
+        self.user.groups.remove(self.nurses_group)
+        response = self.client.post("/appointment/book", data=self.book_data)
+        self.assertEqual(response.status_code, 403)
+
+    def test_hold_slot(self):
+        response = self.client.post(
+            "/appointment/hold",
+            data={**self.slot_data, "seconds": 60}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.user, SlotHold.objects.get().held_by)
+
+    def test_hold_invalid_data(self):
+        response = self.client.post(
+            "/appointment/hold",
+            data={**self.slot_data, "seconds": 100000}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("seconds", response.json()["errors"])
+
+    def test_book_appointment(self):
+        response = self.client.post("/appointment/book", data=self.book_data)
+        self.assertEqual(response.status_code, 201)
+        appointment = Appointment.objects.get()
+        self.assertEqual(appointment.get_absolute_url(), response.json()["url"])
+
+    def test_book_appointment_single_session_free_request(self):
+        self.client.get("/appointment/confirm")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post("/appointment/book", data=self.book_data)
+        self.assertFalse(any(
+            "django_session" in query["sql"]
+            and query["sql"].startswith(("INSERT", "UPDATE"))
+            for query in queries.captured_queries
+        ))
+
+    def test_book_taken_slot_conflict(self):
+        self.client.post("/appointment/book", data=self.book_data)
+        response = self.client.post("/appointment/book", data=self.book_data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(SLOT_TAKEN_MESSAGE, response.json()["error"])
+
+    def test_book_series(self):
+        response = self.client.post(
+            "/appointment/book-series",
+            data={**self.book_data, "count": 2}
+        )
+        self.assertEqual(response.status_code, 201)
+        report = response.json()["appointments"]
+        self.assertIsNotNone(report[0]["id"])
+        self.assertEqual("Doctor not on schedule!", report[1]["error"])
+
+    @patch("main.views.book_appointments", side_effect=IntegrityError)
+    def test_book_series_concurrent_insert_conflict(self, mock_book):
+        response = self.client.post(
+            "/appointment/book-series",
+            data={**self.book_data, "count": 2}
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(SLOT_TAKEN_MESSAGE, response.json()["error"])
+
+    def test_book_past_appointment(self):
+        yesterday = self.tomorrow - datetime.timedelta(days=2)
+        Schedule.objects.create(
+            date=yesterday,
+            start="08:00",
+            end="10:00",
+            employee=self.doctor
+        )
+        for url in ("/appointment/book", "/appointment/hold"):
+            with self.subTest(url=url):
+                response = self.client.post(
+                    url, data={**self.book_data, "date": yesterday.isoformat()}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    [PAST_APPOINTMENT_MESSAGE],
+                    response.json()["errors"]["__all__"]
+                )
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_book_series_starting_in_past(self):
+        yesterday = self.tomorrow - datetime.timedelta(days=2)
+        response = self.client.post(
+            "/appointment/book-series",
+            data={**self.book_data, "date": yesterday.isoformat(),
+                  "count": 3, "interval_days": 1}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_book_after_booking_window(self):
+        response = self.client.post(
+            "/appointment/book",
+            data={
+                **self.book_data,
+                "date": (self.tomorrow + datetime.timedelta(days=7)).isoformat()
+            }
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("__all__", response.json()["errors"])
+
+    def test_book_invalid_patient(self):
+        response = self.client.post(
+            "/appointment/book",
+            data={**self.book_data, "personal_id": "00000000000"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual("Invalid patient id", response.json()["error"])
+
 
 class TestMainView(TestCase):
 
@@ -256,33 +575,33 @@ class TestMainView(TestCase):
         self.assertTemplateUsed(response, "main/index.html")
         self.assertIsNone(response.context.get("form"))
 
-    @patch("main.views.get_next_appointment", return_value=True)
+    @patch("main.views.get_worklist", return_value=[Mock(took_place=None)])
     @patch("main.views.AppointmentModelForm")
     @patch("main.views.Appointment")
     def test_get_appointment_form_in_context(
             self, mock_appointment, mock_appointment_form,
-            mock_next_appointment):
+            mock_worklist):
         self.user.groups.add(self.physicians_group)
         response = self.client.get("/")
         self.assertTemplateUsed(response, "main/index.html")
         self.assertIsNotNone(response.context.get("form"))
 
-    @patch("main.views.get_next_appointment", return_value=True)
+    @patch("main.views.get_worklist", return_value=[Mock(took_place=None)])
     @patch("main.views.Appointment")
     @patch("main.views.AppointmentModelForm")
     def test_post_valid_data_with_next_appointment(
             self, mock_appointment_form, mock_appointment,
-            mock_next_appointment):
+            mock_worklist):
         response = self.client.post("/", data=self.data)
         self.assertTemplateUsed(response, "main/index.html")
         self.assertIsNotNone(response.context.get("form"))
 
-    @patch("main.views.get_next_appointment", return_value=False)
+    @patch("main.views.get_worklist", return_value=[])
     @patch("main.views.Appointment")
     @patch("main.views.AppointmentModelForm")
     def test_post_valid_data_without_next_appointment(
             self, mock_appointment_form, mock_appointment,
-            mock_next_appointment):
+            mock_worklist):
         response = self.client.post("/", data=self.data)
         self.assertTemplateUsed(response, "main/index.html")
         self.assertIsNone(response.context.get("form"))
@@ -295,22 +614,17 @@ class TestMainView(TestCase):
         self.assertTemplateUsed(response, "main/index.html")
         self.assertIsNotNone(response.context.get("form"))
 
-    @patch("main.views.Appointment")
-    def test_get_nurse(self, mock_appointment):
+    def test_get_nurse(self):
         nurses_group = Group.objects.create(name="nurses")
         self.user.groups.add(nurses_group)
         response = self.client.get("/")
-        mock_returned_appointments = mock_appointment.objects.filter().order_by
-        mock_returned_appointments.assert_called_once()
-        self.assertEqual(
-            response.context["appointments"],
-            mock_returned_appointments()
-        )
+        self.assertEqual([], response.context["appointments"])
+        self.assertIsNotNone(response.context["filter_form"])
         self.assertTemplateUsed(response, "main/index.html")
 
     @patch("main.views.AppointmentModelForm")
-    @patch("main.views.get_next_appointment")
-    def test_get_doctor(self, mock_get_appointment, mock_appointment_form):
+    @patch("main.views.get_worklist", return_value=[Mock(took_place=None)])
+    def test_get_doctor(self, mock_get_worklist, mock_appointment_form):
         self.user.groups.add(self.physicians_group)
         response = self.client.get("/")
         self.assertEqual(
@@ -320,6 +634,226 @@ class TestMainView(TestCase):
         self.assertTemplateUsed(response, "main/index.html")
 
 
+class TestNurseDashboard(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_name",
+            email="test@email.com",
+            password="test_pw"
+        )
+        self.user.groups.add(Group.objects.create(name="nurses"))
+        self.physicians_group = Group.objects.create(name="physicians")
+        self.dentists = Group.objects.create(name="dentists")
+        self.doctors = User.objects.bulk_create(
+            User(username=f"doctor_{i}") for i in range(2)
+        )
+        self.physicians_group.user_set.add(*self.doctors)
+        self.dentists.user_set.add(self.doctors[1])
+        self.patients = [
+            Patient.objects.create(
+                first_name="Johnny",
+                last_name="Test",
+                date_of_birth="2022-12-12",
+                personal_id=f"1234567891{i}",
+                email="email@email.com",
+                phone="0123456789",
+                address=None
+            ) for i in range(2)
+        ]
+        self.client.force_login(self.user)
+
+    def _book(self, count, day=datetime.date(2100, 1, 1)):
+        start = timezone.make_aware(
+            datetime.datetime.combine(day, datetime.time(8)))
+        Appointment.objects.bulk_create(
+            Appointment(
+                datetime=start + datetime.timedelta(minutes=30 * (i // 2)),
+                patient=self.patients[i % 2],
+                doctor=self.doctors[i % 2],
+                purpose="Toothache",
+                duration=30
+            ) for i in range(count)
+        )
+
+    def _listed(self, response):
+        return [
+            (appointment.datetime, appointment.id)
+            for appointment in response.context["appointments"]
+        ]
+
+    def test_pages_follow_each_other(self):
+        self._book(60)
+        listed = []
+        url = "/"
+        while url:
+            response = self.client.get(url)
+            listed += self._listed(response)
+            url = response.context.get("next_page")
+        self.assertEqual(60, len(listed))
+        self.assertEqual(sorted(listed), listed)
+        self.assertEqual(60, len(set(listed)))
+
+    def test_query_count_independent_of_appointment_count(self):
+        self._book(30)
+        self.client.get("/")
+        with CaptureQueriesContext(connection) as few:
+            self.client.get("/")
+        self._book(100, day=datetime.date(2100, 1, 2))
+        with CaptureQueriesContext(connection) as many:
+            self.client.get("/")
+        self.assertEqual(len(few), len(many))
+
+    def test_filter_by_day(self):
+        self._book(2)
+        self._book(2, day=datetime.date(2100, 1, 2))
+        response = self.client.get("/", data={"date": "2100-01-02"})
+        self.assertEqual(
+            {datetime.date(2100, 1, 2)},
+            {a.datetime.date() for a in response.context["appointments"]}
+        )
+
+    def test_filter_by_doctor_and_specialty(self):
+        self._book(4)
+        response = self.client.get("/", data={"doctor": self.doctors[0].id})
+        self.assertEqual(
+            {self.doctors[0]},
+            {a.doctor for a in response.context["appointments"]}
+        )
+        response = self.client.get("/", data={"specialty": self.dentists.id})
+        self.assertEqual(
+            {self.doctors[1]},
+            {a.doctor for a in response.context["appointments"]}
+        )
+
+    def test_invalid_page(self):
+        self._book(2)
+        response = self.client.get("/", data={"after": "yesterday"})
+        self.assertEqual([], response.context["appointments"])
+        self.assertIn("after", response.context["filter_form"].errors)
+
+
+class TestDoctorWorklist(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_name",
+            email="test@email.com",
+            password="test_pw"
+        )
+        self.user.groups.add(Group.objects.create(name="physicians"))
+        # the first calendar url of a doctor creates the feed secret
+        get_feed_token(self.user.pk)
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678910",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        self.today = timezone.localtime().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.client.force_login(self.user)
+
+    def _book(self, count, start):
+        Appointment.objects.bulk_create(
+            Appointment(
+                datetime=start + datetime.timedelta(minutes=30 * i),
+                patient=self.patient,
+                doctor=self.user,
+                purpose="Toothache",
+                duration=30
+            ) for i in range(count)
+        )
+
+    def _close(self, appointment):
+        data = {
+            "datetime": appointment.datetime.strftime("%Y-%m-%d %H:%M:%S"),
+            "purpose": appointment.purpose,
+            "examination": "Checked",
+            "diagnosis": "Cavity",
+            "advice": "Brush teeth",
+            "prescription": "",
+            "took_place": True
+        }
+        return self.client.post("/", data=data)
+
+    def test_get_queue_and_overdue(self):
+        self._book(2, self.today - datetime.timedelta(days=3))
+        self._book(3, self.today)
+        response = self.client.get("/")
+        first, *rest = Appointment.objects.filter(
+            datetime__gte=self.today).order_by("datetime")
+        self.assertEqual(first, response.context["form"].instance)
+        self.assertEqual(rest, response.context["queue"])
+        self.assertEqual(2, len(response.context["overdue"]))
+
+    def test_post_moves_to_next_appointment(self):
+        self._book(3, self.today)
+        first, second, third = Appointment.objects.order_by("datetime")
+        response = self._close(first)
+        first.refresh_from_db()
+        self.assertTrue(first.took_place)
+        self.assertEqual(second, response.context["form"].instance)
+        self.assertEqual([third], response.context["queue"])
+
+    def test_post_overdue_appointment(self):
+        self._book(1, self.today - datetime.timedelta(days=1))
+        overdue = Appointment.objects.get()
+        response = self._close(overdue)
+        overdue.refresh_from_db()
+        self.assertTrue(overdue.took_place)
+        self.assertEqual([], response.context["overdue"])
+
+    def test_get_renders_relations_without_choices(self):
+        self._book(1, self.today)
+        Patient.objects.create(
+            first_name="Other",
+            last_name="Patient",
+            date_of_birth="2022-12-12",
+            personal_id="12345678911",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        response = self.client.get("/")
+        self.assertContains(response, str(self.patient))
+        self.assertNotContains(response, "Other Patient")
+        self.assertNotContains(response, "<option value=\"12345678911\"")
+
+    def test_post_keeps_doctor_and_patient(self):
+        self._book(1, self.today)
+        appointment = Appointment.objects.get()
+        data = {
+            "datetime": appointment.datetime.strftime("%Y-%m-%d %H:%M:%S"),
+            "doctor": "0",
+            "patient": "0",
+            "purpose": "Toothache",
+            "examination": "Checked",
+            "diagnosis": "Cavity",
+            "advice": "Brush teeth",
+            "took_place": True
+        }
+        self.client.post("/", data=data)
+        appointment.refresh_from_db()
+        self.assertEqual(self.user.id, appointment.doctor_id)
+        self.assertEqual(self.patient.id, appointment.patient_id)
+        self.assertTrue(appointment.took_place)
+
+    def test_post_query_count_independent_of_queue_length(self):
+        self._book(3, self.today)
+        with CaptureQueriesContext(connection) as few:
+            self._close(Appointment.objects.order_by("datetime")[0])
+        self._book(6, self.today + datetime.timedelta(hours=12))
+        with CaptureQueriesContext(connection) as many:
+            self._close(Appointment.objects.filter(
+                took_place=None).order_by("datetime")[0])
+        self.assertEqual(len(few), len(many))
+
+
 class TestAppointmentView(TestCase):
 
     def setUp(self):
@@ -0,0 +1,81 @@
+import datetime
+
+from django.contrib.auth.models import Group, User
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Appointment
+from ..worklist import (
+    find_appointment, get_overdue_appointments, get_worklist,
+    parse_appointment_datetime
+)
+from patients.models import Patient
+
+
+class TestWorklist(TestCase):
+
+    def setUp(self):
+        self.doctor = User.objects.create(username="doctor")
+        self.other_doctor = User.objects.create(username="other_doctor")
+        Group.objects.create(name="physicians").user_set.add(
+            self.doctor, self.other_doctor
+        )
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678910",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        self.day = datetime.date(2100, 1, 2)
+
+    def _book(self, day, hour, doctor=None, took_place=None):
+        # bulk_create skips schedule validation
+        return Appointment.objects.bulk_create([Appointment(
+            datetime=timezone.make_aware(
+                datetime.datetime.combine(day, datetime.time(hour))),
+            patient=self.patient,
+            doctor=doctor or self.doctor,
+            purpose="Toothache",
+            duration=30,
+            took_place=took_place
+        )])[0]
+
+    def test_worklist_limited_to_day(self):
+        yesterday = self._book(self.day - datetime.timedelta(days=1), 8)
+        second = self._book(self.day, 10)
+        first = self._book(self.day, 9)
+        self._book(self.day + datetime.timedelta(days=1), 8)
+        self.assertEqual([first, second], get_worklist(self.doctor, self.day))
+        self.assertEqual(
+            [yesterday], get_overdue_appointments(self.doctor, self.day)
+        )
+
+    def test_worklist_skips_closed_and_other_doctors(self):
+        self._book(self.day, 8, took_place=True)
+        self._book(self.day, 9, took_place=False)
+        self._book(self.day, 10, doctor=self.other_doctor)
+        self.assertEqual([], get_worklist(self.doctor, self.day))
+
+    def test_worklist_one_query_with_patients(self):
+        for hour in range(8, 12):
+            self._book(self.day, hour)
+        with self.assertNumQueries(1):
+            worklist = get_worklist(self.doctor, self.day, limit=3)
+            names = [appointment.patient.first_name for appointment in worklist]
+        self.assertEqual(["Johnny"] * 3, names)
+
+    def test_find_appointment(self):
+        appointment = self._book(self.day, 8)
+        worklist = get_worklist(self.doctor, self.day)
+        self.assertEqual(
+            appointment, find_appointment(
+                worklist, parse_appointment_datetime("2100-01-02 08:00:00"))
+        )
+        self.assertIsNone(find_appointment(
+            worklist, parse_appointment_datetime("2100-01-02 09:00:00")))
+
+    def test_parse_invalid_datetime(self):
+        self.assertIsNone(parse_appointment_datetime("yesterday"))
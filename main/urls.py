@@ -21,11 +21,31 @@ urlpatterns = [
         views.ScheduleListView.as_view(),
         name="search_results"
     ),
+    path(
+        "schedule/earliest",
+        views.EarliestSlotListView.as_view(),
+        name="earliest"
+    ),
     path(
         "appointment/confirm",
         views.AppointmentConfirmView.as_view(),
         name="confirm_appointment"
     ),
+    path(
+        "appointment/hold",
+        views.SlotHoldView.as_view(),
+        name="hold_slot"
+    ),
+    path(
+        "appointment/book",
+        views.AppointmentBookView.as_view(),
+        name="book_appointment"
+    ),
+    path(
+        "appointment/book-series",
+        views.AppointmentSeriesBookView.as_view(),
+        name="book_series"
+    ),
     path(
         "appointment/<int:pk>",
         views.AppointmentView.as_view(),
@@ -35,5 +55,20 @@ urlpatterns = [
         "appointment/delete/<int:pk>",
         views.AppointmentDeleteView.as_view(),
         name="delete_appointment"
+    ),
+    path(
+        "export/<str:dataset>",
+        views.ExportView.as_view(),
+        name="export"
+    ),
+    path(
+        "fhir/<str:resource_type>",
+        views.FhirView.as_view(),
+        name="fhir"
+    ),
+    path(
+        "calendar/<str:token>.ics",
+        views.AppointmentFeedView.as_view(),
+        name="calendar"
     )
 ]
@@ -1,18 +1,34 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+from operator import itemgetter
+import heapq
+import itertools
 
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
 
-from .const import APPOINTMENT_TIME
-from .models import Appointment
+from . import bitmaps
+from .cache import get_or_compute_free_slots, invalidate_free_slots
+from .const import (APPOINTMENT_TIME, DASHBOARD_PAGE_SIZE,
+                    FREE_SLOT_BATCH_SIZE)
+from .intervals import subtract_intervals
+from .models import Absence, Appointment, Break, FreeSlot, Schedule
 
 
-def get_appointment_times(schedule):
+def get_appointment_times(schedule, breaks=()):
     """
     Part workday into available appoitnments.
 
+    Appointments start on a grid of APPOINTMENT_TIME minutes from midnight,
+    so a shift, or its part after a break, starting off the grid begins with
+    the next grid time.
+
     Parameters
     ----------
     schedule : Schedule.
+    breaks : iterable
+        (start, end) time tuples cut out of the shift.
 
     Returns
     ----------
@@ -20,26 +36,99 @@ def get_appointment_times(schedule):
         time objects representing available appointments.        
     """
 
-    start_dt = datetime.combine(schedule.date, schedule.start)
-    end_dt = datetime.combine(schedule.date, schedule.end)
     delta = timedelta(minutes=APPOINTMENT_TIME)
+    intervals = [(schedule.start, schedule.end)]
+    if breaks:
+        intervals = subtract_intervals(intervals, breaks)
     available_hours = []
+    for start, end in intervals:
+        start_dt = datetime.combine(schedule.date, start)
+        end_dt = datetime.combine(schedule.date, end)
+        since_midnight = timedelta(
+            hours=start_dt.hour,
+            minutes=start_dt.minute,
+            seconds=start_dt.second,
+            microseconds=start_dt.microsecond
+        )
+        start_dt += -since_midnight % delta
 
-    while start_dt < end_dt:
-        available_hours.append(start_dt.time())
-        start_dt += delta
+        while start_dt < end_dt:
+            available_hours.append(start_dt.time())
+            start_dt += delta
 
     return available_hours
 
 
-def get_day_schedule(schedules):
+def get_working_intervals(schedules):
+    """
+    Get employees working hours on schedule days without breaks and
+    absences.
+
+    Breaks and absences of all schedules are fetched with one query each.
+
+    Parameters
+    ----------
+    schedules : list
+        contains Schedule objects.
+
+    Returns
+    ----------
+    dict
+        (employee_id, datetime.date) keys, lists of sorted, disjoint
+        (start, end) datetime.time tuples values.
+    """
+
+    schedules = list(schedules)
+    employee_ids = {schedule.employee_id for schedule in schedules}
+    dates = {_as_date(schedule.date) for schedule in schedules}
+    if not dates:
+        return {}
+
+    breaks = {}
+    for employee_break in Break.objects.filter(
+            Q(employee__in=employee_ids)
+            & (Q(date__isnull=True) | Q(date__range=(min(dates), max(dates))))):
+        breaks.setdefault(employee_break.employee_id, []).append(
+            employee_break)
+    absences = {}
+    for absence in Absence.objects.filter(
+            Q(employee__in=employee_ids)
+            & Q(date_from__lte=max(dates))
+            & Q(date_to__gte=min(dates))):
+        absences.setdefault(absence.employee_id, []).append(absence)
+
+    working_intervals = {}
+    for schedule in schedules:
+        day = _as_date(schedule.date)
+        key = (schedule.employee_id, day)
+        if any(absence.date_from <= day <= absence.date_to
+               for absence in absences.get(schedule.employee_id, [])):
+            working_intervals[key] = []
+            continue
+        working_intervals[key] = subtract_intervals(
+            [(schedule.start, schedule.end)],
+            [(employee_break.start, employee_break.end)
+             for employee_break in breaks.get(schedule.employee_id, [])
+             if employee_break.applies_to(day)]
+        )
+    return working_intervals
+
+
+def get_day_schedule(schedules, duration=APPOINTMENT_TIME):
     """
     Get all available employees working hours at a given day.
 
+    Free slots are kept as one bitmap per doctor day, cached and read from
+    the FreeSlot table with a single query on a cache miss. Results are
+    produced in hour order by walking the bitmaps slot by slot.
+
     Parameters
     ----------
     schedules : list
         contains Schedule objects.
+    duration : int
+        visit duration in minutes. Only hours starting enough consecutive
+        free slots are returned.
 
     Returns
     ----------
@@ -50,80 +139,417 @@ def get_day_schedule(schedules):
         hour : datetime.time
     """
 
+    schedules = list(schedules)
+    free_bitmaps = get_cached_free_bitmaps(schedules, duration)
+    schedule_bitmaps = [
+        (schedule, free_bitmaps.get(
+            (schedule.employee_id, _as_date(schedule.date)), 0))
+        for schedule in schedules
+    ]
+    any_free = bitmaps.union(bitmap for _, bitmap in schedule_bitmaps)
+
     day_schedule_by_available_hours = []
-    for schedule in schedules:
-        available_hours = get_appointment_times(schedule)
-        for hour in available_hours:
-            if is_appointment_available(schedule.employee, schedule.date, hour):
-                appointment_details = {
-                    "employee_id": schedule.employee.id,
-                    "employee_full_name": schedule.emp_full_name(),
-                    "date": schedule.date,
-                    "hour": hour}
+    for index in bitmaps.iter_slot_indexes(any_free):
+        hour = bitmaps.get_slot_time(index)
+        for schedule, bitmap in schedule_bitmaps:
+            if bitmap >> index & 1:
+                appointment_details = _get_appointment_details(schedule, hour)
                 day_schedule_by_available_hours.append(appointment_details)
-    return sorted(day_schedule_by_available_hours, key=_sort_day_schedule_by_hour)
+    return day_schedule_by_available_hours
 
 
-def _sort_day_schedule_by_hour(appointment):
+def get_earliest_free_slots(schedules, limit, duration=APPOINTMENT_TIME):
     """
-    Sort appointments ascending by hour.
+    Get the earliest available appointments across many days and employees.
+
+    Each employee free slots are generated lazily in time order and k-way
+    merged, so no more slots than requested are built. Free slots missing
+    from the cache are read for the whole date range with a single query.
+
+    Parameters
+    ----------
+    schedules : list
+        contains Schedule objects.
+    limit : int
+        maximum number of slots returned.
+    duration : int
+        visit duration in minutes.
+
+    Returns
+    ----------
+    list of dictionaries
+        employee_id : int
+        employee_full_name : str
+        date : datetime.date
+        hour : datetime.time
+    """
+
+    schedules = list(schedules)
+    free_bitmaps = get_cached_free_bitmaps(schedules, duration)
+    schedules_by_employee = {}
+    for schedule in schedules:
+        schedules_by_employee.setdefault(schedule.employee_id, []).append(
+            schedule)
+
+    employee_slots = [
+        _iter_free_slots(employee_schedules, free_bitmaps)
+        for employee_schedules in schedules_by_employee.values()
+    ]
+    merged = heapq.merge(*employee_slots, key=itemgetter(0, 1))
+    return [
+        details for _, _, details in itertools.islice(merged, limit)
+    ]
+
+
+def _iter_free_slots(schedules, free_bitmaps):
+    """
+    Yield (datetime, employee_id, appointment details) of one employee free
+    slots in time order.
+    """
+
+    for schedule in sorted(schedules, key=lambda s: _as_date(s.date)):
+        day = _as_date(schedule.date)
+        bitmap = free_bitmaps.get((schedule.employee_id, day), 0)
+        for slot_datetime in bitmaps.iter_slot_datetimes(bitmap, day):
+            yield (
+                slot_datetime,
+                schedule.employee_id,
+                _get_appointment_details(schedule, slot_datetime.time())
+            )
+
+
+def _get_appointment_details(schedule, hour):
+    """
+    Describe a free slot for search results.
+    """
+
+    return {
+        "employee_id": schedule.employee.id,
+        "employee_full_name": schedule.emp_full_name(),
+        "date": schedule.date,
+        "hour": hour
+    }
+
+
+def get_cached_free_bitmaps(schedules, duration=APPOINTMENT_TIME):
+    """
+    Get future free slots bitmaps of given schedules, cached per doctor day.
+
+    Parameters
+    ----------
+    schedules : list
+        contains Schedule objects.
+    duration : int
+        visit duration in minutes. Only slots starting enough consecutive
+        free slots are set.
+
+    Returns
+    ----------
+    dict
+        (employee_id, datetime.date) keys, free slots bitmap values.
+    """
+
+    schedules_by_key = {
+        (schedule.employee_id, _as_date(schedule.date)): schedule
+        for schedule in schedules if schedule.employee_id
+    }
+
+    def compute(keys):
+        return get_free_bitmaps(
+            [schedules_by_key[key] for key in keys], include_past=True
+        )
+
+    free_bitmaps = get_or_compute_free_slots(schedules_by_key, compute)
+    now = datetime.now()
+    return {
+        key: bitmaps.get_fitting_bitmap(bitmap, duration)
+        & bitmaps.get_future_bitmap(key[1], now)
+        for key, bitmap in free_bitmaps.items()
+    }
+
+
+def get_free_bitmaps(schedules, include_past=False):
+    """
+    Read free slots of given schedules from the FreeSlot table.
+
+    Parameters
+    ----------
+    schedules : list
+        contains Schedule objects.
+    include_past : bool
+        return slots that have already passed too.
+
+    Returns
+    ----------
+    dict
+        (employee_id, datetime.date) keys, free slots bitmap values. Doctor
+        days without free slots are left out.
     """
 
-    return appointment["hour"].strftime("%H:%M")
+    range_start, range_end, employee_ids = _get_schedules_range(schedules)
+    if not employee_ids:
+        return {}
 
+    if not include_past:
+        range_start = max(range_start, _as_aware(datetime.now()))
+    slots = FreeSlot.objects.filter(
+        Q(doctor__in=employee_ids)
+        & Q(datetime__gte=range_start)
+        & Q(datetime__lt=range_end)
+    ).values_list("doctor_id", "datetime")
 
-def get_next_appointment(doctor):
+    free_bitmaps = {}
+    for doctor_id, slot_datetime in slots:
+        slot_datetime = _as_naive(slot_datetime)
+        key = (doctor_id, slot_datetime.date())
+        free_bitmaps[key] = free_bitmaps.get(key, 0) | bitmaps.get_times_bitmap(
+            [slot_datetime.time()])
+    return free_bitmaps
+
+
+def compute_free_bitmaps(schedules):
     """
-    Return doctors next appointment or None if there isn't one.
+    Work out free slots of given schedules from Schedule and Appointment rows.
+
+    Working hours come from schedules without breaks and absences. Booked
+    appointments for all schedules are fetched with a single query and every
+    slot they overlap is subtracted from working hours bitmaps. Past slots
+    are included.
 
     Parameters
     ----------
-    doctor : User
-        user assigned to physicians group
+    schedules : list
+        contains Schedule objects.
 
     Returns
     ----------
-    Appointment or None
-        doctors next appointment or None if there isn't one
+    dict
+        (employee_id, datetime.date) keys, free slots bitmap values.
+    """
+
+    schedules = list(schedules)
+    booked_bitmaps = {}
+    for employee_id, start, duration in get_booked_appointments(schedules):
+        key = (employee_id, start.date())
+        booked_bitmaps[key] = booked_bitmaps.get(key, 0) \
+            | bitmaps.get_busy_bitmap(start.time(), duration)
+
+    free_bitmaps = {}
+    for key, intervals in get_working_intervals(schedules).items():
+        shift = bitmaps.union(
+            bitmaps.get_shift_bitmap(start, end) for start, end in intervals
+        )
+        free_bitmaps[key] = bitmaps.get_free_bitmap(
+            shift, booked_bitmaps.get(key, 0))
+    return free_bitmaps
+
+
+def rebuild_free_slots(schedules):
+    """
+    Replace FreeSlot rows of given schedules with freshly computed ones.
+
+    Parameters
+    ----------
+    schedules : list
+        contains Schedule objects.
+    """
+
+    schedules = list(schedules)
+    on_duty = [schedule for schedule in schedules if schedule.employee_id]
+    free_bitmaps = compute_free_bitmaps(on_duty)
+    # same as _as_aware without looking the time zone up for every slot
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+    with transaction.atomic():
+        FreeSlot.objects.filter(
+            schedule__in=[schedule.pk for schedule in schedules]
+        ).delete()
+        FreeSlot.objects.bulk_create(
+            (
+                FreeSlot(
+                    schedule_id=schedule.pk,
+                    doctor_id=schedule.employee_id,
+                    datetime=slot_datetime.replace(tzinfo=tz)
+                )
+                for schedule in on_duty
+                for slot_datetime in bitmaps.iter_slot_datetimes(
+                    free_bitmaps[
+                        (schedule.employee_id, _as_date(schedule.date))],
+                    _as_date(schedule.date)
+                )
+            ),
+            batch_size=FREE_SLOT_BATCH_SIZE
+        )
+    for schedule in on_duty:
+        invalidate_free_slots(schedule.employee_id, _as_date(schedule.date))
+
+
+def take_free_slot(doctor_id, appointment_datetime, duration):
+    """
+    Remove slots overlapping a booked appointment from the FreeSlot table.
+    """
+
+    start = _as_aware(appointment_datetime)
+    FreeSlot.objects.filter(
+        Q(doctor_id=doctor_id)
+        & Q(datetime__gt=start - timedelta(minutes=APPOINTMENT_TIME))
+        & Q(datetime__lt=start + timedelta(minutes=duration))
+    ).delete()
+    invalidate_free_slots(doctor_id, _as_naive(appointment_datetime).date())
+
+
+def release_free_slot(doctor_id, appointment_datetime):
     """
+    Recompute free slots of a doctor day an appointment was removed from.
 
-    appointments = Appointment.objects.filter(
-        Q(doctor=doctor)
-        & Q(took_place=None)).order_by("datetime")
-    if appointments:
-        return appointments[0]
-    return None
+    Slots the appointment overlapped stay taken if other appointments overlap
+    them too.
+    """
 
+    schedules = Schedule.objects.filter(
+        employee_id=doctor_id,
+        date=_as_naive(appointment_datetime).date()
+    )
+    rebuild_free_slots(schedules)
 
-def is_appointment_available(doctor, date, hour):
+
+def get_booked_appointments(schedules):
     """
-    Check if a doctor has no appointments scheduled at given datetime.
+    Get start and duration of appointments booked within given schedules.
+
+    All appointments are fetched with one query regardless of the number of
+    schedules.
 
     Parameters
     ----------
-    doctor : User
-        user assigned to physicians group
-    date : datetime.date
-        appointment date
-    hour : datetime.time
-        appointment time
+    schedules : list
+        contains Schedule objects.
 
     Returns
     ----------
-    bool
-        True if datetime free to schedule, False otherwise.
+    set of tuples
+        (employee_id, naive datetime.datetime, duration in minutes) of every
+        booked appointment.
     """
 
-    appointment_datetime = datetime.combine(date, hour)
+    range_start, range_end, employee_ids = _get_schedules_range(schedules)
+    if not employee_ids:
+        return set()
+
+    booked = Appointment.objects.filter(
+        Q(doctor__in=employee_ids)
+        & Q(datetime__gte=range_start)
+        & Q(datetime__lt=range_end)
+    ).values_list("doctor_id", "datetime", "duration")
 
-    if appointment_datetime < datetime.now():
-        return False
+    return {
+        (doctor_id, _as_naive(appointment_datetime), duration)
+        for doctor_id, appointment_datetime, duration in booked
+    }
 
-    scheduled_appointment = Appointment.objects.filter(
-        Q(doctor=doctor)
-        & Q(datetime=appointment_datetime)
+
+def _get_schedules_range(schedules):
+    """
+    Get aware datetime range covering all schedules days and employee ids.
+    """
+
+    employee_ids = {schedule.employee_id for schedule in schedules}
+    dates = {_as_date(schedule.date) for schedule in schedules}
+    if not dates:
+        return None, None, employee_ids
+
+    range_start = _as_aware(datetime.combine(min(dates), time.min))
+    range_end = _as_aware(
+        datetime.combine(max(dates) + timedelta(days=1), time.min)
     )
+    return range_start, range_end, employee_ids
+
+
+def _as_date(value):
+    """
+    Strip time from datetime objects assigned to date fields.
+    """
+
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _as_aware(value):
+    """
+    Make naive datetime aware in the current time zone if time zones are on.
+    """
+
+    if settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def _as_naive(value):
+    """
+    Convert aware datetime to a naive one in the current time zone.
+    """
+
+    if timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def get_appointment_page(appointments, after=None, size=DASHBOARD_PAGE_SIZE):
+    """
+    Get a page of appointments using keyset pagination.
+
+    Appointments are ordered by datetime and ID, a page starts right after
+    the last appointment of the previous one. Unlike offset pagination every
+    page costs the same no matter how far it is.
+
+    Parameters
+    ----------
+    appointments : QuerySet
+        Appointment queryset.
+    after : tuple
+        (datetime, id) of the last appointment of the previous page or None
+        for the first page.
+    size : int
+        page size.
+
+    Returns
+    ----------
+    tuple
+        list of appointments and cursor of the next page, None if this is
+        the last one.
+    """
+
+    appointments = appointments.order_by("datetime", "id")
+    if after is not None:
+        after_datetime, after_id = after
+        appointments = appointments.filter(
+            Q(datetime__gt=after_datetime)
+            | (Q(datetime=after_datetime) & Q(id__gt=after_id))
+        )
+    page = list(appointments[:size + 1])
+    if len(page) > size:
+        page = page[:size]
+        return page, encode_appointment_cursor(page[-1])
+    return page, None
+
+
+def encode_appointment_cursor(appointment):
+    """
+    Page cursor pointing right after an appointment.
+    """
+
+    return f"{appointment.datetime.isoformat()}_{appointment.id}"
+
+
+def decode_appointment_cursor(cursor):
+    """
+    Get (datetime, id) from a page cursor.
+
+    Raises
+    ----------
+    ValueError
+        if cursor is invalid.
+    """
 
-    if scheduled_appointment:
-        return False
-    return True
+    datetime_string, _, appointment_id = cursor.rpartition("_")
+    return datetime.fromisoformat(datetime_string), int(appointment_id)
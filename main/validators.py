@@ -1,6 +1,8 @@
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 
+from .roles import get_physician_ids
+
 
 def is_physician(user_id):
     """
@@ -16,6 +18,6 @@ def is_physician(user_id):
         If user is not assigned to group "physicians".
     """
 
-    user = User.objects.get(pk=user_id)
-    if not user.groups.filter(name__iexact="physicians").exists():
+    user_id = User._meta.pk.to_python(user_id)
+    if user_id not in get_physician_ids([user_id]):
         raise ValidationError("User is not a physician!")
\ No newline at end of file
@@ -1,19 +1,47 @@
 import datetime
 
-from django.db.models import Q
-from django.db.utils import IntegrityError
-from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
-from django.http import HttpResponseRedirect
+from django.http import (
+    Http404, HttpResponse, HttpResponseRedirect, JsonResponse,
+    StreamingHttpResponse
+)
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.http import condition
 
+from .booking import (
+    SLOT_TAKEN_MESSAGE, SlotTaken, book_appointment, book_appointments,
+    get_series_datetimes, hold_slot
+)
+from .const import DEFAULT_VISIT_TYPE, EARLIEST_SLOTS_LIMIT, VISIT_DURATIONS
 from .forms import (
-    ScheduleSearchForm, AppointmentConfirmForm, AppointmentModelForm
+    AVAILABLE_DATES, ScheduleSearchForm, AppointmentConfirmForm,
+    AppointmentModelForm, SlotHoldForm, AppointmentBookForm,
+    AppointmentSeriesForm, DashboardFilterForm
+)
+from .export import DATASETS, FORMATS, export, parse_since
+from .fhir import FORMATS as FHIR_FORMATS, RESOURCE_TYPES, serialize
+from .ical import (CONTENT_TYPE, get_feed_appointments, get_feed_state,
+                   get_feed_token, render_feed)
+from .mixins import NurseRequiredMixin, StaffRequiredMixin
+from .roles import is_doctor, is_nurse
+from .models import Appointment
+from .querysets import (
+    get_dashboard_appointments, get_day_start, get_specialty_schedules
+)
+from .utils import (
+    get_appointment_page, get_day_schedule, get_earliest_free_slots
+)
+from .worklist import (
+    find_appointment, get_overdue_appointments, get_worklist,
+    parse_appointment_datetime
 )
-from .models import Schedule, Appointment
-from .utils import get_day_schedule, get_next_appointment
 from patients.models import Patient
 
 
@@ -28,30 +56,48 @@ class MainView(LoginRequiredMixin, View):
         """
 
         user = self.request.user
-        is_nurse = user.groups.filter(name__iexact="nurses").exists()
-        is_doctor = user.groups.filter(name__iexact="physicians").exists()
-
-        if is_doctor:
-            appointment = get_next_appointment(user)
-            if appointment:
-                form = AppointmentModelForm(
-                    instance=appointment,
-                    label_suffix=""
-                )
-                context = {
-                    "form": form
-                }
-                return render(request, "main/index.html", context)
-        elif is_nurse:
-            appointments = Appointment.objects.filter(
-                Q(datetime__gte=datetime.datetime.today())
-            ).order_by("datetime")
-            context = {
-                "appointments": appointments
-            }
-            return render(request, "main/index.html", context)
+        if is_doctor(user):
+            return render(
+                request,
+                "main/index.html",
+                self._get_worklist_context(get_worklist(user))
+            )
+        elif is_nurse(user):
+            return self._get_dashboard(request)
         return render(request, "main/index.html")
 
+    def _get_dashboard(self, request):
+        """
+        List a page of appointments from today or a chosen day, optionally
+        of one doctor or specialty.
+        """
+
+        form = DashboardFilterForm(request.GET)
+        context = {
+            "filter_form": form,
+            "appointments": []
+        }
+        if not form.is_valid():
+            return render(request, "main/index.html", context)
+
+        data = form.cleaned_data
+        if data["date"]:
+            start = get_day_start(data["date"])
+            end = start + datetime.timedelta(days=1)
+        else:
+            start, end = timezone.now(), None
+        appointments = get_dashboard_appointments(
+            start, end, data["doctor"], data["specialty"]
+        )
+
+        page, cursor = get_appointment_page(appointments, data["after"])
+        context["appointments"] = page
+        if cursor:
+            query = request.GET.copy()
+            query["after"] = cursor
+            context["next_page"] = f"?{query.urlencode()}"
+        return render(request, "main/index.html", context)
+
     def post(self, request):
         """
         Update appointment details and display the next one if form is valid.
@@ -59,45 +105,58 @@ class MainView(LoginRequiredMixin, View):
         """
 
         doctor = self.request.user
-        datetime = self.request.POST.get("datetime")
-        appointments = Appointment.objects.filter(
-            Q(doctor=doctor)
-            & Q(datetime=datetime)
-        )
+        datetime = parse_appointment_datetime(request.POST.get("datetime"))
+        worklist = get_worklist(doctor)
+        appointment = find_appointment(worklist, datetime)
+        if appointment is None:
+            appointment = get_object_or_404(
+                Appointment, doctor=doctor, datetime=datetime
+            )
 
-        form = AppointmentModelForm(request.POST, instance=appointments[0])
+        form = AppointmentModelForm(request.POST, instance=appointment)
 
         if form.is_valid():
             form.save()
-            doctor = self.request.user
-            next_appointment = get_next_appointment(doctor)
-            if next_appointment:
-                new_form = AppointmentModelForm(
-                    instance=next_appointment,
-                    label_suffix=""
-                )
-                context = {
-                    "form": new_form
-                }
-                return render(request, "main/index.html", context)
-            return render(request, "main/index.html")
+            return render(
+                request,
+                "main/index.html",
+                self._get_worklist_context(worklist)
+            )
         context = {
             "form": form
         }
         return render(request, "main/index.html", context)
 
+    def _get_worklist_context(self, worklist):
+        """
+        Form of the first open appointment of a doctor queue, the rest of the
+        queue and overdue appointments.
+        """
+
+        queue = [
+            appointment for appointment in worklist
+            if appointment.took_place is None
+        ]
+        context = {
+            "queue": queue[1:],
+            "overdue": get_overdue_appointments(self.request.user),
+            "calendar_url": self.request.build_absolute_uri(reverse(
+                "main:calendar", args=[get_feed_token(self.request.user.pk)]
+            ))
+        }
+        if queue:
+            context["form"] = AppointmentModelForm(
+                instance=queue[0],
+                label_suffix=""
+            )
+        return context
+
 
-class ScheduleSearchView(LoginRequiredMixin, UserPassesTestMixin, View):
+class ScheduleSearchView(NurseRequiredMixin, View):
     """
     Allow nurses to schedule appointments.
     """
 
-    def test_func(self):
-        """
-        Allow only nurses
-        """
-        return self.request.user.groups.filter(name__iexact="nurses").exists()
-
     def get(self, request):
         """
         Schedule form page or selected specialists for ajax request.
@@ -117,17 +176,11 @@ class ScheduleSearchView(LoginRequiredMixin, UserPassesTestMixin, View):
         return render(request, "main/schedule.html", context)
 
 
-class ScheduleListView(LoginRequiredMixin, UserPassesTestMixin, View):
+class ScheduleListView(NurseRequiredMixin, View):
     """
     Display schedule search results.
     """
 
-    def test_func(self):
-        """
-        Allow only nurses
-        """
-        return self.request.user.groups.filter(name__iexact="nurses").exists()
-
     def get(self, request):
         """
         Get search results or redirect to schedule search form if ivalid values
@@ -137,23 +190,19 @@ class ScheduleListView(LoginRequiredMixin, UserPassesTestMixin, View):
         spec_id = request.GET.get("specialties")
         emp_id = request.GET.get("employee")
         date = request.GET.get("date")
-        if spec_id is None or date is None:
+        visit_type = request.GET.get("visit_type") or DEFAULT_VISIT_TYPE
+        if (spec_id is None or date is None
+                or visit_type not in VISIT_DURATIONS):
             return HttpResponseRedirect(reverse("main:schedule"))
-        elif emp_id:
-            schedules = Schedule.objects.filter(
-                Q(employee__groups__id=spec_id)
-                & Q(employee__id=emp_id)
-                & Q(date=date)
-            )
-        else:
-            schedules = Schedule.objects.filter(
-                Q(employee__groups__id=spec_id)
-                & Q(date=date)
-            )
+        schedules = get_specialty_schedules(spec_id, date, employee_id=emp_id)
 
         context = {
             "date": datetime.datetime.strptime(date, "%Y-%m-%d"),
-            "schedule": get_day_schedule(schedules)
+            "visit_type": visit_type,
+            "schedule": get_day_schedule(
+                schedules,
+                VISIT_DURATIONS[visit_type]
+            )
         }
         return render(request, "main/schedule_search_results.html", context)
 
@@ -165,20 +214,63 @@ class ScheduleListView(LoginRequiredMixin, UserPassesTestMixin, View):
         request.session["hour"] = request.POST.get("hour")
         request.session["date"] = request.POST.get("date")
         request.session["doctor_id"] = request.POST.get("doctor_id")
+        request.session["visit_type"] = request.POST.get("visit_type")
 
         return HttpResponseRedirect(reverse("main:confirm_appointment"))
 
 
-class AppointmentConfirmView(LoginRequiredMixin, UserPassesTestMixin, View):
+class EarliestSlotListView(NurseRequiredMixin, View):
     """
-    Select a patient and confirm appointment.
+    Display the first available appointments of a specialty over many days.
     """
 
-    def test_func(self):
+    def get(self, request):
         """
-        Allow only nurses
+        Get the earliest free slots from the selected date (today by default)
+        until the last date available for scheduling. Redirect to schedule
+        search form if invalid values provided.
         """
-        return self.request.user.groups.filter(name__iexact="nurses").exists()
+
+        spec_id = request.GET.get("specialties")
+        emp_id = request.GET.get("employee")
+        date_string = request.GET.get("date")
+        visit_type = request.GET.get("visit_type") or DEFAULT_VISIT_TYPE
+        if not spec_id or visit_type not in VISIT_DURATIONS:
+            return HttpResponseRedirect(reverse("main:schedule"))
+
+        try:
+            if date_string:
+                date_from = datetime.datetime.strptime(
+                    date_string, "%Y-%m-%d").date()
+            else:
+                date_from = datetime.date.today()
+            limit = int(request.GET.get("limit", EARLIEST_SLOTS_LIMIT))
+        except ValueError:
+            return HttpResponseRedirect(reverse("main:schedule"))
+        date_to = AVAILABLE_DATES[-1][0]
+        limit = min(max(limit, 1), EARLIEST_SLOTS_LIMIT)
+
+        schedules = get_specialty_schedules(
+            spec_id, date_from, date_to, emp_id
+        )
+
+        context = {
+            "date_from": date_from,
+            "date_to": date_to,
+            "visit_type": visit_type,
+            "schedule": get_earliest_free_slots(
+                schedules,
+                limit,
+                VISIT_DURATIONS[visit_type]
+            )
+        }
+        return render(request, "main/schedule_earliest_results.html", context)
+
+
+class AppointmentConfirmView(NurseRequiredMixin, View):
+    """
+    Select a patient and confirm appointment.
+    """
 
     def get(self, request):
         """
@@ -236,26 +328,161 @@ class AppointmentConfirmView(LoginRequiredMixin, UserPassesTestMixin, View):
             date = datetime.datetime.strptime(date_string, "%Y-%m-%d").date()
             time = datetime.datetime.strptime(time_string, "%H:%M").time()
             appointment_datetime = datetime.datetime.combine(date, time)
+            visit_type = request.session.get("visit_type")
             try:
                 appointment = Appointment(
                     datetime=appointment_datetime,
                     patient=patient,
                     doctor=doctor,
-                    purpose=form.cleaned_data["purpose"]
+                    purpose=form.cleaned_data["purpose"],
+                    visit_type=visit_type or DEFAULT_VISIT_TYPE
                 )
-                appointment.save()
-            except IntegrityError as e:
-                context["error"] = str(e)
+                book_appointment(appointment, held_by=request.user)
+            except ValidationError as e:
+                context["error"] = e.messages[0]
                 return render(request, "main/appointment_confirm.html", context)
             request.session["hour"] = None
             request.session["date"] = None
             request.session["doctor_id"] = None
+            request.session["visit_type"] = None
             return HttpResponseRedirect(reverse("main:main"))
 
         else:
             return render(request, "main/appointment_confirm.html", context)
 
 
+class SlotHoldView(NurseRequiredMixin, View):
+    """
+    Hold an appointment time while booking details are filled in.
+    """
+
+    def post(self, request):
+        """
+        Hold appointment time. Respond with hold expiry time or errors.
+        """
+
+        form = SlotHoldForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+
+        data = form.cleaned_data
+        try:
+            hold = hold_slot(
+                data["doctor"].id,
+                _get_slot_datetime(data),
+                VISIT_DURATIONS[data["visit_type"]],
+                request.user,
+                data["seconds"]
+            )
+        except SlotTaken as e:
+            return JsonResponse({"error": e.messages[0]}, status=409)
+        except ValidationError as e:
+            return JsonResponse({"error": e.messages[0]}, status=400)
+        return JsonResponse(
+            {
+                "doctor_id": hold.doctor_id,
+                "datetime": hold.datetime.isoformat(),
+                "expires": hold.expires.isoformat()
+            },
+            status=201
+        )
+
+
+class AppointmentBookView(NurseRequiredMixin, View):
+    """
+    Book an appointment with a single request, without session data.
+    """
+
+    def post(self, request):
+        """
+        Book appointment. Respond with its url or errors.
+        """
+
+        form = AppointmentBookForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+
+        data = form.cleaned_data
+        try:
+            patient = Patient.objects.get(personal_id=data["personal_id"])
+        except Patient.DoesNotExist:
+            return JsonResponse({"error": "Invalid patient id"}, status=400)
+
+        appointment = Appointment(
+            datetime=_get_slot_datetime(data),
+            patient=patient,
+            doctor=data["doctor"],
+            purpose=data["purpose"],
+            visit_type=data["visit_type"]
+        )
+        try:
+            book_appointment(appointment, held_by=request.user)
+        except SlotTaken as e:
+            return JsonResponse({"error": e.messages[0]}, status=409)
+        except ValidationError as e:
+            return JsonResponse({"error": e.messages[0]}, status=400)
+        return JsonResponse(
+            {"id": appointment.id, "url": appointment.get_absolute_url()},
+            status=201
+        )
+
+
+class AppointmentSeriesBookView(NurseRequiredMixin, View):
+    """
+    Book recurring appointments with a single request.
+    """
+
+    def post(self, request):
+        """
+        Book every free appointment of a series. Respond with a report of
+        booked appointments and conflicts.
+        """
+
+        form = AppointmentSeriesForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+
+        data = form.cleaned_data
+        try:
+            patient = Patient.objects.get(personal_id=data["personal_id"])
+        except Patient.DoesNotExist:
+            return JsonResponse({"error": "Invalid patient id"}, status=400)
+
+        appointments = [
+            Appointment(
+                datetime=appointment_datetime,
+                patient=patient,
+                doctor=data["doctor"],
+                purpose=data["purpose"],
+                visit_type=data["visit_type"]
+            ) for appointment_datetime in get_series_datetimes(
+                _get_slot_datetime(data),
+                data["count"],
+                datetime.timedelta(days=data["interval_days"])
+            )
+        ]
+        try:
+            report = book_appointments(appointments, held_by=request.user)
+        except SlotTaken as e:
+            return JsonResponse({"error": e.messages[0]}, status=409)
+        except IntegrityError:
+            # a concurrent booking inserted the same doctor slot first
+            return JsonResponse({"error": SLOT_TAKEN_MESSAGE}, status=409)
+        return JsonResponse(
+            {
+                "appointments": [
+                    {
+                        "datetime": entry["datetime"].isoformat(),
+                        "id": entry["appointment"] and entry["appointment"].id,
+                        "error": entry["error"]
+                    } for entry in report
+                ]
+            },
+            status=201 if any(entry["appointment"] for entry in report)
+            else 409
+        )
+
+
 class AppointmentView(LoginRequiredMixin, View):
     """
     Display a single appointment.
@@ -266,7 +493,9 @@ class AppointmentView(LoginRequiredMixin, View):
         Display appointment details or 404 if invalid appointment ID.
         """
 
-        appointment = get_object_or_404(Appointment, id=pk)
+        appointment = get_object_or_404(
+            Appointment.objects.select_related("doctor", "patient"), id=pk
+        )
         form = AppointmentModelForm(instance=appointment)
         context = {
             "form": form
@@ -279,7 +508,9 @@ class AppointmentView(LoginRequiredMixin, View):
         Display page with errors otherwise.
         """
 
-        appointment = get_object_or_404(Appointment, id=pk)
+        appointment = get_object_or_404(
+            Appointment.objects.select_related("doctor", "patient"), id=pk
+        )
         form = AppointmentModelForm(request.POST, instance=appointment)
 
         if form.is_valid():
@@ -292,17 +523,11 @@ class AppointmentView(LoginRequiredMixin, View):
         return render(request, "main/appointment.html", context)
 
 
-class AppointmentDeleteView(LoginRequiredMixin, UserPassesTestMixin, View):
+class AppointmentDeleteView(NurseRequiredMixin, View):
     """
     Confirm and delete appointment.
     """
 
-    def test_func(self):
-        """
-        Allow only nurses
-        """
-        return self.request.user.groups.filter(name__iexact="nurses").exists()
-
     def get(self, request, pk):
         """
         Confirm user wants to delete appointment.
@@ -323,3 +548,126 @@ class AppointmentDeleteView(LoginRequiredMixin, UserPassesTestMixin, View):
         appointment = get_object_or_404(Appointment, id=pk)
         appointment.delete()
         return HttpResponseRedirect(reverse("main:main"))
+
+
+def _get_slot_datetime(cleaned_data):
+    """
+    Aware appointment datetime from SlotForm cleaned data.
+    """
+
+    return timezone.make_aware(
+        datetime.datetime.combine(cleaned_data["date"], cleaned_data["hour"])
+    )
+
+
+class ExportView(StaffRequiredMixin, View):
+    """
+    Stream patients or appointments for a data warehouse.
+    """
+
+    def get(self, request, dataset):
+        """
+        Dataset in format given by format parameter (csv by default). Only
+        rows changed since given ISO datetime if since parameter is given.
+        """
+
+        if dataset not in DATASETS:
+            raise Http404()
+        format = request.GET.get("format", "csv")
+        if format not in FORMATS:
+            return JsonResponse({"error": "Unknown format"}, status=400)
+        since = request.GET.get("since")
+        if since:
+            since = parse_since(since)
+            if since is None:
+                return JsonResponse({"error": "Invalid since"}, status=400)
+
+        response = StreamingHttpResponse(
+            export(dataset, format, since), content_type=FORMATS[format]
+        )
+        extension = "csv" if format == "csv" else "ndjson"
+        response["Content-Disposition"] = (
+            f'attachment; filename="{dataset}.{extension}"'
+        )
+        return response
+
+
+class FhirView(StaffRequiredMixin, View):
+    """
+    Patients or appointments as FHIR R4 resources for other systems.
+    """
+
+    def get(self, request, resource_type):
+        """
+        Stream a searchset Bundle, or NDJSON if _format parameter is ndjson.
+        Only records changed since given ISO datetime if _since parameter is
+        given.
+        """
+
+        if resource_type not in RESOURCE_TYPES:
+            raise Http404()
+        format = request.GET.get("_format", "bundle")
+        if format not in FHIR_FORMATS:
+            return JsonResponse({"error": "Unknown format"}, status=400)
+        since = request.GET.get("_since")
+        if since:
+            since = parse_since(since)
+            if since is None:
+                return JsonResponse({"error": "Invalid _since"}, status=400)
+
+        base_url = request.build_absolute_uri(
+            reverse("main:fhir", args=[resource_type])
+        ).rsplit("/", 1)[0]
+        return StreamingHttpResponse(
+            serialize(
+                [resource_type], format, since, bundle_type="searchset",
+                base_url=base_url
+            ),
+            content_type=FHIR_FORMATS[format]
+        )
+
+
+def _get_feed_state(request, token):
+    """
+    Feed doctor ID, ETag and last modified time, computed once per request.
+    """
+
+    if not hasattr(request, "feed_state"):
+        state = get_feed_state(token)
+        if state is None:
+            raise Http404()
+        request.feed_state = state
+    return request.feed_state
+
+
+class AppointmentFeedView(View):
+    """
+    Doctor appointments as an iCalendar feed for calendar apps.
+
+    Calendar apps can't log in, the url carries a token signed with a
+    doctor feed secret instead. Polling clients sending If-None-Match or
+    If-Modified-Since get a 304 response after one aggregate query while the
+    feed is unchanged.
+    """
+
+    @method_decorator(condition(
+        etag_func=lambda request, token: _get_feed_state(request, token)[1],
+        last_modified_func=lambda request, token:
+            _get_feed_state(request, token)[2]
+    ))
+    def get(self, request, token):
+        """
+        Appointments from ICAL_FEED_PAST_DAYS days ago on.
+        """
+
+        appointments = get_feed_appointments(
+            _get_feed_state(request, token)[0]
+        )
+        return HttpResponse(
+            render_feed(
+                appointments,
+                lambda pk: request.build_absolute_uri(
+                    reverse("main:appointment", args=[pk]))
+            ),
+            content_type=CONTENT_TYPE
+        )
@@ -0,0 +1,155 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .const import NO_SHOW_BATCH_SIZE, WORKLIST_OVERDUE_LIMIT, WORKLIST_SIZE
+from .models import Appointment
+from .querysets import (get_day_open_appointments, get_day_start,
+                        get_open_appointments)
+
+
+def get_worklist(doctor, day=None, limit=WORKLIST_SIZE):
+    """
+    Get a doctor queue of open appointments of a day.
+
+    Appointments are fetched with doctors and patients in one query limited
+    to a day, so past unclosed visits don't pile up in the queue.
+
+    Parameters
+    ----------
+    doctor : User
+        user assigned to physicians group.
+    day : datetime.date
+        today if not given.
+    limit : int
+        number of appointments fetched.
+
+    Returns
+    ----------
+    list
+        Appointment objects not marked as taken place, ordered by datetime.
+    """
+
+    return list(get_day_open_appointments(doctor, day)[:limit])
+
+
+def get_overdue_appointments(doctor, day=None,
+                             limit=WORKLIST_OVERDUE_LIMIT):
+    """
+    Get a doctor appointments from before a day which were never closed.
+
+    Parameters
+    ----------
+    doctor : User
+        user assigned to physicians group.
+    day : datetime.date
+        today if not given.
+    limit : int
+        number of appointments fetched.
+
+    Returns
+    ----------
+    list
+        Appointment objects not marked as taken place, oldest first.
+    """
+
+    return list(
+        get_open_appointments(doctor).filter(
+            Q(datetime__lt=get_day_start(day))
+        )[:limit]
+    )
+
+
+def get_unattended_appointments(before):
+    """
+    Appointments started before given datetime and never closed.
+    """
+
+    return Appointment.objects.filter(
+        Q(took_place=None)
+        & Q(datetime__lt=before)
+    )
+
+
+def get_unattended_report(before):
+    """
+    Summary of appointments a sweep would mark as no-shows.
+
+    Parameters
+    ----------
+    before : datetime.datetime
+
+    Returns
+    ----------
+    dict
+        count, first and last appointment datetime.
+    """
+
+    return get_unattended_appointments(before).aggregate(
+        count=Count("id"), first=Min("datetime"), last=Max("datetime")
+    )
+
+
+def close_unattended_appointments(before, batch_size=NO_SHOW_BATCH_SIZE,
+                                  after_id=0):
+    """
+    Mark appointments started before given datetime and never closed as
+    no-shows (took_place=False), one batch per transaction.
+
+    Closed appointments leave the pending set, so an interrupted sweep can
+    simply be run again. update() skips signals, which is fine as took_place
+    doesn't change free slots, and auto_now, so modified is set explicitly.
+
+    Parameters
+    ----------
+    before : datetime.datetime
+    batch_size : int
+        appointments updated per transaction.
+    after_id : int
+        only appointments with greater ID, to resume from a known point.
+
+    Yields
+    ----------
+    tuple
+        number of appointments closed in a batch and the last ID.
+    """
+
+    appointments = get_unattended_appointments(before).order_by("id")
+    last_id = after_id
+    while True:
+        ids = list(appointments.filter(id__gt=last_id).values_list(
+            "id", flat=True)[:batch_size])
+        if not ids:
+            return
+        with transaction.atomic():
+            closed = Appointment.objects.filter(
+                Q(id__in=ids)
+                & Q(took_place=None)
+            ).update(took_place=False, modified=timezone.now())
+        last_id = ids[-1]
+        yield closed, last_id
+
+
+def parse_appointment_datetime(value):
+    """
+    Aware appointment datetime posted by appointment form or None if invalid.
+    """
+
+    try:
+        return forms.DateTimeField().to_python(value)
+    except ValidationError:
+        return None
+
+
+def find_appointment(worklist, appointment_datetime):
+    """
+    Get appointment starting at given datetime from a worklist or None.
+    """
+
+    for appointment in worklist:
+        if appointment.datetime == appointment_datetime:
+            return appointment
+    return None
+
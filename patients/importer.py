@@ -0,0 +1,225 @@
+import csv
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from main.const import PATIENT_IMPORT_BATCH_SIZE, PATIENT_IMPORT_MAX_ERRORS
+from .forms import AddressForm, PatientForm
+from .models import Address, Patient
+from .typeahead import reset_index
+
+
+FORMATS = ("csv", "ndjson")
+
+
+def read_rows(stream, format):
+    """
+    Yield patient rows of a text stream one at a time.
+
+    Parameters
+    ----------
+    stream : file-like object
+        text stream.
+    format : str
+        "csv" with a header line or "ndjson" with one JSON object per line.
+        Address fields of NDJSON rows can be nested under "address".
+
+    Yields
+    ----------
+    tuple
+        line number and dict of patient and address fields, None if a line
+        isn't a JSON object.
+    """
+
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            yield line_number, None
+            continue
+        if isinstance(row.get("address"), dict):
+            row.update(row.pop("address"))
+        yield line_number, row
+
+
+class RowValidator:
+    """
+    Clean rows with PatientForm and AddressForm field rules.
+
+    Form fields are set up once and reused, no form is built per row.
+    """
+
+    def __init__(self):
+        self.patient_fields = PatientForm().fields
+        self.address_fields = AddressForm().fields
+
+    def clean(self, row):
+        """
+        Clean patient and address fields of a row.
+
+        Parameters
+        ----------
+        row : dict
+
+        Returns
+        ----------
+        tuple
+            dicts of cleaned patient and address fields, address is None if
+            a row has no address fields.
+
+        Raises
+        ----------
+        ValidationError
+            with errors by field name.
+        """
+
+        errors = {}
+        patient = self._clean_fields(self.patient_fields, row, errors)
+        address = None
+        if any(row.get(name) for name in self.address_fields):
+            address = self._clean_fields(self.address_fields, row, errors)
+        if errors:
+            raise ValidationError(errors)
+        return patient, address
+
+    def _clean_fields(self, fields, row, errors):
+        """
+        Cleaned values of given fields, errors are added to errors dict.
+        """
+
+        cleaned = {}
+        for name, field in fields.items():
+            value = row.get(name)
+            if value is not None and not isinstance(value, str):
+                value = str(value)
+            try:
+                cleaned[name] = field.clean(value)
+            except ValidationError as e:
+                errors[name] = e.messages
+        return cleaned
+
+
+def import_patients(rows, batch_size=PATIENT_IMPORT_BATCH_SIZE,
+                    dry_run=False):
+    """
+    Validate and insert patients with addresses in batches.
+
+    Rows with a personal_id already in the database or earlier in the
+    stream are skipped. Every batch is inserted in its own transaction with
+    one query for existing personal IDs and one bulk insert per table, so
+    memory and queries per row stay constant whatever the stream size.
+
+    Parameters
+    ----------
+    rows : iterable
+        (line number, dict) tuples, see read_rows.
+    batch_size : int
+        rows inserted at once.
+    dry_run : bool
+        validate and dedupe without inserting.
+
+    Yields
+    ----------
+    dict
+        batch report with rows, created, duplicates and invalid counts and
+        errors as (line number, errors by field) tuples.
+    """
+
+    validator = RowValidator()
+    batch = []
+    for line_number, row in rows:
+        batch.append((line_number, row))
+        if len(batch) == batch_size:
+            yield _import_batch(batch, validator, dry_run)
+            batch = []
+    if batch:
+        yield _import_batch(batch, validator, dry_run)
+
+
+def summarize_import(reports, started):
+    """
+    Sum up batch reports of import_patients.
+
+    Parameters
+    ----------
+    reports : iterable
+        batch reports.
+    started : float
+        time.perf_counter() value when the import started.
+
+    Returns
+    ----------
+    dict
+        rows, created, duplicates, invalid, first PATIENT_IMPORT_MAX_ERRORS
+        errors, seconds and rows_per_second.
+    """
+
+    summary = {"rows": 0, "created": 0, "duplicates": 0, "invalid": 0,
+               "errors": []}
+    for report in reports:
+        for key in ("rows", "created", "duplicates", "invalid"):
+            summary[key] += report[key]
+        free = PATIENT_IMPORT_MAX_ERRORS - len(summary["errors"])
+        summary["errors"] += report["errors"][:free]
+    seconds = time.perf_counter() - started
+    summary["seconds"] = round(seconds, 3)
+    summary["rows_per_second"] = round(summary["rows"] / seconds, 1)
+    return summary
+
+
+def _import_batch(batch, validator, dry_run):
+    """
+    Validate, dedupe and insert a batch of rows.
+    """
+
+    report = {"rows": len(batch), "created": 0, "duplicates": 0,
+              "invalid": 0, "errors": []}
+    cleaned = {}
+    for line_number, row in batch:
+        if row is None:
+            report["invalid"] += 1
+            report["errors"].append((line_number, {"row": ["Invalid row."]}))
+            continue
+        try:
+            patient, address = validator.clean(row)
+        except ValidationError as e:
+            report["invalid"] += 1
+            report["errors"].append((line_number, e.message_dict))
+            continue
+        if patient["personal_id"] in cleaned:
+            report["duplicates"] += 1
+            continue
+        cleaned[patient["personal_id"]] = (patient, address)
+
+    existing = set(Patient.objects.filter(
+        personal_id__in=cleaned).values_list("personal_id", flat=True))
+    report["duplicates"] += len(existing)
+    new = [value for personal_id, value in cleaned.items()
+           if personal_id not in existing]
+    report["created"] = len(new)
+    if dry_run or not new:
+        return report
+
+    with transaction.atomic():
+        addresses = Address.objects.bulk_create(
+            Address(**address) for _, address in new if address
+        )
+        addresses = iter(addresses)
+        Patient.objects.bulk_create(
+            Patient(**patient, address=next(addresses) if address else None)
+            for patient, address in new
+        )
+        # bulk_create skips signals the typeahead index relies on
+        transaction.on_commit(reset_index)
+    return report
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.importer import (FORMATS, import_patients, read_rows,
+                               summarize_import)
+
+
+class Command(BaseCommand):
+    """
+    Import patients with addresses from a CSV or NDJSON file.
+    """
+
+    help = (
+        "Stream patients from a CSV or NDJSON file into the database in "
+        "batches, skipping personal IDs already registered."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File path, - for standard input.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format, guessed from file extension if not given."
+        )
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate rows without inserting them."
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or os.path.splitext(path)[1][1:].lower()
+        if format not in FORMATS:
+            raise CommandError(
+                f"Unknown format, use --format {' or '.join(FORMATS)}."
+            )
+        kwargs = {"dry_run": options["dry_run"]}
+        if options["batch_size"]:
+            kwargs["batch_size"] = options["batch_size"]
+
+        started = time.perf_counter()
+        if path == "-":
+            summary = self._import(sys.stdin, format, started, kwargs)
+        else:
+            with open(path, newline="", encoding="utf-8") as stream:
+                summary = self._import(stream, format, started, kwargs)
+
+        for line_number, errors in summary["errors"]:
+            self.stdout.write(f"line {line_number}: {errors}")
+        action = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            f"{action} {summary['rows']} rows in {summary['seconds']} s "
+            f"({summary['rows_per_second']} rows/s): "
+            f"{summary['created']} new, {summary['duplicates']} duplicates, "
+            f"{summary['invalid']} invalid."
+        )
+
+    def _import(self, stream, format, started, kwargs):
+        """
+        Import rows of a stream printing progress after every batch.
+        """
+
+        def reports():
+            rows = 0
+            for report in import_patients(read_rows(stream, format), **kwargs):
+                rows += report["rows"]
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{rows} rows, {rows / elapsed:.0f} rows/s", ending="\r"
+                )
+                yield report
+
+        summary = summarize_import(reports(), started)
+        self.stdout.write("")
+        return summary
@@ -0,0 +1,85 @@
+from django.db import migrations
+
+
+SQLITE_FORWARDS = (
+    "CREATE VIRTUAL TABLE patients_patient_search USING fts5("
+    "first_name, last_name, content='patients_patient', "
+    "content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER patients_patient_search_insert AFTER INSERT ON "
+    "patients_patient BEGIN INSERT INTO patients_patient_search"
+    "(rowid, first_name, last_name) VALUES "
+    "(new.id, new.first_name, new.last_name); END",
+    "CREATE TRIGGER patients_patient_search_delete AFTER DELETE ON "
+    "patients_patient BEGIN INSERT INTO patients_patient_search"
+    "(patients_patient_search, rowid, first_name, last_name) VALUES "
+    "('delete', old.id, old.first_name, old.last_name); END",
+    "CREATE TRIGGER patients_patient_search_update AFTER UPDATE OF "
+    "first_name, last_name ON patients_patient BEGIN "
+    "INSERT INTO patients_patient_search"
+    "(patients_patient_search, rowid, first_name, last_name) VALUES "
+    "('delete', old.id, old.first_name, old.last_name); "
+    "INSERT INTO patients_patient_search(rowid, first_name, last_name) "
+    "VALUES (new.id, new.first_name, new.last_name); END",
+    "INSERT INTO patients_patient_search(patients_patient_search) "
+    "VALUES ('rebuild')",
+    "CREATE INDEX patient_first_name_nocase ON patients_patient "
+    "(first_name COLLATE NOCASE)",
+    "CREATE INDEX patient_last_name_nocase ON patients_patient "
+    "(last_name COLLATE NOCASE)",
+)
+SQLITE_BACKWARDS = (
+    "DROP TRIGGER IF EXISTS patients_patient_search_insert",
+    "DROP TRIGGER IF EXISTS patients_patient_search_delete",
+    "DROP TRIGGER IF EXISTS patients_patient_search_update",
+    "DROP TABLE IF EXISTS patients_patient_search",
+    "DROP INDEX IF EXISTS patient_first_name_nocase",
+    "DROP INDEX IF EXISTS patient_last_name_nocase",
+)
+POSTGRESQL_FORWARDS = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX patient_first_name_trgm ON patients_patient "
+    "USING gin (UPPER(first_name::text) gin_trgm_ops)",
+    "CREATE INDEX patient_last_name_trgm ON patients_patient "
+    "USING gin (UPPER(last_name::text) gin_trgm_ops)",
+    "CREATE INDEX patient_first_name_prefix ON patients_patient "
+    "(UPPER(first_name::text) text_pattern_ops)",
+    "CREATE INDEX patient_last_name_prefix ON patients_patient "
+    "(UPPER(last_name::text) text_pattern_ops)",
+)
+POSTGRESQL_BACKWARDS = (
+    "DROP INDEX IF EXISTS patient_first_name_trgm",
+    "DROP INDEX IF EXISTS patient_last_name_trgm",
+    "DROP INDEX IF EXISTS patient_first_name_prefix",
+    "DROP INDEX IF EXISTS patient_last_name_prefix",
+)
+
+
+def _run(statements):
+    """
+    Run SQL statements for the current database vendor.
+    """
+
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0002_patient_personal_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({
+                "sqlite": SQLITE_FORWARDS,
+                "postgresql": POSTGRESQL_FORWARDS,
+            }),
+            _run({
+                "sqlite": SQLITE_BACKWARDS,
+                "postgresql": POSTGRESQL_BACKWARDS,
+            }),
+        ),
+    ]
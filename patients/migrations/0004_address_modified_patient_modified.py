@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-18 20:50
+
+from django.db import migrations, models
+
+
+# SQLite rebuilds patients_patient when a field is added and drops its
+# search triggers and indexes (see 0003_patient_search_index).
+SQLITE_RECREATE = (
+    "CREATE TRIGGER IF NOT EXISTS patients_patient_search_insert AFTER "
+    "INSERT ON patients_patient BEGIN INSERT INTO patients_patient_search"
+    "(rowid, first_name, last_name) VALUES "
+    "(new.id, new.first_name, new.last_name); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_patient_search_delete AFTER "
+    "DELETE ON patients_patient BEGIN INSERT INTO patients_patient_search"
+    "(patients_patient_search, rowid, first_name, last_name) VALUES "
+    "('delete', old.id, old.first_name, old.last_name); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_patient_search_update AFTER "
+    "UPDATE OF first_name, last_name ON patients_patient BEGIN "
+    "INSERT INTO patients_patient_search"
+    "(patients_patient_search, rowid, first_name, last_name) VALUES "
+    "('delete', old.id, old.first_name, old.last_name); "
+    "INSERT INTO patients_patient_search(rowid, first_name, last_name) "
+    "VALUES (new.id, new.first_name, new.last_name); END",
+    "INSERT INTO patients_patient_search(patients_patient_search) "
+    "VALUES ('rebuild')",
+    "CREATE INDEX IF NOT EXISTS patient_first_name_nocase ON "
+    "patients_patient (first_name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS patient_last_name_nocase ON "
+    "patients_patient (last_name COLLATE NOCASE)",
+)
+
+
+def recreate_search_index(apps, schema_editor):
+    """
+    Recreate SQLite patient search triggers and indexes.
+    """
+
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in SQLITE_RECREATE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0003_patient_search_index'),
+    ]
+
+    operations = [
+        # recreate them after unapplying this migration
+        migrations.RunPython(
+            migrations.RunPython.noop,
+            recreate_search_index,
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        # and after applying it
+        migrations.RunPython(
+            recreate_search_index,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -13,6 +13,7 @@ class Address(models.Model):
     zip_code = models.CharField(max_length=6)
     city = models.CharField(max_length=100)
     country = models.CharField(max_length=100)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name_plural = "Addresses"
@@ -48,6 +49,7 @@ class Patient(models.Model):
     phone = models.CharField(max_length=10)
     address = models.OneToOneField(
         Address, on_delete=models.SET_NULL, null=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
 
     def name(self):
@@ -0,0 +1,151 @@
+from django.db import connection
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.functions import Concat
+
+from main.const import PATIENT_SEARCH_LIMIT
+from .models import Patient
+
+
+# SQLite FTS5 side index of patient names, kept in sync by triggers.
+SEARCH_TABLE = "patients_patient_search"
+# Shorter terms can't be looked up in a trigram index.
+TRIGRAM_LENGTH = 3
+
+
+class Similarity(Func):
+    """
+    PostgreSQL pg_trgm similarity of two strings.
+    """
+
+    function = "SIMILARITY"
+    output_field = FloatField()
+
+
+class SearchResults:
+    """
+    Ranked patient IDs fetching patients only for the slice being displayed.
+
+    Can be paginated with django Paginator.
+    """
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        ids = self.ids[index]
+        if not isinstance(index, slice):
+            return Patient.objects.get(id=ids)
+        patients = Patient.objects.in_bulk(ids)
+        return [patients[id] for id in ids if id in patients]
+
+
+def search_patients(query, limit=PATIENT_SEARCH_LIMIT):
+    """
+    Find patients by personal ID prefix or by first and last name.
+
+    A query of digits only is matched against personal ID prefixes with an
+    index range scan. Other queries match names: every term has to be a part
+    of first or last name, or its beginning for terms shorter than three
+    characters. All name matches are ranked by the database before the
+    limit is applied, so the best match of a common name isn't left out.
+
+    Parameters
+    ----------
+    query : str
+    limit : int
+        maximum number of results.
+
+    Returns
+    ----------
+    SearchResults
+        patient IDs, most relevant first.
+    """
+
+    query = query.strip()
+    terms = query.split()
+    if not terms:
+        return SearchResults([])
+    if query.isdigit():
+        ids = _search_personal_id(query, limit)
+    elif min(map(len, terms)) < TRIGRAM_LENGTH:
+        ids = _search_prefix(terms, limit)
+    elif connection.vendor == "sqlite":
+        ids = _search_fts(terms, limit)
+    elif connection.vendor == "postgresql":
+        ids = _search_trigram(query, terms, limit)
+    else:
+        ids = _search_prefix(terms, limit)
+    return SearchResults(ids)
+
+
+def _search_personal_id(prefix, limit):
+    """
+    IDs of patients with personal ID starting with prefix, shortest match
+    first.
+    """
+
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return list(Patient.objects.filter(
+        Q(personal_id__gte=prefix)
+        & Q(personal_id__lt=upper)
+    ).order_by("personal_id").values_list("id", flat=True)[:limit])
+
+
+def _search_fts(terms, limit):
+    """
+    IDs of patients matching all terms in SQLite FTS5 trigram index, ranked
+    by bm25.
+    """
+
+    match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY rank LIMIT %s",
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_trigram(query, terms, limit):
+    """
+    IDs of patients with names containing all terms, using pg_trgm GIN
+    indexes, most similar first.
+    """
+
+    return list(Patient.objects.filter(
+        _name_filter(terms, "icontains")
+    ).annotate(
+        rank=Similarity(
+            Concat(F("first_name"), Value(" "), F("last_name")), Value(query)
+        )
+    ).order_by("-rank", "id").values_list("id", flat=True)[:limit])
+
+
+def _search_prefix(terms, limit):
+    """
+    IDs of patients with names starting with all terms, for terms too short
+    for a trigram index and other database vendors, ordered by name.
+    """
+
+    return list(Patient.objects.filter(
+        _name_filter(terms, "istartswith")
+    ).order_by("last_name", "first_name", "id").values_list(
+        "id", flat=True)[:limit])
+
+
+def _name_filter(terms, lookup):
+    """
+    Every term matched against first or last name with given lookup.
+    """
+
+    name_filter = Q()
+    for term in terms:
+        name_filter &= (
+            Q(**{f"first_name__{lookup}": term})
+            | Q(**{f"last_name__{lookup}": term})
+        )
+    return name_filter
@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Patient
+from .typeahead import index_patient, unindex_patient
+
+
+@receiver(post_save, sender=Patient)
+def update_typeahead_index(sender, instance, **kwargs):
+    """
+    Index a saved patient once the transaction commits.
+    """
+
+    transaction.on_commit(lambda: index_patient(instance))
+
+
+@receiver(post_delete, sender=Patient)
+def remove_from_typeahead_index(sender, instance, **kwargs):
+    """
+    Remove a deleted patient from the index once the transaction commits.
+    """
+
+    patient_id = instance.id
+    transaction.on_commit(lambda: unindex_patient(patient_id))
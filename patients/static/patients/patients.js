@@ -32,4 +32,30 @@ function restoreDefault() {
 
 document.querySelector(".edit").addEventListener("click", enableInputs)
 
-disableInputs();
\ No newline at end of file
+disableInputs();
+var treatmentHistory = document.querySelector(".treatment-history");
+treatmentHistory.addEventListener("click", loadTreatmentHistory)
+
+/**
+ * Replace load more button with the next page of treatment history.
+ * @param e - click event in treatment history.
+ */
+async function loadTreatmentHistory(e) {
+    if (!e.target.classList.contains("load-history")) {
+        return;
+    }
+    var button = e.target;
+    button.disabled = true;
+    response = await fetch(button.dataset.url, {
+        method: "GET",
+        headers: {
+            "X-Requested-With": "XMLHttpRequest"
+        }
+    });
+    if (response.ok) {
+        button.insertAdjacentHTML("afterend", await response.text());
+        button.remove();
+    } else {
+        button.disabled = false;
+    }
+}
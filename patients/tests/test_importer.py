@@ -0,0 +1,149 @@
+import io
+import json
+import tempfile
+import time
+
+from django.contrib.auth.models import Group, User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..importer import import_patients, read_rows, summarize_import
+from ..models import Patient
+
+
+HEADER = (
+    "first_name,last_name,date_of_birth,personal_id,email,phone,"
+    "street,number,apartment,zip_code,city,country\n"
+)
+
+
+def _csv_line(i, address=True, date_of_birth="1980-01-02"):
+    line = (
+        f"Name{i},Test,{date_of_birth},{i:011d},test{i}@example.com,"
+        "0123456789,"
+    )
+    if address:
+        return line + f"Main,{i},,00-001,Testington,Testland\n"
+    return line + ",,,,,\n"
+
+
+class TestReadRows(TestCase):
+
+    def test_csv(self):
+        rows = list(read_rows(io.StringIO(HEADER + _csv_line(1)), "csv"))
+        self.assertEqual(1, len(rows))
+        line_number, row = rows[0]
+        self.assertEqual(2, line_number)
+        self.assertEqual("00000000001", row["personal_id"])
+
+    def test_ndjson_nested_address(self):
+        stream = io.StringIO(
+            json.dumps({"first_name": "Anna", "address": {"city": "Paris"}})
+            + "\n\nnot json\n[1]\n"
+        )
+        rows = list(read_rows(stream, "ndjson"))
+        self.assertEqual(
+            [(1, {"first_name": "Anna", "city": "Paris"}), (3, None),
+             (4, None)],
+            rows
+        )
+
+
+class TestImportPatients(TestCase):
+
+    def _import(self, lines, **kwargs):
+        rows = read_rows(io.StringIO(HEADER + "".join(lines)), "csv")
+        return summarize_import(
+            import_patients(rows, **kwargs), time.perf_counter()
+        )
+
+    def test_creates_patients_with_addresses(self):
+        summary = self._import([_csv_line(1), _csv_line(2, address=False)])
+        self.assertEqual(2, summary["created"])
+        first, second = Patient.objects.order_by("personal_id")
+        self.assertEqual("Testington", first.address.city)
+        self.assertIsNone(second.address)
+
+    def test_skips_duplicates(self):
+        self._import([_csv_line(1)])
+        summary = self._import(
+            [_csv_line(1), _csv_line(2), _csv_line(2)], batch_size=2
+        )
+        self.assertEqual(1, summary["created"])
+        self.assertEqual(2, summary["duplicates"])
+        self.assertEqual(2, Patient.objects.count())
+
+    def test_reports_invalid_rows(self):
+        summary = self._import([
+            _csv_line(1, date_of_birth="1980-13-01"),
+            _csv_line(2).replace("test2@example.com", "nope"),
+            _csv_line(3)
+        ])
+        self.assertEqual(1, summary["created"])
+        self.assertEqual(2, summary["invalid"])
+        self.assertEqual(
+            [(2, ["date_of_birth"]), (3, ["email"])],
+            [(line, list(errors)) for line, errors in summary["errors"]]
+        )
+
+    def test_dry_run(self):
+        summary = self._import([_csv_line(1)], dry_run=True)
+        self.assertEqual(1, summary["created"])
+        self.assertFalse(Patient.objects.exists())
+
+    def test_queries_per_batch(self):
+        with self.assertNumQueries(5):
+            # per batch: existing IDs, savepoint, addresses, patients,
+            # savepoint release
+            self._import([_csv_line(i) for i in range(50)], batch_size=50)
+
+
+class TestImportPatientsCommand(TestCase):
+
+    def test_import(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = f"{directory.name}/patients.csv"
+        with open(path, "w") as f:
+            f.write(HEADER + _csv_line(1) + _csv_line(2))
+        out = io.StringIO()
+        call_command("import_patients", path, stdout=out)
+        self.assertIn("2 new, 0 duplicates, 0 invalid", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertEqual(2, Patient.objects.count())
+
+
+class TestPatientImportView(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="nurse")
+        self.user.groups.add(Group.objects.create(name="nurses"))
+        self.client.force_login(self.user)
+
+    def test_upload_ndjson(self):
+        data = "".join(json.dumps({
+            "first_name": "Anna",
+            "last_name": "Test",
+            "date_of_birth": "1980-01-02",
+            "personal_id": f"{i:011d}",
+            "email": "anna@example.com",
+            "phone": "0123456789"
+        }) + "\n" for i in range(3))
+        response = self.client.post("/patient/import", {
+            "file": SimpleUploadedFile("patients.ndjson", data.encode())
+        })
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, response.json()["created"])
+        self.assertEqual(3, Patient.objects.count())
+
+    def test_upload_unknown_format(self):
+        response = self.client.post("/patient/import", {
+            "file": SimpleUploadedFile("patients.xls", b"")
+        })
+        self.assertEqual(400, response.status_code)
+
+    def test_nurses_only(self):
+        self.user.groups.clear()
+        response = self.client.post("/patient/import")
+        self.assertEqual(403, response.status_code)
@@ -0,0 +1,129 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+
+from ..models import Patient
+from ..search import search_patients
+
+
+class TestSearchPatients(TestCase):
+
+    def setUp(self):
+        names = (
+            ("Johnny", "Test", "90010112345"),
+            ("John", "Johnson", "90010154321"),
+            ("Anna", "Smith", "85050512345"),
+            ("Jo", "Lee", "70070712345"),
+        )
+        self.patients = {
+            first_name: Patient.objects.create(
+                first_name=first_name,
+                last_name=last_name,
+                date_of_birth="2022-12-12",
+                personal_id=personal_id,
+                email="email@email.com",
+                phone="0123456789",
+                address=None
+            ) for first_name, last_name, personal_id in names
+        }
+
+    def _names(self, results):
+        return [patient.first_name for patient in results[:len(results)]]
+
+    def test_personal_id_prefix(self):
+        self.assertEqual(
+            ["Johnny", "John"], self._names(search_patients("900101"))
+        )
+        self.assertEqual(["Anna"], self._names(search_patients("85050512345")))
+        self.assertEqual([], self._names(search_patients("0101")))
+
+    def test_name_part(self):
+        self.assertEqual(
+            {"Johnny", "John"}, set(self._names(search_patients("john")))
+        )
+        self.assertEqual(["Anna"], self._names(search_patients("mit")))
+
+    def test_all_terms_match(self):
+        self.assertEqual(
+            ["John"], self._names(search_patients("john johnson"))
+        )
+
+    def test_best_match_first(self):
+        self.assertEqual("John", self._names(search_patients("johnson"))[0])
+
+    def test_best_match_among_many_weaker_matches(self):
+        Patient.objects.bulk_create(
+            Patient(
+                first_name="Adam",
+                last_name="Smithson",
+                date_of_birth="2022-12-12",
+                personal_id=f"{i:011}",
+                email="email@email.com",
+                phone="0123456789"
+            ) for i in range(1500)
+        )
+        exact = Patient.objects.create(
+            first_name="Adam",
+            last_name="Smith",
+            date_of_birth="2022-12-12",
+            personal_id="60060612345",
+            email="email@email.com",
+            phone="0123456789"
+        )
+        results = search_patients("adam smith", limit=10)
+        self.assertEqual(exact.id, results.ids[0])
+
+    def test_short_term_prefix(self):
+        self.assertEqual(["Jo", "John", "Johnny"], sorted(
+            self._names(search_patients("jo"))))
+        self.assertEqual(["Jo"], self._names(search_patients("le")))
+
+    def test_limit(self):
+        self.assertEqual(1, len(search_patients("john", limit=1)))
+
+    def test_index_follows_updates(self):
+        patient = self.patients["Anna"]
+        patient.last_name = "Kowalska"
+        patient.save()
+        self.assertEqual([], self._names(search_patients("smith")))
+        self.assertEqual(["Anna"], self._names(search_patients("kowal")))
+        # Patient.delete() fails on appointment default, delete with SQL
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM patients_patient WHERE id = %s", [patient.id]
+            )
+        self.assertEqual([], self._names(search_patients("kowal")))
+
+    def test_blank_query(self):
+        self.assertEqual(0, len(search_patients("  ")))
+
+
+class TestSearchResultsPagination(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="test_name")
+        self.client.force_login(self.user)
+        Patient.objects.bulk_create(
+            Patient(
+                first_name="Johnny",
+                last_name=f"Test{i}",
+                date_of_birth="2022-12-12",
+                personal_id=f"{i:011d}",
+                email="email@email.com",
+                phone="0123456789"
+            ) for i in range(25)
+        )
+
+    def test_pages(self):
+        response = self.client.get("/patient/search-results?query=johnny")
+        self.assertEqual(20, len(response.context["patients"]))
+        self.assertTrue(response.context["page_obj"].has_next())
+        response = self.client.get(
+            "/patient/search-results?query=johnny&page=2"
+        )
+        self.assertEqual(5, len(response.context["patients"]))
+
+    def test_page_fetches_displayed_patients_only(self):
+        with self.assertNumQueries(5):
+            # session, user, roles, search, patients on page
+            self.client.get("/patient/search-results?query=johnny")
@@ -0,0 +1,221 @@
+import threading
+from unittest.mock import Mock, patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ..models import Patient
+from ..typeahead import (PrefixIndex, build_index, get_index, index_patient,
+                         reset_index, suggest_patients)
+
+
+class TestPrefixIndex(TestCase):
+
+    def setUp(self):
+        self.index = PrefixIndex(size=3)
+        self.index.build([
+            (1, "Anna", "Smith", "85050512345"),
+            (2, "Annabel", "Lee", "90010112345"),
+            (3, "John", "Annan", "70070712345"),
+        ])
+
+    def _ids(self, query, **kwargs):
+        return [result[0] for result in self.index.lookup(query, **kwargs)]
+
+    def test_lookup_prefix(self):
+        self.assertEqual([1, 2, 3], self._ids("ann"))
+        self.assertEqual([1], self._ids("SMI"))
+        self.assertEqual([2], self._ids("9001"))
+        self.assertEqual([], self._ids("nna"))
+
+    def test_lookup_all_terms(self):
+        self.assertEqual([3], self._ids("ann jo"))
+        self.assertEqual([1], self._ids("anna smith"))
+
+    def test_lookup_limit_and_scan(self):
+        self.assertEqual([1], self._ids("ann", limit=1))
+        self.assertEqual([1, 2], self._ids("ann", limit=2, scan=2))
+        self.assertIsNone(self.index.lookup("ann", scan=2))
+
+    def test_lookup_scans_most_selective_term(self):
+        self.assertEqual([1], self._ids("ann smi", scan=1))
+        self.assertIsNone(self.index.lookup("ann a", scan=1))
+
+    def test_add_and_update(self):
+        self.index.remove(3)
+        self.index.add(4, "Olga", "Annaly", "60060612345")
+        self.assertEqual([1, 2, 4], self._ids("ann"))
+        self.index.add(4, "Olga", "Nowak", "60060612345")
+        self.assertEqual([1, 2], self._ids("ann"))
+        self.assertEqual([4], self._ids("now"))
+
+    def test_evicts_oldest_above_size(self):
+        self.assertTrue(self.index.complete)
+        self.index.add(4, "Olga", "Nowak", "60060612345")
+        self.assertEqual(3, len(self.index))
+        self.assertEqual([], self._ids("smith"))
+        self.assertFalse(self.index.complete)
+
+
+class TestSuggestPatients(TestCase):
+
+    def setUp(self):
+        reset_index()
+        self.addCleanup(reset_index)
+        for i, name in enumerate(("Anna", "Annabel", "John")):
+            Patient.objects.create(
+                first_name=name,
+                last_name="Test",
+                date_of_birth="2022-12-12",
+                personal_id=f"1234567891{i}",
+                email="email@email.com",
+                phone="0123456789",
+                address=None
+            )
+
+    def test_warm_index_skips_database(self):
+        suggest_patients("ann")
+        with self.assertNumQueries(0):
+            result = suggest_patients("ann")
+        self.assertEqual(["Anna Test", "Annabel Test"], [
+            name for _, name, _ in result
+        ])
+
+    def test_signals_update_built_index(self):
+        get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            patient = Patient.objects.create(
+                first_name="Annette",
+                last_name="Test",
+                date_of_birth="2022-12-12",
+                personal_id="12345678919",
+                email="email@email.com",
+                phone="0123456789",
+                address=None
+            )
+        self.assertEqual(3, len(suggest_patients("ann")))
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.first_name = "Olga"
+            patient.save()
+        self.assertEqual(2, len(suggest_patients("ann")))
+        self.assertEqual(1, len(suggest_patients("olg")))
+
+    def test_lookups_use_previous_index_while_rebuilding(self):
+        old_index = get_index()
+        new_index = build_index()
+        building = threading.Event()
+        release = threading.Event()
+
+        def slow_build(size):
+            building.set()
+            release.wait(5)
+            return new_index
+
+        with patch("patients.typeahead.build_index", side_effect=slow_build), \
+                patch("patients.typeahead.PATIENT_TYPEAHEAD_TIMEOUT", -1):
+            builder = threading.Thread(target=get_index)
+            builder.start()
+            building.wait(5)
+            with self.assertNumQueries(0):
+                self.assertIs(old_index, get_index())
+                self.assertEqual(2, len(suggest_patients("ann")))
+            release.set()
+            builder.join(5)
+        self.assertIs(new_index, get_index())
+
+    def test_changes_while_building_replayed_on_new_index(self):
+        new_index = build_index()
+        annette = Mock(id=100, first_name="Annette", last_name="Test",
+                       personal_id="12345678919")
+
+        def build(size):
+            index_patient(annette)
+            return new_index
+
+        with patch("patients.typeahead.build_index", side_effect=build):
+            self.assertIs(new_index, get_index())
+        self.assertEqual(3, len(new_index.lookup("ann")))
+
+    def test_reset_while_building_discards_index(self):
+        def build(size):
+            reset_index()
+            return PrefixIndex()
+
+        with patch("patients.typeahead.build_index", side_effect=build):
+            self.assertIsNone(get_index())
+        self.assertEqual(2, len(suggest_patients("ann")))
+
+    def test_common_name_with_rare_surname(self):
+        Patient.objects.bulk_create(
+            Patient(
+                first_name="Anna",
+                last_name=f"Nowak{i}",
+                date_of_birth="2022-12-12",
+                personal_id=f"{i:011d}",
+                email="email@email.com",
+                phone="0123456789"
+            ) for i in range(6000)
+        )
+        smith = Patient.objects.create(
+            first_name="Anna",
+            last_name="Smith",
+            date_of_birth="2022-12-12",
+            personal_id="99999999999",
+            email="email@email.com",
+            phone="0123456789"
+        )
+        reset_index()
+        self.assertEqual(
+            [(smith.id, "Anna Smith", "99999999999")],
+            suggest_patients("anna smi")
+        )
+
+    def test_truncated_lookup_falls_back_to_database(self):
+        self.assertTrue(get_index().complete)
+        with patch.object(PrefixIndex, "lookup", return_value=None):
+            self.assertEqual(
+                ["Anna Test", "Annabel Test"],
+                sorted(name for _, name, _ in suggest_patients("ann"))
+            )
+
+    @patch("patients.typeahead.PATIENT_TYPEAHEAD_SIZE", 1)
+    def test_incomplete_index_falls_back_to_database(self):
+        self.assertFalse(get_index().complete)
+        self.assertEqual(
+            ["Anna Test", "Annabel Test"],
+            sorted(name for _, name, _ in suggest_patients("ann"))
+        )
+
+
+class TestTypeaheadView(TestCase):
+
+    def setUp(self):
+        reset_index()
+        self.addCleanup(reset_index)
+        self.patient = Patient.objects.create(
+            first_name="Anna",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678910",
+            email="email@email.com",
+            phone="0123456789",
+            address=None
+        )
+        user = User.objects.create_user(username="test_name")
+        self.client.force_login(user)
+
+    def test_get(self):
+        response = self.client.get("/patient/typeahead?query=an")
+        self.assertEqual(
+            [{
+                "id": self.patient.id,
+                "name": "Anna Test",
+                "personal_id": "12345678910",
+                "url": f"/patient/{self.patient.id}"
+            }],
+            response.json()["patients"]
+        )
+
+    def test_get_empty_query(self):
+        response = self.client.get("/patient/typeahead")
+        self.assertEqual([], response.json()["patients"])
@@ -1,7 +1,14 @@
+from datetime import datetime, timedelta
 from unittest.mock import patch
 
 from django.contrib.auth.models import User, Group
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..models import Address, Patient
+from main.models import Appointment
 
 
 class TestRegistrationView(TestCase):
@@ -102,12 +109,12 @@ class TestPatientView(TestCase):
         self.assertRedirects(response, "/account/login?next=/patient/1")
 
     @patch("patients.views.get_object_or_404")
-    @patch("patients.views.Appointment")
+    @patch("patients.views.get_treatment_history")
     @patch("patients.views.AddressForm")
     @patch("patients.views.PatientForm")
     def test_get_valid_patient_id(
             self, mock_patient_form, mock_address_form,
-            mock_appointment, mock_404):
+            mock_history, mock_404):
         response = self.client.get("/patient/1")
         self.assertTemplateUsed(response, "patients/patient.html")
 
@@ -116,12 +123,12 @@ class TestPatientView(TestCase):
         self.assertTemplateUsed(response, "404.html")
 
     @patch("patients.views.get_object_or_404")
-    @patch("patients.views.Appointment")
+    @patch("patients.views.get_treatment_history")
     @patch("patients.views.AddressForm")
     @patch("patients.views.PatientForm")
     def test_post_data_changed(
             self, mock_patient_form, mock_address_form,
-            mock_appointment, mock_404):
+            mock_history, mock_404):
         response = self.client.post("/patient/1")
         mock_patient_form().save.assert_called_once()
         mock_address_form().save.assert_called_once()
@@ -137,6 +144,88 @@ class TestPatientView(TestCase):
         self.assertEqual(len(response.redirect_chain), 0)
 
 
+class TestTreatmentHistory(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_name",
+            first_name="gregory",
+            last_name="house"
+        )
+        self.patient = Patient.objects.create(
+            first_name="Johnny",
+            last_name="Test",
+            date_of_birth="2022-12-12",
+            personal_id="12345678910",
+            email="email@email.com",
+            phone="0123456789",
+            address=Address.objects.create(
+                street="Test Lane",
+                number="12a",
+                zip_code="00-000",
+                city="Testington",
+                country="Republic of Testland"
+            )
+        )
+        self.url = f"/patient/{self.patient.id}"
+        self.client.force_login(self.user)
+
+    def _book(self, count, start=datetime(2020, 1, 1, 8)):
+        Appointment.objects.bulk_create(
+            Appointment(
+                datetime=timezone.make_aware(start + timedelta(days=i)),
+                patient=self.patient,
+                doctor=self.user,
+                purpose="Checkup",
+                duration=30
+            ) for i in range(count)
+        )
+
+    def test_first_page(self):
+        self._book(25)
+        response = self.client.get(self.url)
+        history = response.context["treatment_history"]
+        self.assertEqual(20, len(history))
+        self.assertEqual(
+            sorted(appointment.datetime for appointment in history),
+            [appointment.datetime for appointment in history]
+        )
+        self.assertContains(response, "Gregory House")
+        self.assertContains(response, "Load more")
+
+    def test_next_page_fragment(self):
+        self._book(25)
+        next_page = self.client.get(self.url).context["next_page"]
+        response = self.client.get(
+            next_page, HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+        self.assertTemplateUsed(
+            response, "patients/includes/treatment_history.html"
+        )
+        self.assertEqual(5, len(response.context["treatment_history"]))
+        self.assertIsNone(response.context["next_page"])
+        self.assertNotContains(response, "Load more")
+
+    def test_invalid_page(self):
+        response = self.client.get(
+            f"{self.url}?after=yesterday",
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+        self.assertEqual(404, response.status_code)
+
+    def test_query_count_independent_of_history_length(self):
+        self._book(3)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        self._book(100, start=datetime(2021, 1, 1, 8))
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(few), len(many))
+        history_query = few.captured_queries[-1]["sql"]
+        self.assertIn("INNER JOIN", history_query)
+        self.assertNotIn("purpose", history_query)
+
+
 class TestSearchResultsView(TestCase):
 
     def setUp(self):
@@ -0,0 +1,337 @@
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+
+from main.const import (PATIENT_TYPEAHEAD_LIMIT, PATIENT_TYPEAHEAD_SCAN,
+                        PATIENT_TYPEAHEAD_SIZE, PATIENT_TYPEAHEAD_TIMEOUT)
+from .models import Patient
+from .search import search_patients
+
+
+# Separates an index key from the patient ID it points to.
+SEPARATOR = "\x00"
+# Sorts after any character of an index key.
+LAST_CHARACTER = chr(sys.maxunicode)
+
+
+class PrefixIndex:
+    """
+    Sorted in-memory index of lower case first names, last names and personal
+    IDs of patients.
+
+    Keeps at most size patients. Once full, patients indexed longest ago are
+    evicted first and the index no longer knows every patient.
+    """
+
+    def __init__(self, size=PATIENT_TYPEAHEAD_SIZE):
+        self.size = size
+        self.complete = True
+        self.built = time.monotonic()
+        self._entries = []
+        self._patients = {}
+        self._lock = threading.Lock()
+
+    def build(self, patients, complete=True):
+        """
+        Index patients from scratch.
+
+        Parameters
+        ----------
+        patients : iterable
+            (id, first_name, last_name, personal_id) tuples, oldest first.
+        complete : bool
+            False if patients don't include every patient.
+        """
+
+        entries = []
+        indexed = {}
+        for patient_id, first_name, last_name, personal_id in patients:
+            indexed[patient_id] = (first_name, last_name, personal_id)
+            entries += _get_entries(patient_id, first_name, last_name,
+                                    personal_id)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._patients = indexed
+            self.complete = complete
+            self.built = time.monotonic()
+            self._evict()
+
+    def add(self, patient_id, first_name, last_name, personal_id):
+        """
+        Index a new patient or reindex a changed one.
+        """
+
+        with self._lock:
+            self._remove(patient_id)
+            self._patients[patient_id] = (first_name, last_name, personal_id)
+            for entry in _get_entries(patient_id, first_name, last_name,
+                                      personal_id):
+                insort(self._entries, entry)
+            self._evict()
+
+    def remove(self, patient_id):
+        """
+        Forget a patient.
+        """
+
+        with self._lock:
+            self._remove(patient_id)
+
+    def lookup(self, query, limit=PATIENT_TYPEAHEAD_LIMIT,
+               scan=PATIENT_TYPEAHEAD_SCAN):
+        """
+        Find patients with a first name, last name or personal ID starting
+        with every query term.
+
+        Only entries of the term matching fewest keys are scanned, the other
+        terms are checked on their patients.
+
+        Parameters
+        ----------
+        query : str
+        limit : int
+            maximum number of results.
+        scan : int
+            maximum number of index entries checked.
+
+        Returns
+        ----------
+        list or None
+            (id, name, personal_id) tuples ordered by matched key. None if
+            more than scan entries match every term and fewer than limit
+            patients were found among the first scan ones, as the index
+            can't tell if it missed some then.
+        """
+
+        terms = query.lower().split()
+        if not terms:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            ranges = {term: self._get_range(term) for term in terms}
+            term = min(ranges, key=lambda term: ranges[term][1]
+                       - ranges[term][0])
+            start, end = ranges[term]
+            others = list(terms)
+            others.remove(term)
+            for entry in self._entries[start:min(end, start + scan)]:
+                patient_id = int(entry.rpartition(SEPARATOR)[2])
+                if patient_id in seen:
+                    continue
+                seen.add(patient_id)
+                first_name, last_name, personal_id = self._patients[patient_id]
+                name = f"{first_name} {last_name}"
+                words = name.lower().split() + [personal_id]
+                if all(any(word.startswith(other) for word in words)
+                       for other in others):
+                    results.append((patient_id, name, personal_id))
+                    if len(results) == limit:
+                        return results
+        if end - start > scan:
+            return None
+        return results
+
+    def __len__(self):
+        return len(self._patients)
+
+    def _get_range(self, prefix):
+        """
+        Start and end position of entries starting with prefix. Caller holds
+        the lock.
+        """
+
+        return (
+            bisect_left(self._entries, prefix),
+            bisect_left(self._entries, prefix + LAST_CHARACTER)
+        )
+
+    def _remove(self, patient_id):
+        """
+        Drop index entries of a patient. Caller holds the lock.
+        """
+
+        indexed = self._patients.pop(patient_id, None)
+        if indexed is None:
+            return
+        for entry in _get_entries(patient_id, *indexed):
+            index = bisect_left(self._entries, entry)
+            if index < len(self._entries) and self._entries[index] == entry:
+                del self._entries[index]
+
+    def _evict(self):
+        """
+        Drop patients indexed longest ago above size. Caller holds the lock.
+        """
+
+        while len(self._patients) > self.size:
+            self._remove(next(iter(self._patients)))
+            self.complete = False
+
+
+_index = None
+# Guards swapping _index and changes made while a new index is built.
+_index_lock = threading.Lock()
+# Held by the thread building an index, others keep using the previous one.
+_build_lock = threading.Lock()
+# Patient changes made while an index is built, replayed on it before swap.
+_changes = None
+# Bumped by reset_index, so indexes built from older data aren't swapped in.
+_generation = 0
+
+
+def get_index():
+    """
+    Get the process prefix index, building it on first use and after
+    PATIENT_TYPEAHEAD_TIMEOUT seconds so changes made by other processes are
+    picked up.
+
+    One thread builds a new index without holding _index_lock and swaps it
+    in when ready. Other threads don't wait for it, they keep using the
+    previous index meanwhile.
+
+    Returns
+    ----------
+    PrefixIndex or None
+        None while the first index is built by another thread.
+    """
+
+    index = _index
+    if index is not None and not _is_stale(index):
+        return index
+    if not _build_lock.acquire(blocking=False):
+        return index
+    try:
+        return _rebuild_index()
+    finally:
+        _build_lock.release()
+
+
+def _rebuild_index():
+    """
+    Build an index and swap it in. Caller holds _build_lock.
+    """
+
+    global _index, _changes
+    with _index_lock:
+        # built by another thread since get_index checked it
+        if _index is not None and not _is_stale(_index):
+            return _index
+        generation = _generation
+        _changes = []
+    index = build_index(PATIENT_TYPEAHEAD_SIZE)
+    with _index_lock:
+        changes, _changes = _changes, None
+        if generation != _generation:
+            return _index
+        for change in changes:
+            change(index)
+        _index = index
+        return index
+
+
+def _is_stale(index):
+    """
+    Check if an index was built over PATIENT_TYPEAHEAD_TIMEOUT seconds ago.
+    """
+
+    return time.monotonic() - index.built > PATIENT_TYPEAHEAD_TIMEOUT
+
+
+def build_index(size=PATIENT_TYPEAHEAD_SIZE):
+    """
+    Index the size most recently registered patients.
+    """
+
+    index = PrefixIndex(size)
+    patients = list(Patient.objects.order_by("-id").values_list(
+        "id", "first_name", "last_name", "personal_id")[:size + 1])
+    complete = len(patients) <= size
+    index.build(reversed(patients[:size]), complete)
+    return index
+
+
+def reset_index():
+    """
+    Drop the process prefix index, e.g. after bulk changes to patients.
+    """
+
+    global _index, _generation
+    with _index_lock:
+        _index = None
+        _generation += 1
+
+
+def index_patient(patient):
+    """
+    Add or update a patient in the process index if it's built or being
+    built.
+    """
+
+    _change_index(lambda index: index.add(
+        patient.id, patient.first_name, patient.last_name, patient.personal_id
+    ))
+
+
+def unindex_patient(patient_id):
+    """
+    Remove a patient from the process index if it's built or being built.
+    """
+
+    _change_index(lambda index: index.remove(patient_id))
+
+
+def _change_index(change):
+    """
+    Apply a change to the current index and keep it for an index being
+    built, which may have read patients before the change.
+    """
+
+    with _index_lock:
+        if _changes is not None:
+            _changes.append(change)
+        if _index is not None:
+            change(_index)
+
+
+def suggest_patients(query, limit=PATIENT_TYPEAHEAD_LIMIT):
+    """
+    Get patients for a typeahead, from memory when possible.
+
+    The database is searched only when the index misses patients and found
+    fewer than limit in memory, when too many index entries match the query
+    to check them all, or while the first index is being built.
+
+    Parameters
+    ----------
+    query : str
+    limit : int
+
+    Returns
+    ----------
+    list
+        (id, name, personal_id) tuples.
+    """
+
+    index = get_index()
+    if index is not None:
+        results = index.lookup(query, limit)
+        if results is not None and (len(results) == limit or index.complete):
+            return results
+    return [
+        (patient.id, patient.name(), patient.personal_id)
+        for patient in search_patients(query, limit)[:limit]
+    ]
+
+
+def _get_entries(patient_id, first_name, last_name, personal_id):
+    """
+    Index entries of a patient, unique thanks to the patient ID suffix.
+    """
+
+    keys = {
+        key.lower() for key in (first_name, last_name, personal_id) if key
+    }
+    return [f"{key}{SEPARATOR}{patient_id}" for key in keys]
@@ -1,7 +1,8 @@
 from django.urls import path
 
 from .views import (
-    RegistrationView, SuccessRegistrationView, PatientView, SearchResultsView)
+    RegistrationView, SuccessRegistrationView, PatientView, SearchResultsView,
+    TypeaheadView, PatientImportView)
 
 app_name = "patients"
 
@@ -9,5 +10,7 @@ urlpatterns = [
     path("register", RegistrationView.as_view(), name="register"),
     path("registered", SuccessRegistrationView.as_view(), name="registered"),
     path("<int:pk>", PatientView.as_view(), name="patient"),
-    path("search-results", SearchResultsView.as_view(), name="search_results")
+    path("search-results", SearchResultsView.as_view(), name="search_results"),
+    path("typeahead", TypeaheadView.as_view(), name="typeahead"),
+    path("import", PatientImportView.as_view(), name="import")
 ]
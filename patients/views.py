@@ -1,27 +1,30 @@
-from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Q
-from django.http import HttpResponseRedirect, Http404
+import io
+import time
+from urllib.parse import urlencode
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import HttpResponseRedirect, Http404, JsonResponse
 from django.urls import reverse
 from django.shortcuts import render, get_object_or_404
 from django.views import View
 from django.views.generic import ListView
 
 from .forms import PatientForm, AddressForm
+from .importer import FORMATS, import_patients, read_rows, summarize_import
 from .models import Patient
-from main.models import Appointment
+from .search import search_patients
+from .typeahead import suggest_patients
+from main.const import PATIENT_SEARCH_PAGE_SIZE, TREATMENT_HISTORY_PAGE_SIZE
+from main.mixins import NurseRequiredMixin
+from main.querysets import get_treatment_history
+from main.utils import decode_appointment_cursor, get_appointment_page
 
 
-class RegistrationView(LoginRequiredMixin, UserPassesTestMixin, View):
+class RegistrationView(NurseRequiredMixin, View):
     """
     Display patient registration form for nurses.
     """
 
-    def test_func(self):
-        """
-        Allow only nurses
-        """
-        return self.request.user.groups.filter(name__iexact="nurses").exists()
-
     def get(self, request):
         """
         Display empty patient registration form.
@@ -88,19 +91,49 @@ class PatientView(LoginRequiredMixin, View):
         Display single patient details in a editable form.
         """
 
-        patient = get_object_or_404(Patient, id=pk)
+        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            try:
+                after = decode_appointment_cursor(request.GET.get("after", ""))
+            except ValueError:
+                raise Http404()
+            context = self._get_treatment_history(pk, after)
+            return render(
+                request, "patients/includes/treatment_history.html", context
+            )
+
+        patient = get_object_or_404(
+            Patient.objects.select_related("address"), id=pk
+        )
         patient_form = PatientForm(instance=patient, prefix="patient")
         address_form = AddressForm(instance=patient.address, prefix="address")
-        treatment_history = Appointment.objects.filter(
-            patient=patient).order_by("datetime")
         context = {
             "patient_form": patient_form,
             "address_form": address_form,
             "mode": "Update",
-            "treatment_history": treatment_history
+            **self._get_treatment_history(pk)
         }
         return render(request, "patients/patient.html", context)
 
+    def _get_treatment_history(self, pk, after=None):
+        """
+        A page of patient appointments with doctor names and the next page
+        url.
+        """
+
+        treatment_history, cursor = get_appointment_page(
+            get_treatment_history(pk), after, TREATMENT_HISTORY_PAGE_SIZE
+        )
+        next_page = None
+        if cursor:
+            next_page = (
+                f"{reverse('patients:patient', args=[pk])}?"
+                f"{urlencode({'after': cursor})}"
+            )
+        return {
+            "treatment_history": treatment_history,
+            "next_page": next_page
+        }
+
     def post(self, request, pk):
         """
         Update patient personal details and display them imidiately on success.
@@ -137,19 +170,77 @@ class SearchResultsView(LoginRequiredMixin, ListView):
     model = Patient
     template_name = "patients/search_results.html"
     context_object_name = "patients"
+    paginate_by = PATIENT_SEARCH_PAGE_SIZE
 
     def get_queryset(self):
         """
-        Check for searched phrase in first_name, last_name and personal_id
+        Search personal_id prefix or first_name and last_name, most relevant
+        first.
         """
 
-        base = super().get_queryset()
         q = self.request.GET.get("query", None)
         if q:
-            data = base.filter(
-                Q(first_name__icontains=q)
-                | Q(last_name__icontains=q)
-                | Q(personal_id__icontains=q)
-            )
-            return data
+            return search_patients(q)
         raise Http404()
+
+    def get_context_data(self, **kwargs):
+        """
+        Add searched phrase for page links.
+        """
+
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.request.GET["query"]
+        return context
+
+
+class TypeaheadView(LoginRequiredMixin, View):
+    """
+    Suggest patients while a search phrase is typed.
+    """
+
+    def get(self, request):
+        """
+        JSON list of patients with a name or personal_id starting with the
+        searched phrase.
+        """
+
+        q = request.GET.get("query", "")
+        patients = [
+            {
+                "id": patient_id,
+                "name": name,
+                "personal_id": personal_id,
+                "url": reverse("patients:patient", args=[patient_id])
+            } for patient_id, name, personal_id in suggest_patients(q)
+        ]
+        return JsonResponse({"patients": patients})
+
+
+class PatientImportView(NurseRequiredMixin, View):
+    """
+    Import patients from an uploaded CSV or NDJSON file.
+    """
+
+    def post(self, request):
+        """
+        Stream uploaded file into the database. JSON import report or error.
+        """
+
+        upload = request.FILES.get("file")
+        if upload is None:
+            return JsonResponse({"error": "No file uploaded"}, status=400)
+        format = request.POST.get("format") or (
+            upload.name.rpartition(".")[2].lower()
+        )
+        if format not in FORMATS:
+            return JsonResponse({"error": "Unknown file format"}, status=400)
+
+        started = time.perf_counter()
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+        try:
+            summary = summarize_import(
+                import_patients(read_rows(stream, format)), started
+            )
+        except UnicodeDecodeError:
+            return JsonResponse({"error": "File is not UTF-8"}, status=400)
+        return JsonResponse(summary)
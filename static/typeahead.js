@@ -0,0 +1,43 @@
+var searchInput = document.querySelector("input.search");
+var suggestions = document.getElementById("patient-suggestions");
+var typeaheadTimeout = null;
+
+/**
+ * Replace search suggestions with patients fetched by fetchSuggestions func.
+ * Suggestion value is patient personal id, so picking one finds that patient.
+ *
+ * @param patients - list of objects with name and personal_id
+ */
+function replaceSuggestions(patients) {
+    suggestions.innerHTML = "";
+    for (i = 0; i < patients.length; i++) {
+        var option = document.createElement("option");
+        option.value = patients[i].personal_id;
+        option.label = patients[i].name;
+        suggestions.appendChild(option);
+    }
+}
+
+/**
+ * Fetch patients matching search input. Pass them to replaceSuggestions.
+ */
+async function fetchSuggestions() {
+    var query = searchInput.value.trim();
+    if (query.length < 2) {
+        replaceSuggestions([]);
+        return;
+    }
+    var url = searchInput.dataset.typeaheadUrl + "?query=" + encodeURIComponent(query);
+    var response = await fetch(url);
+    if (response.ok) {
+        var data = await response.json();
+        replaceSuggestions(data.patients);
+    }
+}
+
+if (searchInput && suggestions) {
+    searchInput.addEventListener("input", function () {
+        clearTimeout(typeaheadTimeout);
+        typeaheadTimeout = setTimeout(fetchSuggestions, 150);
+    });
+}